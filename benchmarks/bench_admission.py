@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A load test that shows how admission control keeps the latency of cheap
+operations bounded while expensive ones overload the server.
+
+The server is simulated with a fixed pool of worker threads that take the
+requests from a fifo queue, like threaded wsgi servers do. Expensive requests
+arrive faster than the workers can handle them, and cheap requests arrive at a
+steady pace. Without admission control, the cheap requests queue behind the
+expensive ones. With a Limiter on the expensive operation, the requests above
+its limit are rejected with 503 right away and the cheap ones always find a
+free worker.
+
+Usage: python benchmarks/bench_admission.py [duration_in_seconds]
+"""
+
+import cStringIO
+import Queue
+import sys
+import threading
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.model.primitive import Float
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+n_workers = 8
+expensive_interval = 0.004 # 250 requests/s, the workers can do ~160/s
+expensive_time = 0.05
+cheap_interval = 0.01
+
+def make_service(limiter):
+    class LoadService(DefinitionBase):
+        @soap(Float, _returns=Float, _limiter=limiter)
+        def expensive(self, seconds):
+            time.sleep(seconds)
+            return seconds
+
+        @soap(Float, _returns=Float)
+        def cheap(self, seconds):
+            return seconds
+
+    return LoadService
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def run(label, limiter, duration):
+    service = make_service(limiter)
+    app = Application([service], 'tns')
+    server = wsgi.Application(app)
+    client = Client(app)
+
+    requests = {}
+    for method_name, arg in (('expensive', expensive_time), ('cheap', 0)):
+        ctx = MethodContext()
+        ctx.service = app.get_service(service)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        requests[method_name] = client.get_request_string(ctx, (arg,), {})
+
+    queue = Queue.Queue()
+    latencies = {'cheap': [], 'expensive': []}
+    statuses = {}
+
+    def worker():
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+
+            method_name, t0 = item
+            request = requests[method_name]
+            status = []
+            def start_response(code, headers):
+                status.append(code)
+
+            ''.join(server({
+                'REQUEST_METHOD': 'POST',
+                'QUERY_STRING': '',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': cStringIO.StringIO(request),
+                'CONTENT_LENGTH': str(len(request)),
+                'CONTENT_TYPE': 'text/xml; charset=utf-8',
+            }, start_response))
+
+            latencies[method_name].append(time.time() - t0)
+            key = (method_name, status[0].split()[0])
+            statuses[key] = statuses.get(key, 0) + 1
+
+    def generate(method_name, interval):
+        end = time.time() + duration
+        while time.time() < end:
+            queue.put((method_name, time.time()))
+            time.sleep(interval)
+
+    workers = [threading.Thread(target=worker) for i in range(n_workers)]
+    for w in workers:
+        w.start()
+
+    generators = [threading.Thread(target=generate, args=args) for args in
+              (('expensive', expensive_interval), ('cheap', cheap_interval))]
+    for g in generators:
+        g.start()
+    for g in generators:
+        g.join()
+
+    for w in workers:
+        queue.put(None)
+    for w in workers:
+        w.join()
+
+    cheap = latencies['cheap']
+    print "%s:" % label
+    print "  cheap latency p50 %7.3fs  p99 %7.3fs  max %7.3fs" % (
+              percentile(cheap, 0.5), percentile(cheap, 0.99), max(cheap))
+    print "  responses: %s" % ', '.join(['%s %s: %d' % (k[0], k[1], v)
+                                            for k, v in sorted(statuses.items())])
+
+def main(argv):
+    duration = 3
+    if len(argv) > 1:
+        duration = float(argv[1])
+
+    run('no admission control', None, duration)
+    run('expensive limited to 4 + 2 queued', Limiter(4, 2), duration)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares serializing and deserializing large numeric Arrays as lists against
+the array.array / numpy.ndarray fast path.
+
+Usage: python benchmarks/bench_array.py [number_of_values]
+"""
+
+import array
+import sys
+import time
+
+from lxml import etree
+
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Integer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ns_test = 'bench'
+
+def timed(label, func, *args):
+    t0 = time.time()
+    retval = func(*args)
+    print "%-40s %8.3fs" % (label, time.time() - t0)
+    return retval
+
+def serialize(type, value):
+    parent = etree.Element('{%s}parent' % ns_test, nsmap={'b': ns_test})
+    type.to_parent_element(value, ns_test, parent)
+    return parent[0]
+
+def run(serializer, values, typecode):
+    plain = Array(serializer)
+    plain.resolve_namespace(plain, ns_test)
+    typed = Array(serializer, decode_as='array')
+    typed.resolve_namespace(typed, ns_test)
+
+    name = serializer.get_type_name()
+
+    elt = timed('%s: list encode' % name, serialize, plain, values)
+    timed('%s: array.array encode' % name, serialize, plain,
+                                                 array.array(typecode, values))
+    if numpy is not None:
+        timed('%s: numpy.ndarray encode' % name, serialize, plain,
+                                                          numpy.array(values))
+
+    timed('%s: list decode' % name, plain.from_xml, elt)
+    timed('%s: array.array decode' % name, typed.from_xml, elt)
+
+    if numpy is not None:
+        as_ndarray = Array(serializer, decode_as='ndarray')
+        as_ndarray.resolve_namespace(as_ndarray, ns_test)
+        timed('%s: numpy.ndarray decode' % name, as_ndarray.from_xml, elt)
+
+def main(argv):
+    n = 1000000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    run(Integer, range(n), 'l')
+    run(Double, [i * 0.25 for i in xrange(n)], 'd')
+
+if __name__ == '__main__':
+    main(sys.argv)
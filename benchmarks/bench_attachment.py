@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures the time and peak memory it takes to send a file-backed Attachment
+through the wsgi server, with and without streaming.
+
+Every variant runs in a child process so that the peak rss figures don't
+interfere with each other.
+
+Usage: python benchmarks/bench_attachment.py [file_size_in_mib]
+"""
+
+import cStringIO
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from soaplib.core import Application
+from soaplib.core import namespaces
+from soaplib.core.model.binary import Attachment
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class FileService(DefinitionBase):
+    file_name = None
+
+    @soap(_returns=Attachment)
+    def get_file(self):
+        return Attachment(file_name=self.file_name)
+
+    @soap(_returns=Attachment.customize(stream=True))
+    def get_file_streamed(self):
+        return Attachment(file_name=self.file_name)
+
+request = """<?xml version='1.0' encoding='utf-8'?>
+<senv:Envelope xmlns:senv="%s" xmlns:tns="tns">
+  <senv:Body><tns:%%s/></senv:Body>
+</senv:Envelope>""" % namespaces.ns_soap_env
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(label, server, method_name):
+    pid = os.fork()
+    if pid != 0:
+        os.waitpid(pid, 0)
+        return
+
+    rss0 = maxrss()
+    body = request % method_name
+
+    def start_response(status, headers):
+        pass
+
+    t0 = time.time()
+    length = 0
+    for chunk in server({
+                'REQUEST_METHOD': 'POST',
+                'QUERY_STRING': '',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': cStringIO.StringIO(body),
+                'CONTENT_LENGTH': str(len(body)),
+                'CONTENT_TYPE': 'text/xml; charset=utf-8',
+            }, start_response):
+        length += len(chunk)
+    t = time.time() - t0
+
+    print "%-10s %7.3fs (%6.1f MiB/s) peak rss: +%.1f MiB" % (label, t,
+                              length / t / (1 << 20), maxrss() - rss0)
+
+    os._exit(0)
+
+def main(argv):
+    size = 64
+    if len(argv) > 1:
+        size = int(argv[1])
+
+    fd, FileService.file_name = tempfile.mkstemp()
+    try:
+        f = os.fdopen(fd, 'wb')
+        block = os.urandom(1 << 20)
+        for i in xrange(size):
+            f.write(block)
+        f.close()
+
+        server = wsgi.Application(Application([FileService], 'tns'))
+
+        run('buffered', server, 'get_file')
+        run('streamed', server, 'get_file_streamed')
+
+    finally:
+        os.unlink(FileService.file_name)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the binary encoding of soaplib.core.util.binconv with pickle, for
+the size of the encoded data and the time it takes to encode and decode an
+array of ClassModel instances.
+
+Usage: python benchmarks/bench_binconv.py [number_of_objects]
+"""
+
+import cPickle
+import datetime
+import decimal
+import gc
+import sys
+import time
+
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.util import binconv
+
+ns_test = 'bench'
+
+class Address(ClassModel):
+    __namespace__ = ns_test
+
+    street = String
+    city = String
+    zip = Integer
+    lattitude = Float
+    longitude = Float
+
+class Person(ClassModel):
+    __namespace__ = ns_test
+
+    name = String
+    birthdate = DateTime
+    age = Integer
+    balance = Decimal
+    address = Address
+
+PersonArray = Array(Person)
+
+def make_people(n):
+    people = []
+    for i in xrange(n):
+        people.append(Person(name='person %d' % i,
+              birthdate=datetime.datetime(1980, 1, 1, 12, 0, i % 60),
+              age=i % 100, balance=decimal.Decimal('%d.25' % i),
+              address=Address(street='street %d' % i, city='istanbul',
+                              zip=i, lattitude=41.0, longitude=29.0)))
+    return people
+
+def measure(name, dumps, loads, value, n):
+    gc.collect()
+
+    t0 = time.time()
+    data = dumps(value)
+    t1 = time.time()
+    loads(data)
+    t2 = time.time()
+
+    print "%-10s %9d bytes (%5.1f/object), dumps %6.3fs, loads %6.3fs" % (
+                         name, len(data), len(data) / float(n), t1 - t0, t2 - t1)
+
+def main(argv):
+    n = 20000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    people = make_people(n)
+
+    print "%d people" % n
+    for protocol in (0, 2):
+        measure('pickle %d' % protocol,
+                lambda value: cPickle.dumps(value, protocol), cPickle.loads,
+                people, n)
+
+    measure('binconv', lambda value: binconv.dumps(PersonArray, value),
+                         lambda data: binconv.loads(PersonArray, data), people, n)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the number of calls per second the http client makes with pooled
+keep-alive connections and with a new connection per call, against a local
+wsgi server.
+
+Usage: python benchmarks/bench_client.py [number_of_calls] [number_of_threads]
+"""
+
+import sys
+import socket
+import threading
+import time
+
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import ServerHandler
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+
+from soaplib.core import Application
+from soaplib.core.client.http import Client
+from soaplib.core.client.http import ConnectionPool
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class EchoService(DefinitionBase):
+    @soap(String, _returns=String)
+    def echo(self, s):
+        return s
+
+class _ServerHandler(ServerHandler):
+    http_version = '1.1'
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        WSGIRequestHandler.setup(self)
+
+        # wsgiref writes the headers and the body separately.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        self.close_connection = 0
+        while not self.close_connection:
+            self.raw_requestline = self.rfile.readline()
+            if not self.raw_requestline or not self.parse_request():
+                return
+
+            handler = _ServerHandler(self.rfile, self.wfile,
+                                         self.get_stderr(), self.get_environ())
+            handler.request_handler = self
+            handler.run(self.server.get_app())
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class NoReusePool(ConnectionPool):
+    def release(self, scheme, host, connection, reusable=True):
+        ConnectionPool.release(self, scheme, host, connection, False)
+
+def run(label, client, n, n_threads):
+    def call():
+        for i in xrange(n / n_threads):
+            client.service.echo('hello')
+
+    threads = [threading.Thread(target=call) for i in range(n_threads)]
+
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    t = time.time() - t0
+
+    print "%-24s %8.0f calls/s" % (label, n / t)
+
+def main(argv):
+    n = 2000
+    n_threads = 1
+    if len(argv) > 1:
+        n = int(argv[1])
+    if len(argv) > 2:
+        n_threads = int(argv[2])
+
+    app = Application([EchoService], 'tns')
+
+    server = Server(('127.0.0.1', 0), KeepAliveRequestHandler)
+    server.set_app(wsgi.Application(app))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+
+    for label, pool in (('new connection per call', NoReusePool(n_threads)),
+                        ('pooled', ConnectionPool(n_threads))):
+        run(label, Client(url, app, pool), n, n_threads)
+        pool.close()
+
+    server.shutdown()
+    server.server_close()
+
+if __name__ == '__main__':
+    main(sys.argv)
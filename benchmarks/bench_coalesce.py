@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Sends bursts of identical concurrent requests to an operation with a slow
+backend, with and without a Coalescer, and counts the backend calls.
+
+Usage: python benchmarks/bench_coalesce.py [burst_size] [number_of_bursts] [latency_in_ms]
+"""
+
+import cStringIO
+import sys
+import threading
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.coalesce import Coalescer
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+latency = 0.05
+backend_calls = [0]
+
+def backend(key):
+    backend_calls[0] += 1
+    time.sleep(latency)
+    return ['%s %d' % (key, i) for i in range(100)]
+
+class QuoteService(DefinitionBase):
+    @soap(String, _returns=Array(String))
+    def quotes(self, key):
+        return backend(key)
+
+    @soap(String, _returns=Array(String), _coalesce=Coalescer(timeout=10))
+    def quotes_coalesced(self, key):
+        return backend(key)
+
+    @soap(String, _returns=Array(String),
+                        _coalesce=Coalescer(timeout=10, share_response=True))
+    def quotes_shared(self, key):
+        return backend(key)
+
+def run(app, method_name, burst_size, n_bursts):
+    ctx = MethodContext()
+    ctx.service = app.get_service(QuoteService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    request = Client(app).get_request_string(ctx, ('EUR',), {})
+
+    server = wsgi.Application(app)
+    def start_response(status, headers):
+        pass
+
+    def call():
+        ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+
+    backend_calls[0] = 0
+    t0 = time.time()
+    for i in range(n_bursts):
+        threads = [threading.Thread(target=call) for j in range(burst_size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    t = time.time() - t0
+
+    print "%-18s %7.3fs %6d backend calls for %d requests" % (method_name, t,
+                                          backend_calls[0], burst_size * n_bursts)
+
+def main(argv):
+    global latency
+
+    burst_size = 50
+    n_bursts = 10
+    if len(argv) > 1:
+        burst_size = int(argv[1])
+    if len(argv) > 2:
+        n_bursts = int(argv[2])
+    if len(argv) > 3:
+        latency = int(argv[3]) / 1000.0
+
+    app = Application([QuoteService], 'tns')
+
+    run(app, 'quotes', burst_size, n_bursts)
+    run(app, 'quotes_coalesced', burst_size, n_bursts)
+    run(app, 'quotes_shared', burst_size, n_bursts)
+
+if __name__ == '__main__':
+    main(sys.argv)
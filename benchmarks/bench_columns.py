@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures encode time and peak memory of large Array(ClassModel) responses
+built from ClassModel instances, tuples, Columns and Rows.
+
+Every variant runs in a child process so that the peak rss figures don't
+interfere with each other.
+
+Usage: python benchmarks/bench_columns.py [number_of_rows]
+"""
+
+import os
+import resource
+import sys
+import time
+
+from lxml import etree
+
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+
+ns_test = 'bench'
+
+class Measurement(ClassModel):
+    __namespace__ = ns_test
+
+    id = Integer
+    sensor = String
+    value = Double
+
+MeasurementArray = Array(Measurement)
+MeasurementArray.resolve_namespace(MeasurementArray, ns_test)
+
+def make_instances(n):
+    return [Measurement(id=i, sensor='s%d' % (i % 16), value=i * 0.5)
+                                                              for i in xrange(n)]
+
+def make_tuples(n):
+    return [(i, 's%d' % (i % 16), i * 0.5) for i in xrange(n)]
+
+def make_columns(n):
+    return Columns({
+        'id': range(n),
+        'sensor': ['s%d' % (i % 16) for i in xrange(n)],
+        'value': [i * 0.5 for i in xrange(n)],
+    })
+
+def make_rows(n):
+    return Rows(('id', 'sensor', 'value'),
+                        ((i, 's%d' % (i % 16), i * 0.5) for i in xrange(n)))
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(label, factory, n):
+    pid = os.fork()
+    if pid != 0:
+        os.waitpid(pid, 0)
+        return
+
+    rss0 = maxrss()
+
+    t0 = time.time()
+    value = factory(n)
+    t1 = time.time()
+
+    parent = etree.Element('{%s}parent' % ns_test, nsmap={'b': ns_test})
+    MeasurementArray.to_parent_element(value, ns_test, parent)
+    out = etree.tostring(parent)
+    t2 = time.time()
+
+    print "%-10s build: %7.3fs encode: %7.3fs (%8.0f rows/s) " \
+          "peak rss: +%.1f MiB" % (label, t1 - t0, t2 - t1,
+                                           n / (t2 - t1), maxrss() - rss0)
+
+    os._exit(0)
+
+def main(argv):
+    n = 1000000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    run('instances', make_instances, n)
+    run('tuples', make_tuples, n)
+    run('columns', make_columns, n)
+    run('rows', make_rows, n)
+
+if __name__ == '__main__':
+    main(sys.argv)
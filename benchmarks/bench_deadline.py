@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A load test that shows how request deadlines keep a server responsive when
+one of its backends gets slow.
+
+The server is simulated with a fixed pool of worker threads that take the
+requests from a fifo queue, like threaded wsgi servers do. The operation calls
+a backend that usually answers in 10ms, but takes a second for one request in
+ten. The clients give up on a request after 0.2 seconds. Without deadlines,
+the slow backend calls hold the workers long after their clients have left,
+the requests pile up in the queue and even the fast ones are answered too
+late. When the clients send their timeout in the Timeout header, the
+operation passes the remaining time on to the backend, and the workers are
+freed when the deadline passes.
+
+Usage: python benchmarks/bench_deadline.py [duration_in_seconds]
+"""
+
+import cStringIO
+import logging
+import Queue
+import sys
+import threading
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.model.primitive import Float
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+n_workers = 8
+interval = 0.005 # 200 requests/s
+fast_time = 0.01
+slow_time = 1.0
+slow_every = 10
+client_timeout = 0.2
+
+def call_backend(seconds, timeout):
+    """Simulates a backend call that gives up after the given timeout."""
+
+    if timeout is not None and timeout < seconds:
+        time.sleep(timeout)
+        raise Exception("Backend timeout")
+
+    time.sleep(seconds)
+
+class LoadService(DefinitionBase):
+    @soap(Float, _returns=Float)
+    def work(self, seconds):
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline.remaining()
+
+        call_backend(seconds, timeout)
+
+        return seconds
+
+def run(label, timeout, duration):
+    app = Application([LoadService], 'tns')
+    server = wsgi.Application(app)
+    client = Client(app)
+
+    requests = []
+    for seconds in (fast_time, slow_time):
+        ctx = MethodContext()
+        ctx.service = app.get_service(LoadService)
+        ctx.descriptor = ctx.service.get_method('work')
+        requests.append(client.get_request_string(ctx, (seconds,), {},
+                                                                      timeout))
+
+    queue = Queue.Queue()
+    counts = {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+
+            request, t0 = item
+
+            status = []
+            def start_response(code, headers):
+                status.append(code)
+
+            ''.join(server({
+                'REQUEST_METHOD': 'POST',
+                'QUERY_STRING': '',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': cStringIO.StringIO(request),
+                'CONTENT_LENGTH': str(len(request)),
+                'CONTENT_TYPE': 'text/xml; charset=utf-8',
+            }, start_response))
+
+            if not status[0].startswith('200'):
+                key = 'failed'
+            elif time.time() - t0 <= client_timeout:
+                key = 'answered in time'
+            else:
+                key = 'answered too late'
+
+            lock.acquire()
+            counts[key] = counts.get(key, 0) + 1
+            lock.release()
+
+    workers = [threading.Thread(target=worker) for i in range(n_workers)]
+    for w in workers:
+        w.start()
+
+    end = time.time() + duration
+    i = 0
+    while time.time() < end:
+        queue.put((requests[i % slow_every == 0], time.time()))
+        time.sleep(interval)
+        i += 1
+
+    for w in workers:
+        queue.put(None)
+    for w in workers:
+        w.join()
+
+    print "%s:" % label
+    for key in ('answered in time', 'answered too late', 'failed'):
+        print "  %-18s %5d" % (key, counts.get(key, 0))
+
+def main(argv):
+    duration = 3
+    if len(argv) > 1:
+        duration = float(argv[1])
+
+    # the backend timeouts are expected.
+    logging.getLogger('soaplib').setLevel(logging.CRITICAL)
+
+    run('no deadline', None, duration)
+    run('client deadline of %gs' % client_timeout, client_timeout, duration)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the cost of deserializing an Array of ClassModels into ClassModel
+instances, dicts and namedtuples.
+
+Usage: python benchmarks/bench_decode_as.py [number_of_objects]
+"""
+
+import sys
+import time
+
+from lxml import etree
+
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+
+ns_test = 'bench'
+
+class Address(ClassModel):
+    __namespace__ = ns_test
+
+    street = String
+    city = String
+    zip = Integer
+    lattitude = Float
+    longitude = Float
+
+class Person(ClassModel):
+    __namespace__ = ns_test
+
+    name = String
+    birthdate = DateTime
+    age = Integer
+    address = Address
+
+PersonArray = Array(Person)
+PersonArray.resolve_namespace(PersonArray, ns_test)
+
+def make_element(n):
+    people = []
+    for i in xrange(n):
+        people.append({
+            'name': 'person %d' % i,
+            'age': i % 100,
+            'address': {'street': 'street %d' % i, 'city': 'istanbul',
+                        'zip': i, 'lattitude': 41.0, 'longitude': 29.0},
+        })
+
+    parent = etree.Element('{%s}parent' % ns_test, nsmap={'b': ns_test})
+    PersonArray.to_parent_element(people, ns_test, parent)
+
+    return parent[0]
+
+def main(argv):
+    n = 100000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    element = make_element(n)
+
+    for decode_as in ('instance', 'dict', 'namedtuple'):
+        t0 = time.time()
+        PersonArray.from_xml(element, decode_as)
+        t = time.time() - t0
+
+        print "%-12s %7.3fs (%8.0f objects/s)" % (decode_as, t, n * 2 / t)
+
+if __name__ == '__main__':
+    main(sys.argv)
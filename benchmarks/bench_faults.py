@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures how many fault responses the wsgi server produces per second.
+
+The faults are either raised by the service, which are logged according to the
+log_level, log_traceback and log_rate attributes of their class, or produced
+while decoding the request (unknown method, empty envelope). The log records
+are written to /dev/null.
+
+"tree" variants have an on_exception_xml hook, which makes the server build the
+fault tree instead of filling in the pre-rendered template.
+
+Usage: python benchmarks/bench_faults.py [number_of_requests]
+"""
+
+import cStringIO
+import logging
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core import namespaces
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class QuietFault(Fault):
+    log_level = None
+
+class ThrottledFault(Fault):
+    log_rate = 10
+
+class FaultService(DefinitionBase):
+    @soap(String)
+    def logged(self, s):
+        raise Fault('Client', s)
+
+    @soap(String)
+    def throttled(self, s):
+        raise ThrottledFault('Client', s)
+
+    @soap(String)
+    def quiet(self, s):
+        raise QuietFault('Client', s)
+
+class HookedApplication(Application):
+    def on_exception_xml(self, fault_xml):
+        pass
+
+_envelope = ('<senv:Envelope xmlns:senv="%s" xmlns:tns="tns">%%s'
+                            '</senv:Envelope>' % namespaces.ns_soap_env)
+
+def make_request(method_name):
+    if method_name is None:
+        return _envelope % ''
+
+    return _envelope % ('<senv:Body><tns:%s><tns:s>invalid input</tns:s>'
+                        '</tns:%s></senv:Body>' % (method_name, method_name))
+
+def run(label, app_class, request, n):
+    server = wsgi.Application(app_class([FaultService], 'tns'))
+
+    def start_response(status, headers):
+        pass
+
+    t0 = time.time()
+    for i in xrange(n):
+        ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+    t = time.time() - t0
+
+    print "%-24s %8.0f faults/s" % (label, n / t)
+
+def main(argv):
+    n = 10000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    logging.basicConfig(stream=open('/dev/null', 'w'), level=logging.INFO)
+
+    for method_name in ('logged', 'throttled', 'quiet', 'unknown', None):
+        request = make_request(method_name)
+        label = method_name or 'empty envelope'
+
+        run(label + ' (tree)', HookedApplication, request, n)
+        run(label, Application, request, n)
+
+if __name__ == '__main__':
+    main(sys.argv)
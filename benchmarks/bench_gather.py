@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares making many calls to a slow backend one after the other with making
+them concurrently with Client.gather. The server runs in a child process so
+that it doesn't compete with the client for the interpreter lock.
+
+Usage: python benchmarks/bench_gather.py [number_of_calls] [latency_in_ms]
+"""
+
+import os
+import signal
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core.client.http import Client
+from soaplib.core.client.http import ConnectionPool
+from soaplib.core.model.primitive import Float
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+from bench_client import KeepAliveRequestHandler
+from bench_client import Server
+
+class SlowService(DefinitionBase):
+    @soap(Float, _returns=Float)
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+def main(argv):
+    n = 200
+    latency = 10
+    if len(argv) > 1:
+        n = int(argv[1])
+    if len(argv) > 2:
+        latency = int(argv[2])
+
+    app = Application([SlowService], 'tns')
+
+    server = Server(('127.0.0.1', 0), KeepAliveRequestHandler)
+    server.set_app(wsgi.Application(app))
+
+    pid = os.fork()
+    if pid == 0:
+        server.serve_forever()
+        os._exit(0)
+
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+
+    for concurrency in (1, 4, 16, 32):
+        pool = ConnectionPool(concurrency)
+        client = Client(url, app, pool)
+        calls = [(client.service.sleep, (latency / 1000.0,))] * n
+
+        t0 = time.time()
+        if concurrency == 1:
+            for proc, args in calls:
+                proc(*args)
+        else:
+            client.gather(calls, max_concurrency=concurrency)
+        t = time.time() - t0
+
+        print "concurrency %-4d %8.3fs %8.0f calls/s" % (concurrency, t, n / t)
+        pool.close()
+
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+if __name__ == '__main__':
+    main(sys.argv)
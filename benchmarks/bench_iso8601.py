@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures the throughput of the DateTime and Duration parsers, with and
+without memoization.
+
+Usage: python benchmarks/bench_iso8601.py [number_of_values]
+"""
+
+import sys
+import time
+
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Duration
+from soaplib.core.util import iso8601
+
+def make_strings(n, distinct):
+    datetimes = []
+    durations = []
+    for i in xrange(n):
+        j = i % distinct
+        datetimes.append('2010-%02d-%02dT%02d:%02d:00.%06d+03:00' % (
+                                1 + j % 12, 1 + j % 28, j % 24, j % 60, j))
+        durations.append('P%dDT%dH%dM%d.5S' % (j % 30, j % 24, j % 60, j % 60))
+
+    return datetimes, durations
+
+def run(label, cls, strings):
+    t0 = time.time()
+    for s in strings:
+        cls.from_string(s)
+    t = time.time() - t0
+
+    print "%-24s %7.3fs (%8.0f values/s)" % (label, t, len(strings) / t)
+
+def main(argv):
+    n = 200000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    for distinct in (n, 100):
+        datetimes, durations = make_strings(n, distinct)
+        print "%d values, %d distinct:" % (n, min(n, distinct))
+
+        iso8601.set_memo_size(0)
+        run("dateTime", DateTime, datetimes)
+        run("duration", Duration, durations)
+
+        iso8601.set_memo_size(1024)
+        run("dateTime (memoized)", DateTime, datetimes)
+        run("duration (memoized)", Duration, durations)
+
+        iso8601.set_memo_size(0)
+
+if __name__ == '__main__':
+    main(sys.argv)
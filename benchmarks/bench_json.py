@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares serving the same method as soap and as json, for identical
+payloads: an array of people, which the method returns as it gets it.
+
+Both requests are handled in-process by their wsgi applications, so the times
+include parsing the request, decoding the arguments, encoding the result and
+serializing the response, but no network.
+
+Usage: python benchmarks/bench_json.py [number_of_people] [number_of_calls]
+"""
+
+import cStringIO
+import datetime
+import decimal
+import json
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import json_wsgi
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+from soaplib.core.util.jsonconv import get_encoder
+
+ns_test = 'bench'
+
+class Address(ClassModel):
+    __namespace__ = ns_test
+
+    street = String
+    city = String
+    zip = Integer
+    lattitude = Float
+    longitude = Float
+
+class Person(ClassModel):
+    __namespace__ = ns_test
+
+    name = String
+    birthdate = DateTime
+    age = Integer
+    balance = Decimal
+    address = Address
+
+class JsonService(DefinitionBase):
+    @soap(Array(Person), _returns=Array(Person))
+    def echo_people(self, people):
+        return people
+
+def make_people(n):
+    people = []
+    for i in xrange(n):
+        people.append(Person(name='person %d' % i,
+              birthdate=datetime.datetime(1980, 1, 1, 12, 0, i % 60),
+              age=i % 100, balance=decimal.Decimal('%d.25' % i),
+              address=Address(street='street %d' % i, city='istanbul',
+                              zip=i, lattitude=41.0, longitude=29.0)))
+    return people
+
+def get_soap_request(app, people):
+    ctx = MethodContext()
+    ctx.service = app.get_service(JsonService)
+    ctx.descriptor = ctx.service.get_method('echo_people')
+
+    return Client(app).get_request_string(ctx, (people,), {})
+
+def get_json_request(app, people):
+    descriptor = app.get_service(JsonService).get_method('echo_people')
+
+    return json.dumps(get_encoder(descriptor.in_message)([people]),
+                                                     separators=(',', ':'))
+
+def call(server, path, content_type, request):
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    response = ''.join(server({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': content_type,
+    }, start_response))
+
+    assert status[0].startswith('200'), (status, response[:500])
+
+    return response
+
+def measure(name, server, path, content_type, request, n_calls):
+    response = call(server, path, content_type, request)
+
+    t0 = time.time()
+    for i in xrange(n_calls):
+        call(server, path, content_type, request)
+    t = (time.time() - t0) / n_calls
+
+    print "%-5s %8.2f ms/call, request %7d bytes, response %7d bytes" % (
+                               name, t * 1000, len(request), len(response))
+
+def main(argv):
+    n_people = 100
+    n_calls = 200
+    if len(argv) > 1:
+        n_people = int(argv[1])
+    if len(argv) > 2:
+        n_calls = int(argv[2])
+
+    app = Application([JsonService], 'tns')
+    people = make_people(n_people)
+
+    print "%d people per call" % n_people
+    measure('soap', wsgi.Application(app), '/', 'text/xml; charset=utf-8',
+                                    get_soap_request(app, people), n_calls)
+    measure('json', json_wsgi.Application(app), '/echo_people',
+                    'application/json', get_json_request(app, people), n_calls)
+
+if __name__ == '__main__':
+    main(sys.argv)
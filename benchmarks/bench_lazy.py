@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares decoding large requests at once and lazily, for a method that
+reads a single field of the first few orders it's given, and for one that
+reads two fields of every order.
+
+The requests are handled in-process by the wsgi application, so the times
+include parsing the request and serializing the response, but no network.
+
+Usage: python benchmarks/bench_lazy.py [number_of_orders] [number_of_calls]
+"""
+
+import cStringIO
+import datetime
+import decimal
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Boolean
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+ns_test = 'bench'
+
+class Address(ClassModel):
+    __namespace__ = ns_test
+
+    street = String
+    city = String
+    zip = Integer
+
+class Order(ClassModel):
+    __namespace__ = ns_test
+
+    id = Integer
+    customer = String
+    created = DateTime
+    total = Decimal
+    urgent = Boolean
+    note = String
+    shipping = Address
+    items = Array(String)
+
+def _first_urgent(orders):
+    for order in orders:
+        if order.urgent:
+            return order.id
+
+def _total(orders):
+    return int(sum([o.total for o in orders] + [len(o.items) for o in orders]))
+
+class EagerService(DefinitionBase):
+    @soap(Array(Order), _returns=Integer)
+    def first_urgent(self, orders):
+        return _first_urgent(orders)
+
+    @soap(Array(Order), _returns=Integer)
+    def total(self, orders):
+        return _total(orders)
+
+class LazyService(DefinitionBase):
+    @soap(Array(Order), _returns=Integer, _lazy=True)
+    def first_urgent(self, orders):
+        return _first_urgent(orders)
+
+    @soap(Array(Order), _returns=Integer, _lazy=True)
+    def total(self, orders):
+        return _total(orders)
+
+def make_orders(n):
+    orders = []
+    for i in xrange(n):
+        orders.append(Order(id=i, customer='customer %d' % i,
+                created=datetime.datetime(2010, 1, 1, 12, 0, i % 60),
+                total=decimal.Decimal('%d.50' % i), urgent=(i == 10),
+                note='please leave it at the door',
+                shipping=Address(street='street %d' % i, city='istanbul',
+                                 zip=i),
+                items=['item %d' % j for j in range(5)]))
+    return orders
+
+def get_request(app, service, method_name, orders):
+    ctx = MethodContext()
+    ctx.service = app.get_service(service)
+    ctx.descriptor = ctx.service.get_method(method_name)
+
+    return Client(app).get_request_string(ctx, (orders,), {})
+
+def call(server, request):
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    response = ''.join(server({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': 'text/xml; charset=utf-8',
+    }, start_response))
+
+    assert status[0] == wsgi.HTTP_200, (status, response[:500])
+
+def measure(name, service, method_name, orders, n_calls):
+    app = Application([service], 'tns')
+    server = wsgi.Application(app)
+    request = get_request(app, service, method_name, orders)
+
+    call(server, request)
+
+    t0 = time.time()
+    for i in xrange(n_calls):
+        call(server, request)
+    t = (time.time() - t0) / n_calls
+
+    print "%-20s %8.2f ms/call" % (name, t * 1000)
+
+def main(argv):
+    n_orders = 2000
+    n_calls = 20
+    if len(argv) > 1:
+        n_orders = int(argv[1])
+    if len(argv) > 2:
+        n_calls = int(argv[2])
+
+    orders = make_orders(n_orders)
+
+    print "%d orders per call" % n_orders
+    measure('first_urgent eager', EagerService, 'first_urgent', orders,
+                                                                     n_calls)
+    measure('first_urgent lazy', LazyService, 'first_urgent', orders, n_calls)
+    measure('total eager', EagerService, 'total', orders, n_calls)
+    measure('total lazy', LazyService, 'total', orders, n_calls)
+
+if __name__ == '__main__':
+    main(sys.argv)
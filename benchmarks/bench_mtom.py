@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares apply_mtom with the single-pass MTOM writer for responses with
+several large attachments.
+
+Every variant runs in a child process so that the peak rss figures don't
+interfere with each other.
+
+apply_mtom re-parses the envelope, which lxml refuses to do when a base64
+encoded attachment is larger than 10 MB, so keep the size below 7 MiB.
+
+Usage: python benchmarks/bench_mtom.py [attachment_size_in_mib]
+"""
+
+import os
+import resource
+import sys
+import time
+
+import soaplib
+
+from soaplib.core import Application
+from soaplib.core import namespaces
+from soaplib.core.mime import apply_mtom
+from soaplib.core.mime import apply_mtom_streaming
+from soaplib.core.mime import get_mtom_parts
+from soaplib.core.model.binary import Attachment
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class FileService(DefinitionBase):
+    data = None
+
+    @soap(_returns=(Attachment, Attachment, Attachment, Attachment), _mtom=True)
+    def get_files(self):
+        return [Attachment(data=self.data) for i in range(4)]
+
+request = """<?xml version='1.0' encoding='utf-8'?>
+<senv:Envelope xmlns:senv="%s" xmlns:tns="tns">
+  <senv:Body><tns:get_files/></senv:Body>
+</senv:Envelope>""" % namespaces.ns_soap_env
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def mtom(server, ctx, out_object):
+    params = list(ctx.descriptor.out_message._type_info.items())
+    headers = {'Content-Type': 'text/xml'}
+
+    out_string = server.get_out_string(ctx, out_object)
+    headers, body = apply_mtom(headers, out_string, params, out_object)
+
+    return len(body)
+
+def mtom_streaming(server, ctx, out_object):
+    params = list(ctx.descriptor.out_message._type_info.items())
+    headers = {'Content-Type': 'text/xml'}
+
+    out_object, parts = get_mtom_parts(params, out_object)
+    out_string = server.get_out_xml_string(ctx, out_object)
+    headers, chunks, length = apply_mtom_streaming(headers, out_string, parts)
+
+    retval = 0
+    for chunk in chunks:
+        retval += len(chunk)
+
+    return retval
+
+def run(label, server, func):
+    pid = os.fork()
+    if pid != 0:
+        os.waitpid(pid, 0)
+        return
+
+    ctx = soaplib.core.MethodContext()
+    in_object = server.get_in_object(ctx, request)
+    out_object = server.get_out_object(ctx, in_object)
+
+    rss0 = maxrss()
+
+    t0 = time.time()
+    length = func(server, ctx, out_object)
+    t = time.time() - t0
+
+    print "%-10s %7.3fs (%6.1f MiB/s) peak rss: +%.1f MiB" % (label, t,
+                              length / t / (1 << 20), maxrss() - rss0)
+
+    os._exit(0)
+
+def main(argv):
+    size = 4
+    if len(argv) > 1:
+        size = int(argv[1])
+
+    FileService.data = os.urandom(1 << 20) * size
+    server = wsgi.Application(Application([FileService], 'tns'))
+
+    run('apply_mtom', server, mtom)
+    run('streaming', server, mtom_streaming)
+
+if __name__ == '__main__':
+    main(sys.argv)
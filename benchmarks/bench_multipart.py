@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares collapse_swa with the incremental multipart/related parser on
+MTOM requests with several binary attachments.
+
+Every variant runs in a child process so that the peak rss figures don't
+interfere with each other.
+
+Usage: python benchmarks/bench_multipart.py [attachment_size_in_mib]
+"""
+
+import cStringIO
+import os
+import resource
+import sys
+import time
+
+from lxml import etree
+
+from soaplib.core import namespaces
+from soaplib.core.mime import collapse_swa
+from soaplib.core.mime import parse_multipart
+from soaplib.core.mime import remove_spooled_parts
+from soaplib.core.model.binary import Attachment
+from soaplib.core.model.binary import set_xop_parts
+
+n_attachments = 4
+
+def make_message(size):
+    data = os.urandom(1 << 20) * size
+
+    envelope = ['<senv:Envelope xmlns:senv="%s" xmlns:tns="tns" '
+                'xmlns:xop="%s"><senv:Body><tns:upload>' % (
+                                  namespaces.ns_soap_env, namespaces.ns_xop)]
+    for i in range(n_attachments):
+        envelope.append('<tns:a%d><xop:Include href="cid:a%d"/></tns:a%d>' %
+                                                                     (i, i, i))
+    envelope.append('</tns:upload></senv:Body></senv:Envelope>')
+
+    message = ['--boundary',
+               'Content-Type: application/xop+xml; type="text/xml"',
+               'Content-ID: <root>',
+               '',
+               ''.join(envelope)]
+    for i in range(n_attachments):
+        message.extend(['--boundary',
+                        'Content-Type: application/octet-stream',
+                        'Content-Transfer-Encoding: binary',
+                        'Content-ID: <a%d>' % i,
+                        '',
+                        data])
+    message.append('--boundary--')
+
+    return '\r\n'.join(message), ('multipart/related',
+                           {'boundary': 'boundary', 'start': '<root>'})
+
+def decode(envelope):
+    body = etree.fromstring(envelope)[0][0]
+    return [Attachment.from_xml(e) for e in body]
+
+def swa(message, content_type):
+    # collapse_swa only passes the mime type on to the email package, so the
+    # parameters have to be smuggled in with it.
+    params = '; '.join(['%s="%s"' % p for p in content_type[1].items()])
+    content_type = ('%s; %s' % (content_type[0], params), content_type[1])
+
+    return decode(collapse_swa(content_type, message))
+
+def streaming(message, content_type):
+    root, charset, parts = parse_multipart(cStringIO.StringIO(message),
+                                                    content_type, len(message))
+    set_xop_parts(parts)
+    try:
+        return decode(root)
+    finally:
+        set_xop_parts(None)
+        remove_spooled_parts(parts)
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(label, func, message, content_type):
+    pid = os.fork()
+    if pid != 0:
+        os.waitpid(pid, 0)
+        return
+
+    rss0 = maxrss()
+
+    t0 = time.time()
+    func(message, content_type)
+    t = time.time() - t0
+
+    print "%-10s %7.3fs (%6.1f MiB/s) peak rss: +%.1f MiB" % (label, t,
+                          len(message) / t / (1 << 20), maxrss() - rss0)
+
+    os._exit(0)
+
+def main(argv):
+    size = 4
+    if len(argv) > 1:
+        size = int(argv[1])
+
+    message, content_type = make_message(size)
+
+    run('swa', swa, message, content_type)
+    run('streaming', streaming, message, content_type)
+
+if __name__ == '__main__':
+    main(sys.argv)
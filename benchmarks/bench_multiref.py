@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares copying referenced elements into the tree with resolve_hrefs to
+resolving references while decoding, on SOAP-encoded arrays where every
+object is referenced many times.
+
+Every variant runs in a child process so that the peak rss figures don't
+interfere with each other.
+
+Usage: python benchmarks/bench_multiref.py [number_of_objects] [references_per_object]
+"""
+
+import os
+import resource
+import sys
+import time
+
+from soaplib.core._base import _from_soap
+from soaplib.core._base import _parse_xml_string
+from soaplib.core._base import resolve_hrefs
+from soaplib.core.model import set_xmlids
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+
+ns_test = 'bench'
+
+class Address(ClassModel):
+    street = String
+    city = String
+    zip = Integer
+
+class Person(ClassModel):
+    name = String
+    address = Address
+
+Response = ClassModel.produce(
+    namespace=ns_test,
+    type_name='response',
+    members={'people': Array(Person)},
+)
+
+def make_envelope(n, refs):
+    envelope = ['<senv:Envelope xmlns:senv="http://schemas.xmlsoap.org/soap/'
+                'envelope/" xmlns:b="bench"><senv:Body><b:response><people>']
+    for i in xrange(n * refs):
+        envelope.append('<Person href="#p%d"/>' % (i % n))
+    envelope.append('</people></b:response>')
+
+    for i in xrange(n):
+        envelope.append('<Person id="p%d"><name>person %d</name>'
+                        '<address href="#a%d"/></Person>' % (i, i, i % 10))
+    for i in xrange(10):
+        envelope.append('<Address id="a%d"><street>street %d</street>'
+                        '<city>istanbul</city><zip>%d</zip></Address>' % (i, i, i))
+
+    envelope.append('</senv:Body></senv:Envelope>')
+
+    return ''.join(envelope)
+
+def copying(root, xmlids):
+    resolve_hrefs(root, xmlids)
+    header, body = _from_soap(root, xmlids)
+    return Response.from_xml(body)
+
+def sharing(root, xmlids):
+    header, body = _from_soap(root, xmlids)
+    set_xmlids(xmlids)
+    try:
+        return Response.from_xml(body)
+    finally:
+        set_xmlids(None)
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(label, func, envelope):
+    pid = os.fork()
+    if pid != 0:
+        os.waitpid(pid, 0)
+        return
+
+    root, xmlids = _parse_xml_string(envelope)
+    rss0 = maxrss()
+
+    t0 = time.time()
+    result = func(root, xmlids)
+    t = time.time() - t0
+
+    people = result.people
+    print "%-10s %7.3fs %8d references %8d distinct objects " \
+          "peak rss: +%.1f MiB" % (label, t, len(people),
+                   len(set([id(p) for p in people])), maxrss() - rss0)
+
+    os._exit(0)
+
+def main(argv):
+    n = 1000
+    refs = 100
+    if len(argv) > 1:
+        n = int(argv[1])
+    if len(argv) > 2:
+        refs = int(argv[2])
+
+    envelope = make_envelope(n, refs)
+
+    run('copying', copying, envelope)
+    run('sharing', sharing, envelope)
+
+if __name__ == '__main__':
+    main(sys.argv)
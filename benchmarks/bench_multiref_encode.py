@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the encode time and payload size of responses where many objects
+share a few others, with and without multi-ref encoding.
+
+Usage: python benchmarks/bench_multiref_encode.py [number_of_orders] [number_of_customers]
+"""
+
+import sys
+import time
+
+from lxml import etree
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Address(ClassModel):
+    street = String
+    city = String
+    country = String
+    zip = Integer
+
+class Customer(ClassModel):
+    name = String
+    email = String
+    billing_address = Address
+    shipping_address = Address
+
+class Order(ClassModel):
+    id = Integer
+    customer = Customer
+
+class OrderService(DefinitionBase):
+    orders = None
+
+    @soap(_returns=Array(Order))
+    def get_orders(self):
+        return self.orders
+
+    @soap(_returns=Array(Order), _multiref=True)
+    def get_orders_multiref(self):
+        return self.orders
+
+def make_orders(n, n_customers):
+    customers = []
+    for i in xrange(n_customers):
+        address = Address(street='street %d' % i, city='istanbul',
+                          country='turkey', zip=i)
+        customers.append(Customer(name='customer %d' % i,
+                     email='customer%d@example.com' % i,
+                     billing_address=address, shipping_address=address))
+
+    return [Order(id=i, customer=customers[i % n_customers]) for i in xrange(n)]
+
+def run(app, method_name):
+    ctx = MethodContext()
+    ctx.service = app.get_service(OrderService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+
+    t0 = time.time()
+    out_object = getattr(ctx.service, method_name)()
+    envelope = app.serialize_soap(ctx, Application.OUT_WRAPPER, out_object)
+    payload = etree.tostring(envelope)
+    t = time.time() - t0
+
+    print "%-20s %7.3fs %10d bytes" % (method_name, t, len(payload))
+
+def main(argv):
+    n = 10000
+    n_customers = 10
+    if len(argv) > 1:
+        n = int(argv[1])
+    if len(argv) > 2:
+        n_customers = int(argv[2])
+
+    OrderService.orders = make_orders(n, n_customers)
+    app = Application([OrderService], 'tns')
+
+    run(app, 'get_orders')
+    run(app, 'get_orders_multiref')
+
+if __name__ == '__main__':
+    main(sys.argv)
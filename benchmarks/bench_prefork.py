@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures the throughput of the prefork server with an increasing number of
+workers, and how much of the memory of each worker is shared with the others.
+
+The server is started in a child process and loaded with concurrent clients
+that send the same request over new connections. The memory of the workers is
+read from /proc/<pid>/smaps_rollup, so it's only reported on linux. Private
+memory is what each worker costs on top of the shared pages it inherited from
+the parent.
+
+Usage: python benchmarks/bench_prefork.py [duration_in_seconds]
+"""
+
+import httplib
+import os
+import signal
+import sys
+import threading
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.client.http import Client as HttpClient
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server.prefork import Server
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+n_clients = 8
+
+class PreforkService(DefinitionBase):
+    @soap(String, Integer, _returns=Array(String))
+    def repeat(self, s, n):
+        return [s] * n
+
+    @soap(_returns=Integer)
+    def get_pid(self):
+        return os.getpid()
+
+def get_request(app, method_name, args):
+    ctx = MethodContext()
+    ctx.service = app.get_service(PreforkService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+
+    return Client(app).get_request_string(ctx, args, {})
+
+def post(address, request):
+    connection = httplib.HTTPConnection(*address)
+    try:
+        connection.request('POST', '/', request,
+                                {'Content-Type': 'text/xml; charset=utf-8'})
+        return connection.getresponse().read()
+
+    finally:
+        connection.close()
+
+def get_memory(pid):
+    """Returns the rss and the private memory of the given process, in kB."""
+
+    values = {}
+    try:
+        for line in open('/proc/%d/smaps_rollup' % pid):
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == 'kB':
+                values[fields[0][:-1]] = int(fields[1])
+
+    except IOError:
+        return None, None
+
+    return values['Rss'], values['Private_Clean'] + values['Private_Dirty']
+
+def run(workers, duration):
+    app = Application([PreforkService], 'tns')
+    server = Server(app, ('127.0.0.1', 0), workers=workers)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+
+    server.socket.close()
+    try:
+        measure(app, server, pid, workers, duration)
+
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+def measure(app, server, server_pid, workers, duration):
+    address = server.server_address
+    request = get_request(app, 'repeat', ('soaplib', 10))
+
+    counts = []
+    def load():
+        n = 0
+        end = time.time() + duration
+        while time.time() < end:
+            post(address, request)
+            n += 1
+        counts.append(n)
+
+    clients = [threading.Thread(target=load) for i in range(n_clients)]
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+
+    # the workers answer with their pids.
+    client = HttpClient('http://%s:%d/' % address, app)
+    pids = set([client.service.get_pid() for i in range(workers * 20)])
+
+    print "%d workers: %7.1f requests/s" % (workers, sum(counts) / duration)
+
+    memory = [get_memory(p) for p in sorted(pids)]
+    if memory[0][0] is not None:
+        print "  parent   rss %6d kB, private %6d kB" % get_memory(server_pid)
+        for rss, private in memory:
+            print "  worker   rss %6d kB, private %6d kB" % (rss, private)
+
+def main(argv):
+    duration = 3
+    if len(argv) > 1:
+        duration = float(argv[1])
+
+    print "%d cpus, %d concurrent clients" % (os.sysconf('SC_NPROCESSORS_ONLN'),
+                                                                     n_clients)
+    for workers in (1, 2, 4):
+        run(workers, duration)
+
+if __name__ == '__main__':
+    main(sys.argv)
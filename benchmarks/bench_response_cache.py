@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the number of requests per second the wsgi server answers for an
+operation returning a few hundred objects, with and without a response cache.
+
+Usage: python benchmarks/bench_response_cache.py [number_of_requests] [number_of_objects]
+"""
+
+import cStringIO
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.cache import ResponseCache
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Product(ClassModel):
+    id = Integer
+    name = String
+    category = String
+
+cache = ResponseCache(ttl=60)
+
+class ProductService(DefinitionBase):
+    products = []
+
+    @soap(String, _returns=Array(Product))
+    def products_plain(self, category):
+        return self.products
+
+    @soap(String, _returns=Array(Product), _cache=cache)
+    def products_cached(self, category):
+        return self.products
+
+def run(app, method_name, n):
+    ctx = MethodContext()
+    ctx.service = app.get_service(ProductService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    request = Client(app).get_request_string(ctx, ('books',), {})
+
+    server = wsgi.Application(app)
+    def start_response(status, headers):
+        pass
+
+    t0 = time.time()
+    for i in xrange(n):
+        ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+    t = time.time() - t0
+
+    print "%-16s %8.0f requests/s" % (method_name, n / t)
+
+def main(argv):
+    n = 1000
+    n_objects = 200
+    if len(argv) > 1:
+        n = int(argv[1])
+    if len(argv) > 2:
+        n_objects = int(argv[2])
+
+    ProductService.products = [Product(id=i, name='product %d' % i,
+                              category='books') for i in range(n_objects)]
+    app = Application([ProductService], 'tns')
+
+    run(app, 'products_plain', n)
+    run(app, 'products_cached', n)
+
+    print "hits: %d, misses: %d" % (cache.hits, cache.misses)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares a per-process ResponseCache with a SharedResponseCache when several
+worker processes answer the same requests, like the workers of a prefork
+server do. Every worker answers every request of the workload once, in its own
+order.
+
+Usage: python benchmarks/bench_shared_cache.py [number_of_workers] [number_of_distinct_requests]
+"""
+
+import cStringIO
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.cache import ResponseCache
+from soaplib.core.cache import SharedResponseCache
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Product(ClassModel):
+    id = Integer
+    name = String
+
+def make_service(cache):
+    class ProductService(DefinitionBase):
+        @soap(Integer, _returns=Array(Product), _cache=cache)
+        def products(self, category):
+            return [Product(id=i, name='product %d/%d' % (category, i))
+                                                          for i in range(50)]
+
+    return ProductService
+
+def worker(app, service, requests, w):
+    server = wsgi.Application(app)
+    def start_response(status, headers):
+        pass
+
+    requests = list(requests)
+    random.Random(w).shuffle(requests)
+
+    for request in requests:
+        ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+
+def run(label, make_cache, n_workers, n_requests):
+    cache = make_cache()
+    service = make_service(cache)
+    app = Application([service], 'tns')
+
+    ctx = MethodContext()
+    ctx.service = app.get_service(service)
+    ctx.descriptor = ctx.service.get_method('products')
+    client = Client(app)
+    requests = [client.get_request_string(ctx, (i,), {})
+                                                    for i in range(n_requests)]
+
+    t0 = time.time()
+    pids = []
+    pipes = []
+    for w in range(n_workers):
+        r, wr = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            worker(app, service, requests, w)
+            os.write(wr, '%d %d' % (cache.hits, cache.misses))
+            os._exit(0)
+
+        os.close(wr)
+        pids.append(pid)
+        pipes.append(r)
+
+    hits = misses = 0
+    for pid, r in zip(pids, pipes):
+        h, m = os.read(r, 64).split()
+        hits += int(h)
+        misses += int(m)
+        os.close(r)
+        os.waitpid(pid, 0)
+    t = time.time() - t0
+
+    print "%-10s %7.3fs %8.0f requests/s  hits: %6d  misses: %6d" % (label,
+                               t, n_workers * n_requests / t, hits, misses)
+
+def main(argv):
+    n_workers = 8
+    n_requests = 500
+    if len(argv) > 1:
+        n_workers = int(argv[1])
+    if len(argv) > 2:
+        n_requests = int(argv[2])
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        run('private', lambda: ResponseCache(ttl=60), n_workers, n_requests)
+        run('shared', lambda: SharedResponseCache(
+                               os.path.join(tmp_dir, 'cache'), ttl=60,
+                               n_slots=4096, slot_size=8192),
+                                                         n_workers, n_requests)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    main(sys.argv)
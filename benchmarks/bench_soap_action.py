@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Measures how fast the wsgi server rejects the requests to a method whose
+limiter is full, with and without the SOAPAction header. With the header, the
+request is rejected before it's read; without it, it's read, parsed and
+decoded first.
+
+Usage: python benchmarks/bench_soap_action.py [number_of_items] [number_of_calls]
+"""
+
+import cStringIO
+import sys
+import time
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+backend = Limiter(max_concurrency=1)
+
+class BatchService(DefinitionBase):
+    @soap(Array(String), _returns=String, _limiter=backend)
+    def store(self, items):
+        return 'stored'
+
+def get_request(app, n_items):
+    ctx = MethodContext()
+    ctx.service = app.get_service(BatchService)
+    ctx.descriptor = ctx.service.get_method('store')
+
+    items = ['item %d' % i for i in xrange(n_items)]
+
+    return Client(app).get_request_string(ctx, (items,), {})
+
+def call(server, request, soap_action):
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    env = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': 'text/xml; charset=utf-8',
+    }
+    if soap_action is not None:
+        env['HTTP_SOAPACTION'] = soap_action
+
+    response = ''.join(server(env, start_response))
+
+    assert status[0] == wsgi.HTTP_503, (status, response[:500])
+
+def measure(name, server, request, soap_action, n_calls):
+    t0 = time.time()
+    for i in xrange(n_calls):
+        call(server, request, soap_action)
+    t = (time.time() - t0) / n_calls
+
+    print "%-12s %9.3f ms/rejection" % (name, t * 1000)
+
+def main(argv):
+    n_items = 10000
+    n_calls = 100
+    if len(argv) > 1:
+        n_items = int(argv[1])
+    if len(argv) > 2:
+        n_calls = int(argv[2])
+
+    app = Application([BatchService], 'tns')
+    server = wsgi.Application(app)
+    request = get_request(app, n_items)
+
+    # the method is busy for the whole run.
+    backend.acquire()
+
+    print "%d items, request %d bytes" % (n_items, len(request))
+    measure('body', server, request, None, n_calls)
+    measure('SOAPAction', server, request, '"store"', n_calls)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the native twisted.web resource with the wsgi application mounted
+in twisted's WSGIResource.
+
+The server is started in a child process with both resources, and loaded with
+concurrent clients that send the same request over new connections. The
+'repeat' method only costs cpu. The 'pause' method waits for a backend that
+takes 50ms to answer: the native resource returns a Deferred for it, while the
+wsgi application blocks one of the threads of the reactor's thread pool.
+
+Usage: python benchmarks/bench_twisted.py [duration_in_seconds]
+"""
+
+import httplib
+import os
+import signal
+import sys
+import threading
+import time
+
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.python import threadable
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+from twisted.web.wsgi import WSGIResource
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.server.twisted_web import TwistedWebResource
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class TwistedService(DefinitionBase):
+    @soap(String, Integer, _returns=Array(String))
+    def repeat(self, s, n):
+        return [s] * n
+
+    @soap(Float, _returns=Float)
+    def pause(self, seconds):
+        if threadable.isInIOThread():
+            return task.deferLater(reactor, seconds, lambda: seconds)
+
+        time.sleep(seconds)
+        return seconds
+
+def get_request(app, method_name, args):
+    ctx = MethodContext()
+    ctx.service = app.get_service(TwistedService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+
+    return Client(app).get_request_string(ctx, args, {})
+
+def post(address, path, request):
+    connection = httplib.HTTPConnection(*address)
+    try:
+        connection.request('POST', path, request,
+                                {'Content-Type': 'text/xml; charset=utf-8'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    finally:
+        connection.close()
+
+def serve(app):
+    root = Resource()
+    root.putChild('wsgi', WSGIResource(reactor, reactor.getThreadPool(),
+                                                        wsgi.Application(app)))
+    root.putChild('native', TwistedWebResource(app))
+
+    port = reactor.listenTCP(0, Site(root), interface='127.0.0.1')
+
+    return port.getHost().port
+
+def measure(address, path, request, n_clients, duration):
+    counts = []
+    errors = []
+    def load():
+        n = 0
+        end = time.time() + duration
+        while time.time() < end:
+            if post(address, path, request) == 200:
+                n += 1
+            else:
+                errors.append(1)
+        counts.append(n)
+
+    clients = [threading.Thread(target=load) for i in range(n_clients)]
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+
+    return sum(counts) / duration, len(errors)
+
+def main(argv):
+    duration = 3
+    if len(argv) > 1:
+        duration = float(argv[1])
+
+    app = Application([TwistedService], 'tns')
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_end)
+            os.write(write_end, '%d\n' % serve(app))
+            os.close(write_end)
+            reactor.run()
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    address = ('127.0.0.1', int(os.fdopen(read_end).readline()))
+
+    try:
+        cases = [
+            ('repeat', get_request(app, 'repeat', ('soaplib', 10)), 8),
+            ('pause', get_request(app, 'pause', (0.05,)), 64),
+        ]
+
+        print "%d thread pool threads" % reactor.getThreadPool().max
+        for name, request, n_clients in cases:
+            print "%s, %d concurrent clients:" % (name, n_clients)
+            for path in ('/wsgi', '/native'):
+                rate, errors = measure(address, path, request, n_clients,
+                                                                      duration)
+                print "  %-8s %7.1f requests/s, %d errors" % (path, rate,
+                                                                        errors)
+
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Compares the latency of calls over the unix socket transport with calls over
+http on the loopback interface.
+
+Both servers run in child processes. The http server is the twisted.web
+resource, as it keeps the connections open like the unix socket server does,
+and the http client reuses its connections. Each call is timed by the client,
+one at a time, then the same calls are made 8 at a time with gather, which
+pipelines them on the single connection of the unix socket client.
+
+Usage: python benchmarks/bench_unix.py [number_of_calls]
+"""
+
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+from soaplib.core import Application
+from soaplib.core.client.http import Client as HttpClient
+from soaplib.core.client.http import ConnectionPool
+from soaplib.core.client.unix import Client as UnixClient
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server.unix import Server as UnixServer
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class UnixService(DefinitionBase):
+    @soap(String, Integer, _returns=Array(String))
+    def repeat(self, s, n):
+        return [s] * n
+
+def serve_http(app, write_end):
+    from twisted.internet import reactor
+    from twisted.web.server import Site
+    from soaplib.core.server.twisted_web import TwistedWebResource
+
+    port = reactor.listenTCP(0, Site(TwistedWebResource(app)),
+                                                       interface='127.0.0.1')
+    os.write(write_end, '%d\n' % port.getHost().port)
+    reactor.run()
+
+def serve_unix(app, path, write_end):
+    server = UnixServer(app, path)
+    os.write(write_end, 'ready\n')
+    server.serve_forever()
+
+def start(f, *args):
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_end)
+            f(*args + (write_end,))
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    return pid, os.fdopen(read_end).readline().strip()
+
+def measure(name, client, n):
+    for i in range(100):
+        client.service.repeat('soaplib', 10)
+
+    times = []
+    for i in range(n):
+        t0 = time.time()
+        client.service.repeat('soaplib', 10)
+        times.append(time.time() - t0)
+
+    times.sort()
+    print "%-5s  mean %6.1f us, p50 %6.1f us, p99 %6.1f us" % (name,
+                1e6 * sum(times) / n, 1e6 * times[n // 2],
+                1e6 * times[int(n * .99)])
+
+    t0 = time.time()
+    client.gather([(client.service.repeat, ('soaplib', 10))] * n,
+                                                             max_concurrency=8)
+    print "       8 concurrent calls: %7.1f calls/s" % (n / (time.time() - t0))
+
+def main(argv):
+    n = 2000
+    if len(argv) > 1:
+        n = int(argv[1])
+
+    app = Application([UnixService], 'tns')
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'soap.sock')
+
+    http_pid, port = start(serve_http, app)
+    unix_pid, ready = start(serve_unix, app, path)
+    try:
+        measure('http', HttpClient('http://127.0.0.1:%s/' % port, app,
+                                     pool=ConnectionPool(max_connections=8)), n)
+        measure('unix', UnixClient(path, app), n)
+
+    finally:
+        for pid in (http_pid, unix_pid):
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -23,13 +23,26 @@ import warnings
 
 import shutil
 import tempfile
-import traceback
+import threading
+import time
 
 from lxml import etree
 
 from soaplib.core import namespaces
-
+from soaplib.core.admission import Busy
+from soaplib.core.cache import CachedResponse
+from soaplib.core.deadline import Deadline
+from soaplib.core.deadline import DeadlineExceeded
+from soaplib.core.deadline import earliest
+from soaplib.core.deadline import ns_deadline
+from soaplib.core.lazy import get_lazy_instance
+
+from soaplib.core.model import decode_targets
+from soaplib.core.model import set_multiref_output
+from soaplib.core.model import set_xmlids
+from soaplib.core.model.binary import get_xop_parts
 from soaplib.core.model.exception import Fault
+from soaplib.core.util.frozendict import frozendict
 from soaplib.core.util.odict import odict
 from soaplib.core.wsdl import WSDL
 
@@ -40,6 +53,44 @@ HTTP_405 = '405 Method Not Allowed'
 class ValidationError(Fault):
     pass
 
+# class -> [start of the current one-second window, faults logged in it,
+# faults suppressed in it]. the counts are approximate when there are
+# concurrent requests, which is fine for log throttling.
+_fault_log_windows = {}
+
+def _log_fault(fault, exc_info=True):
+    '''Logs the fault that is being handled, along with its traceback,
+    according to the log_level, log_traceback and log_rate attributes of its
+    class. Must be called from an except block, unless the exc_info tuple of
+    the fault is given.'''
+
+    cls = fault.__class__
+    level = cls.log_level
+    if level is None or not logger.isEnabledFor(level):
+        return
+
+    suppressed = 0
+    if cls.log_rate is not None:
+        now = time.time()
+        window = _fault_log_windows.get(cls)
+        if window is None or now - window[0] >= 1.0:
+            if window is not None:
+                suppressed = window[2]
+            window = _fault_log_windows[cls] = [now, 0, 0]
+
+        if window[1] >= cls.log_rate:
+            window[2] += 1
+            return
+
+        window[1] += 1
+
+    exc_info = cls.log_traceback and exc_info
+    if suppressed > 0:
+        logger.log(level, "%r (%d similar faults were not logged)",
+                                   fault, suppressed, exc_info=exc_info)
+    else:
+        logger.log(level, "%r", fault, exc_info=exc_info)
+
 class _SchemaInfo(object):
     def __init__(self):
         self.elements = odict()
@@ -171,7 +222,22 @@ class MethodContext(object):
 
         self.method_name = None
         self.descriptor = None
-        
+
+        # set by Application.process_request when the response is to be cached
+        self.cache_key = None
+
+        # set by Application.process_request when the request is coalesced
+        # with identical ones, see soaplib.core.coalesce.
+        self.flight = None
+
+        # the soaplib.core.deadline.Deadline of the request, if it has one.
+        self.deadline = None
+
+        # False when the request is handled in a thread that mustn't block,
+        # like the reactor thread of the twisted server. see
+        # Application.process_request.
+        self.blocking = True
+
 class MethodDescriptor(object):
     '''
     This class represents the method signature of a soap method,
@@ -192,6 +258,15 @@ class MethodDescriptor(object):
                  faults=(),
                  body_style='rpc', # backward compatibility
                  port_type=None, #added to support multiple portTypes
+                 decode_as=None,
+                 multiref=False,
+                 cache=None,
+                 coalesce=None,
+                 limiter=None,
+                 priority=0,
+                 timeout=None,
+                 max_request_size=None,
+                 lazy=False,
                 ):
 
         self.name = name
@@ -207,15 +282,23 @@ class MethodDescriptor(object):
         self.faults = faults
         self.body_style = body_style
         self.port_type = port_type
+        self.decode_as = decode_as
+        self.multiref = multiref
+        self.cache = cache
+        self.coalesce = coalesce
+        self.limiter = limiter
+        self.priority = priority
+        self.timeout = timeout
+        self.max_request_size = max_request_size
+        self.lazy = lazy
 
 def _from_soap(in_envelope_xml, xmlids=None):
     '''
-    Parses the xml string into the header and payload
+    Parses the xml string into the header and payload. The href references
+    in them are resolved during deserialization, see
+    soaplib.core.model.base.set_xmlids.
     '''
 
-    if xmlids:
-        resolve_hrefs(in_envelope_xml, xmlids)
-
     if in_envelope_xml.tag != '{%s}Envelope' % namespaces.ns_soap_env:
         raise Fault('Client.SoapError', 'No {%s}Envelope element was found!' %
                                                             namespaces.ns_soap_env)
@@ -226,8 +309,7 @@ def _from_soap(in_envelope_xml, xmlids=None):
                                           namespaces={'e': namespaces.ns_soap_env})
 
     if len(header_envelope) == 0 and len(body_envelope) == 0:
-        raise Fault('Client.SoapError', 'Soap envelope is empty!' %
-                                                            namespaces.ns_soap_env)
+        raise Fault('Client.SoapError', 'Soap envelope is empty!')
 
     header=None
     if len(header_envelope) > 0 and len(header_envelope[0]) > 0:
@@ -254,6 +336,10 @@ def _parse_xml_string(xml_string, charset=None):
 
 # see http://www.w3.org/TR/2000/NOTE-SOAP-20000508/
 # section 5.2.1 for an example of how the id and href attributes are used.
+#
+# this copies the referenced elements into the tree, which breaks shared
+# references. it's not used by soaplib anymore, Application.deserialize_soap
+# resolves the references while decoding instead.
 def resolve_hrefs(element, xmlids):
     for e in element:
         if e.get('id'):
@@ -289,24 +375,37 @@ class Application(object):
     class OUT_WRAPPER:
         pass
 
-    def __init__(self, services, tns, name=None, _with_partnerlink=False):
+    def __init__(self, services, tns, name=None, _with_partnerlink=False,
+                                                                decode_as=None):
         '''
         @param An iterable of ServiceBase subclasses that define the exposed
                services.
         @param The targetNamespace attribute of the exposed service.
         @param The name attribute of the exposed service.
         @param Flag to indicate whether to generate partnerlink node in wsdl.
+        @param What incoming ClassModels are deserialized to, unless overridden
+               by the _decode_as argument of the @soap decorator. One of
+               soaplib.core.model.base.decode_targets.
         '''
 
+        if not (decode_as is None or decode_as in decode_targets):
+            raise ValueError("decode_as must be one of %r, not %r" %
+                                                    (decode_targets, decode_as))
+
         self.services = services
+        self.decode_as = decode_as
         self.__tns = tns
         self.__name = name
         self._with_plink = _with_partnerlink
 
         self.call_routes = {}
+        self.action_routes = {}
         self.wsdl = None
+        self.__wsdl_lock = threading.Lock()
+        self.__wsdl_string = None
         self.__public_methods = {}
         self.__classes = {}
+        self.frozen = False
 
         self.__ns_counter = 0
 
@@ -316,6 +415,35 @@ class Application(object):
         self.schema = self.build_schema()
 
 
+    def freeze(self, url=None):
+        """Builds what's otherwise built while the first requests are served,
+        and makes the namespace maps and the call routes read-only. Serving
+        requests doesn't modify the application afterwards, so it can be
+        shared by any number of threads without locks, and the responses
+        don't change when e.g. the wsdl is first requested.
+
+        Namespaces that aren't part of the schema of the application can't be
+        serialized once it's frozen.
+
+        @param The url the wsdl document is built with. When it's not given,
+               the wsdl is built by the first request for it.
+        """
+
+        if self.frozen:
+            return
+
+        # building the wsdl moves the target namespace to the tns prefix.
+        self.set_namespace_prefix(self.get_tns(), 'tns')
+
+        self.nsmap = frozendict(self.nsmap)
+        self.prefmap = frozendict(self.prefmap)
+        self.call_routes = frozendict(self.call_routes)
+        self.action_routes = frozendict(self.action_routes)
+        self.frozen = True
+
+        if url is not None:
+            self.get_wsdl(url)
+
     def update_pref_map(self, ns_prefix, namespace):
         """Updates the NS Prefix Mapping for custom Prefix Mapping"""
         self.prefmap[namespace] = ns_prefix
@@ -331,6 +459,17 @@ class Application(object):
 
     def decompose_incoming_envelope(self, ctx, envelope_xml, xmlids=None):
         header, body = _from_soap(envelope_xml, xmlids)
+        if body is None:
+            raise Fault('Client.SoapError', 'Soap body is empty!')
+
+        if header is not None:
+            timeout = header.getparent().find('{%s}Timeout' % ns_deadline)
+            if timeout is not None:
+                ctx.deadline = Deadline.from_header(timeout)
+
+                # it's not the header the method is expecting.
+                if header is timeout:
+                    header = timeout.getnext()
 
         # FIXME: find a way to include soap env schema with soaplib package and
         # properly validate the whole request.
@@ -362,7 +501,10 @@ class Application(object):
                     ctx.service_class = self.get_service_class(ctx.method_name)
 
             except Exception,e:
-                logger.debug(traceback.format_exc())
+                # formatting the traceback is expensive, so it's only done when
+                # it's going to be logged.
+                logger.debug("Method not found: %r", ctx.method_name,
+                                                                  exc_info=True)
                 raise ValidationError('Client', 'Method not found: %r' %
                                                                 ctx.method_name)
 
@@ -400,23 +542,75 @@ class Application(object):
                     descriptor = ctx.descriptor
 
             if wrapper is Application.IN_WRAPPER:
+                # the method may have been resolved from the soapAction. the
+                # body element is found by its local name, as it is when the
+                # method is found from the body, so it may be unqualified.
+                if (ctx.in_body_xml.tag.split('}')[-1] !=
+                                            ctx.method_name.split('}')[-1]):
+                    raise ValidationError('Client', 'The body of the request '
+                              'is not %r but %r' % (ctx.method_name,
+                                                         ctx.in_body_xml.tag))
+
+                if descriptor.timeout is not None:
+                    ctx.deadline = earliest(ctx.deadline,
+                                                 Deadline(descriptor.timeout))
+                ctx.service.deadline = ctx.deadline
+
                 header_class = descriptor.in_header
                 body_class = descriptor.in_message
             elif wrapper is Application.OUT_WRAPPER:
                 header_class = descriptor.out_header
                 body_class = descriptor.out_message
 
-            # decode header object
-            if (ctx.in_header_xml is not None and
-                len(ctx.in_header_xml) > 0 and
-                header_class is not None):
-                ctx.service.in_header = header_class.from_xml(ctx.in_header_xml)
+            decode_as = descriptor.decode_as
+            if decode_as is None:
+                decode_as = self.decode_as
 
-            # decode method arguments
-            if ctx.in_body_xml is not None and len(ctx.in_body_xml) > 0:
-                in_body = body_class.from_xml(ctx.in_body_xml)
-            else:
-                in_body = [None] * len(body_class._type_info)
+            # references and attachments can't be resolved once the request
+            # is deserialized, see soaplib.core.lazy.
+            lazy = (descriptor.lazy and wrapper is Application.IN_WRAPPER and
+                                       not xmlids and not get_xop_parts())
+            if lazy:
+                decode_as = None
+
+            # references (href="#id") are resolved while decoding.
+            set_xmlids(xmlids)
+            try:
+                # decode header object
+                if (ctx.in_header_xml is not None and
+                    len(ctx.in_header_xml) > 0 and
+                    header_class is not None):
+                    if lazy:
+                        ctx.service.in_header = get_lazy_instance(header_class,
+                                                              ctx.in_header_xml)
+                    elif decode_as is None:
+                        ctx.service.in_header = header_class.from_xml(
+                                                              ctx.in_header_xml)
+                    else:
+                        ctx.service.in_header = header_class.from_xml(
+                                                   ctx.in_header_xml, decode_as)
+
+                # decode method arguments
+                if ctx.in_body_xml is not None and len(ctx.in_body_xml) > 0:
+                    if lazy:
+                        in_body = get_lazy_instance(body_class,
+                                                               ctx.in_body_xml)
+                    elif decode_as is None:
+                        in_body = body_class.from_xml(ctx.in_body_xml)
+
+                    else:
+                        in_body = body_class.from_xml(ctx.in_body_xml,
+                                                                      decode_as)
+
+                        # the arguments are passed around as a sequence.
+                        if decode_as == 'dict':
+                            in_body = [in_body[k] for k in
+                                                   body_class._type_info.keys()]
+                else:
+                    in_body = [None] * len(body_class._type_info)
+
+            finally:
+                set_xmlids(None)
 
         return in_body
 
@@ -424,9 +618,105 @@ class Application(object):
         """Takes a MethodContext instance and the native request object.
         Returns the response to the request as a native python object.
 
+        When the method has a response cache and it has a fresh response to
+        the request, the method is not called and a CachedResponse is returned.
+        When the method has a coalescer and an identical request is being
+        processed, the method is not called either and the return value of
+        that request is returned. When the method has a limiter that doesn't
+        admit the request, a soaplib.core.admission.Busy fault is returned.
+        When the request has a deadline that passes before the method is
+        called, a soaplib.core.deadline.DeadlineExceeded fault is returned.
+
+        When ctx.blocking is False, the requests a limiter would queue are
+        rejected with a Busy fault, and a coalesced request doesn't wait for
+        the identical one: its flight is returned, and the server gets the
+        result with Coalescer.add_callback. When the method returns a
+        Deferred, the requests coalesced with it get what it fires with.
+
         Not meant to be overridden.
         """
 
+        if ctx.deadline is not None and ctx.deadline.expired():
+            return DeadlineExceeded()
+
+        cache = ctx.descriptor.cache
+        if cache is not None:
+            # the arguments are fingerprinted as the sequence the method is
+            # called with, whatever the message was decoded to.
+            key = cache.get_key(ctx.descriptor.name, list(req_obj),
+                                                         ctx.service.in_header)
+            if key is not None:
+                out_string = cache.get(key)
+                if out_string is not None:
+                    return CachedResponse(out_string)
+
+                ctx.cache_key = key
+
+        coalescer = ctx.descriptor.coalesce
+        if coalescer is not None:
+            key = coalescer.get_key(ctx.descriptor.name, list(req_obj),
+                                                         ctx.service.in_header)
+            if key is not None:
+                ctx.flight, leader = coalescer.join(key, ctx)
+                if not leader:
+                    if not ctx.blocking:
+                        return ctx.flight
+                    return coalescer.wait(ctx.flight, ctx.deadline)
+
+                try:
+                    retval = self.__call_method(ctx, req_obj)
+
+                except:
+                    coalescer.finish(ctx.flight, Fault('Server',
+                                                 'The identical request failed'))
+                    raise
+
+                # a twisted Deferred.
+                if hasattr(retval, 'addCallbacks'):
+                    self.__finish_flight_later(coalescer, ctx.flight, retval)
+                else:
+                    coalescer.finish(ctx.flight, retval)
+
+                return retval
+
+        return self.__call_method(ctx, req_obj)
+
+    def __finish_flight_later(self, coalescer, flight, d):
+        def finish(result):
+            coalescer.finish(flight, result)
+            return result
+
+        def fail(failure):
+            fault = failure.value
+            if not isinstance(fault, Fault):
+                fault = Fault('Server', 'The identical request failed')
+
+            coalescer.finish(flight, fault)
+            return failure
+
+        d.addCallbacks(finish, fail)
+
+    def __call_method(self, ctx, req_obj):
+        limiter = ctx.descriptor.limiter
+        if limiter is None:
+            return self.__call_admitted_method(ctx, req_obj)
+
+        if not limiter.acquire(ctx.descriptor.priority, ctx.deadline,
+                                                                ctx.blocking):
+            if ctx.deadline is not None and ctx.deadline.expired():
+                return DeadlineExceeded()
+            return Busy()
+
+        try:
+            return self.__call_admitted_method(ctx, req_obj)
+        finally:
+            limiter.release()
+
+    def __call_admitted_method(self, ctx, req_obj):
+        # it may have passed while waiting for admission.
+        if ctx.deadline is not None and ctx.deadline.expired():
+            return DeadlineExceeded()
+
         try:
             # implementation hook
             ctx.service.on_method_call(ctx.method_name,req_obj,ctx.in_body_xml)
@@ -438,17 +728,15 @@ class Application(object):
             retval = ctx.service.call_wrapper(func, req_obj)
 
         except Fault, e:
-            stacktrace=traceback.format_exc()
-            logger.error(stacktrace)
+            _log_fault(e)
 
             retval = e
 
         except Exception, e:
-            stacktrace=traceback.format_exc()
-            logger.error(stacktrace)
-
             retval = Fault('Server', str(e))
 
+            _log_fault(retval)
+
         # implementation hook
         if isinstance(retval, Fault):
             ctx.service.on_method_exception_object(retval)
@@ -470,6 +758,11 @@ class Application(object):
         assert wrapper in (Application.IN_WRAPPER, Application.OUT_WRAPPER,
                                                  Application.NO_WRAPPER),wrapper
 
+        # the cached responses are normally sent as they are, see
+        # soaplib.core.server.Base.get_out_xml_string.
+        if isinstance(out_object, CachedResponse):
+            return etree.fromstring(out_object.out_string)
+
         # construct the soap response, and serialize it
         envelope = etree.Element('{%s}Envelope' % namespaces.ns_soap_env,
                                                                nsmap=self.nsmap)
@@ -547,8 +840,12 @@ class Application(object):
                             setattr(result_message, attr_name, out_object[i])
 
             # transform the results into an element
-            result_message_class.to_parent_element(
+            set_multiref_output(ctx.descriptor.multiref)
+            try:
+                result_message_class.to_parent_element(
                                   result_message, self.get_tns(), out_body_xml)
+            finally:
+                set_multiref_output(False)
 
             if logger.level == logging.DEBUG:
                 logger.debug('\033[91m'+ "Response" + '\033[0m')
@@ -576,6 +873,10 @@ class Application(object):
         assert (isinstance(ns, str) or isinstance(ns, unicode)), ns
 
         if ns not in self.prefmap:
+            if self.frozen:
+                raise ValueError("Namespace %r is not known to the frozen "
+                                 "application" % ns)
+
             pref = "s%d" % self.__ns_counter
             while pref in self.nsmap:
                 self.__ns_counter += 1
@@ -598,6 +899,9 @@ class Application(object):
         Not meant to be overridden.
         """
 
+        if self.prefmap.get(ns) == pref:
+            return
+
         if pref in self.nsmap and self.nsmap[pref] != ns:
             ns_old = self.nsmap[pref]
             del self.prefmap[ns_old]
@@ -711,6 +1015,13 @@ class Application(object):
                         self.call_routes[method_name] = s
                         self.call_routes[method.name] = s
 
+                    # the soapAction of the operation in the wsdl. the
+                    # ambiguous ones are resolved from the body.
+                    if method.public_name in self.action_routes:
+                        self.action_routes[method.public_name] = None
+                    else:
+                        self.action_routes[method.public_name] = (s, method)
+
         # populate types
         schema_entries = _SchemaEntries(self)
         for s in self.services:
@@ -731,6 +1042,27 @@ class Application(object):
         """
         return self.call_routes[method_name]
 
+    def resolve_soap_action(self, ctx, soap_action):
+        """Sets the method name, the service class and the method descriptor
+        of the given context from the soapAction of the request, so that they
+        are known before its body is parsed. The body of the request must then
+        be the input message of that method.
+
+        Returns False when the action doesn't name exactly one method of the
+        application, in which case the method is found from the body.
+        """
+
+        route = self.action_routes.get(soap_action)
+        if route is None:
+            return False
+
+        ctx.service_class, ctx.descriptor = route
+        in_message = ctx.descriptor.in_message
+        ctx.method_name = '{%s}%s' % (in_message.get_namespace(),
+                                                   in_message.get_type_name())
+
+        return True
+
     def get_service(self, service, http_req_env=None):
         """The function that maps service classes to service instances.
         Overriding this function is useful in case e.g. you need to pass
@@ -759,13 +1091,30 @@ class Application(object):
         Not meant to be overridden.
         """
 
+        # the wsdl of a frozen application doesn't change, so it's rendered
+        # once.
+        wsdl_string = self.__wsdl_string
+        if wsdl_string is not None:
+            return wsdl_string
+
         if self.wsdl is None:
+            self.__wsdl_lock.acquire()
+            try:
+                if self.wsdl is None:
+                    factory = self._WSDL_factory()
+                    wsdl = factory(self, self.get_tns(), url, self._with_plink)
+                    wsdl.build_wsdl()
+                    self.wsdl = wsdl
+
+            finally:
+                self.__wsdl_lock.release()
 
-            factory = self._WSDL_factory()
-            self.wsdl = factory(self, self.get_tns(), url, self._with_plink)
-            self.wsdl.build_wsdl()
+        wsdl_string = self.wsdl.to_string(xml_declaration=True,
+                                                              encoding="UTF-8")
+        if self.frozen:
+            self.__wsdl_string = wsdl_string
 
-        return self.wsdl.to_string(xml_declaration=True, encoding="UTF-8")
+        return wsdl_string
 
 
     def __get_schema_node(self, pref, schema_nodes, types):
@@ -0,0 +1,182 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Admission control for the methods of services.
+
+A Limiter bounds the number of requests that execute a method at the same
+time. The requests above the limit wait in a queue that is also bounded, and
+the ones that don't fit in it or wait too long are rejected with a Busy fault,
+which the wsgi server returns with the 503 status code. A limiter can be given
+to one method or shared by several, in which case waiting requests with a
+higher priority are admitted first:
+
+    backend = Limiter(max_concurrency=8, max_queue=32, timeout=2)
+
+    class AccountService(DefinitionBase):
+        @soap(Integer, _returns=Balance, _limiter=backend, _priority=10)
+        def get_balance(self, account_id):
+            ...
+
+        @soap(Integer, _returns=Array(Transaction), _limiter=backend)
+        def get_history(self, account_id):
+            ...
+"""
+
+import heapq
+import threading
+
+from soaplib.core.deadline import min_timeout
+from soaplib.core.model.exception import Fault
+
+class Busy(Fault):
+    """The fault the requests that are not admitted get. It's not logged."""
+
+    log_level = None
+
+    def __init__(self, faultcode='Server.Busy',
+                 faultstring='The server is busy, try again later',
+                 faultactor='', detail=None):
+        Fault.__init__(self, faultcode, faultstring, faultactor, detail)
+
+class _Waiter(object):
+    __slots__ = ('event', 'admitted', 'cancelled')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.admitted = False
+        self.cancelled = False
+
+class Limiter(object):
+    """Lets at most max_concurrency requests in at the same time and queues at
+    most max_queue others, for at most timeout seconds each when it's not
+    None. Among the queued requests, the ones with the highest priority are
+    admitted first, in the order they arrived.
+
+    The active and depth attributes are the number of admitted requests and
+    queued requests. The admitted, rejected and timeouts attributes count the
+    requests that were admitted, the ones that were rejected because the queue
+    was full and the ones that waited too long.
+    """
+
+    def __init__(self, max_concurrency, max_queue=0, timeout=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1, not %r" %
+                                                                max_concurrency)
+        if max_queue < 0:
+            raise ValueError("max_queue can't be negative")
+
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self.active = 0
+        self.depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+        self.__lock = threading.Lock()
+        self.__queue = []
+        self.__counter = 0
+
+    def acquire(self, priority=0, deadline=None, blocking=True):
+        """Returns True when the request is admitted, False when it's
+        rejected. Admitted requests must call release() when they're done.
+        Queued requests don't wait past the given
+        soaplib.core.deadline.Deadline. When blocking is False, the requests
+        that would be queued are rejected instead."""
+
+        self.__lock.acquire()
+        try:
+            if self.active < self.max_concurrency and self.depth == 0:
+                self.active += 1
+                self.admitted += 1
+                return True
+
+            if not blocking or self.depth >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            waiter = _Waiter()
+            self.__counter += 1
+            heapq.heappush(self.__queue, (-priority, self.__counter, waiter))
+            self.depth += 1
+
+        finally:
+            self.__lock.release()
+
+        waiter.event.wait(min_timeout(self.timeout, deadline))
+
+        self.__lock.acquire()
+        try:
+            if waiter.admitted:
+                return True
+
+            # it stays in the queue until release() gets to it, or until the
+            # cancelled waiters outnumber the queued ones.
+            waiter.cancelled = True
+            self.depth -= 1
+            self.timeouts += 1
+
+            if len(self.__queue) > 2 * self.depth:
+                self.__queue = [entry for entry in self.__queue
+                                                    if not entry[2].cancelled]
+                heapq.heapify(self.__queue)
+
+            return False
+
+        finally:
+            self.__lock.release()
+
+    def reject_if_full(self):
+        """Returns True, and counts the request as rejected, when acquire()
+        would reject it right away. Servers call it before the request is
+        read, so that it's not parsed for nothing. The requests that aren't
+        rejected still need to acquire() their slot."""
+
+        self.__lock.acquire()
+        try:
+            if self.active < self.max_concurrency or self.depth < self.max_queue:
+                return False
+
+            self.rejected += 1
+            return True
+
+        finally:
+            self.__lock.release()
+
+    def release(self):
+        self.__lock.acquire()
+        try:
+            while self.__queue:
+                priority, counter, waiter = heapq.heappop(self.__queue)
+                if waiter.cancelled:
+                    continue
+
+                # the slot passes on to the waiter.
+                self.depth -= 1
+                self.admitted += 1
+                waiter.admitted = True
+                waiter.event.set()
+                return
+
+            self.active -= 1
+
+        finally:
+            self.__lock.release()
@@ -0,0 +1,535 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Caching of serialized responses of idempotent operations.
+
+A cache is enabled per operation by passing it to the @soap decorator:
+
+    user_cache = ResponseCache(ttl=60, max_bytes=16 << 20)
+
+    class UserService(DefinitionBase):
+        @soap(Integer, _returns=User, _cache=user_cache)
+        def get_user(self, user_id):
+            ...
+
+        @soap(User)
+        def set_user(self, user):
+            ...
+            user_cache.invalidate('get_user', [user.id])
+
+The responses are keyed by the name of the method and a fingerprint of the
+decoded arguments and soap header, and are returned without calling the method
+or serializing anything while they're fresh. Faults are not cached.
+
+ResponseCache keeps the responses in the memory of the process. Processes that
+serve the same application, like the workers of a prefork server, can share
+the responses with a SharedResponseCache instead.
+"""
+
+import datetime
+import decimal
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class CachedResponse(object):
+    """What Application.process_request returns instead of the return value of
+    the method when the response is cached."""
+
+    def __init__(self, out_string):
+        self.out_string = out_string
+
+_scalar_types = (basestring, int, long, float, bool, decimal.Decimal,
+                 datetime.date, datetime.time, datetime.timedelta)
+
+def get_fingerprint(value, _path=None):
+    """Returns a hashable value that is equal for equal decoded values. Raises
+    TypeError for values that can't be fingerprinted, like attachments or
+    object graphs with cycles."""
+
+    if value is None or isinstance(value, _scalar_types):
+        return value
+
+    if _path is None:
+        _path = set()
+    if id(value) in _path:
+        raise TypeError("Can't fingerprint cyclic values")
+
+    _path.add(id(value))
+    try:
+        if isinstance(value, (list, tuple)):
+            return tuple([get_fingerprint(v, _path) for v in value])
+
+        if isinstance(value, dict):
+            return tuple(sorted([(k, get_fingerprint(v, _path))
+                                                    for k, v in value.items()]))
+
+        # the members of the classes it extends are part of the value, too.
+        get_flat_type_info = getattr(value.__class__, 'get_flat_type_info',
+                                                                          None)
+        if get_flat_type_info is not None:
+            return (value.__class__,) + tuple([
+                          get_fingerprint(getattr(value, k, None), _path)
+                                               for k in get_flat_type_info()])
+
+        raise TypeError("Can't fingerprint %r" % value)
+
+    finally:
+        _path.discard(id(value))
+
+class _Entry(object):
+    __slots__ = ('key', 'value', 'expires', 'prev', 'next')
+
+class ResponseCache(object):
+    """An in-memory LRU cache of serialized responses, bounded by the total
+    length of the responses in it. The entries expire ttl seconds after they
+    are added. Thread-safe.
+
+    The hits, misses, evictions and expirations attributes count the lookups
+    that found a fresh response, the ones that didn't, the responses removed
+    to make room and the ones found expired.
+    """
+
+    def __init__(self, ttl=60, max_bytes=64 << 20):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive, not %r" % ttl)
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive, not %r" % max_bytes)
+
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.__lock = threading.Lock()
+        self.__entries = {}
+
+        # the entries are also in a circular list, most recently used first.
+        self.__root = _Entry()
+        self.__root.prev = self.__root.next = self.__root
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_key(self, method_name, args, in_header=None):
+        """Returns the key of the response of the given method to the given
+        arguments and header, or None if they can't be fingerprinted."""
+
+        try:
+            return (method_name, get_fingerprint(args),
+                                                   get_fingerprint(in_header))
+        except TypeError:
+            return None
+
+    def get(self, key):
+        """Returns the response with the given key or None when there's no
+        fresh one."""
+
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires <= time.time():
+                self.__remove(entry)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.__unlink(entry)
+            self.__link(entry)
+            self.hits += 1
+
+            return entry.value
+
+        finally:
+            self.__lock.release()
+
+    def set(self, key, value):
+        """Adds the given response, evicting the least recently used ones to
+        make room. Responses larger than max_bytes are not cached. Returns
+        whether the response was added."""
+
+        if len(value) > self.max_bytes:
+            return False
+
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__remove(entry)
+
+            while self.size + len(value) > self.max_bytes:
+                self.__remove(self.__root.prev)
+                self.evictions += 1
+
+            entry = _Entry()
+            entry.key = key
+            entry.value = value
+            entry.expires = time.time() + self.ttl
+
+            self.__entries[key] = entry
+            self.__link(entry)
+            self.size += len(value)
+
+        finally:
+            self.__lock.release()
+
+        return True
+
+    def invalidate(self, method_name=None, args=None, in_header=None):
+        """Removes the cached responses of the method with the given name to
+        the given arguments and header. When in_header is None, the responses
+        for all headers are removed, when args is None, all responses of the
+        method and when method_name is None, all responses."""
+
+        if args is not None:
+            args = get_fingerprint(args)
+        if in_header is not None:
+            in_header = get_fingerprint(in_header)
+
+        self.__lock.acquire()
+        try:
+            for key, entry in self.__entries.items():
+                if ((method_name is None or key[0] == method_name) and
+                        (args is None or key[1] == args) and
+                        (in_header is None or key[2] == in_header)):
+                    self.__remove(entry)
+
+        finally:
+            self.__lock.release()
+
+    def __link(self, entry):
+        root = self.__root
+        entry.prev = root
+        entry.next = root.next
+        root.next.prev = entry
+        root.next = entry
+
+    def __unlink(self, entry):
+        entry.prev.next = entry.next
+        entry.next.prev = entry.prev
+
+    def __remove(self, entry):
+        self.__unlink(entry)
+        del self.__entries[entry.key]
+        self.size -= len(entry.value)
+
+_file_header = struct.Struct('<8sIIII')
+_file_magic = 'SLBCACHE'
+_file_version = 2
+_file_header_size = 64
+
+_set_header = struct.Struct('<I4x')
+
+# key, expiry time, length of the response, clock reference bit
+_slot_header = struct.Struct('<36sdIB3x')
+
+# the parts of a key are the digests of the method name, the arguments and the
+# header, which invalidate() matches, and the digest of all three, which
+# identifies the response.
+_key_parts = ((0, 4), (4, 10), (10, 16))
+_key_size = 36
+
+def _stable(value):
+    """Turns a fingerprint into something whose repr is the same in every
+    process."""
+
+    if isinstance(value, tuple):
+        return tuple([_stable(v) for v in value])
+
+    if isinstance(value, type):
+        return '%s.%s' % (value.__module__, value.__name__)
+
+    if isinstance(value, str):
+        try:
+            return value.decode('ascii')
+        except UnicodeDecodeError:
+            pass
+
+    return value
+
+def _digest(value, length):
+    return hashlib.sha1(repr(_stable(value))).digest()[:length]
+
+class SharedResponseCache(object):
+    """A response cache in a memory-mapped file, shared by the processes that
+    open the same file with the same parameters. Safe for concurrent use by
+    threads and processes.
+
+    The file is divided in n_slots / ways sets of ways slots of slot_size
+    bytes each. Every key maps to one set, and when a set is full, the slot to
+    reuse is picked with the clock algorithm. Responses that don't fit in a
+    slot are not cached. Each set is locked with an fcntl record lock while
+    it's accessed.
+
+    The keys are stored in the slots and compared in full. They hold short
+    digests of the method name, the arguments and the header, by which
+    responses are invalidated, followed by the 20-byte SHA-1 digest of all
+    three together. The statistics only count what happens in the current
+    process.
+
+    @param The path of the cache file. It's created if it doesn't exist.
+    @param The number of seconds the responses are fresh.
+    @param The number of slots, a multiple of ways.
+    @param The size of a slot in bytes, including a 52-byte header.
+    @param The number of slots in a set.
+    """
+
+    def __init__(self, path, ttl=60, n_slots=1024, slot_size=16384, ways=4):
+        if fcntl is None:
+            raise ValueError("SharedResponseCache needs the fcntl module")
+        if ttl <= 0:
+            raise ValueError("ttl must be positive, not %r" % ttl)
+        if ways < 1 or n_slots < ways or n_slots % ways != 0:
+            raise ValueError("n_slots must be a multiple of ways")
+        if slot_size <= _slot_header.size:
+            raise ValueError("slot_size must be larger than %d" %
+                                                            _slot_header.size)
+
+        self.path = path
+        self.ttl = ttl
+        self.ways = ways
+        self.slot_size = slot_size
+        self.n_sets = n_slots // ways
+        self.capacity = slot_size - _slot_header.size
+        self.set_size = _set_header.size + ways * slot_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # fcntl locks are held by processes, so the threads of a process also
+        # need a lock among themselves.
+        self.__lock = threading.Lock()
+
+        length = _file_header_size + self.n_sets * self.set_size
+        self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0600)
+        try:
+            self.__init_file(length)
+            self.__map = mmap.mmap(self.__fd, length)
+
+        except:
+            os.close(self.__fd)
+            raise
+
+    def __init_file(self, length):
+        header = (_file_magic, _file_version, self.n_sets, self.ways,
+                                                                self.slot_size)
+
+        fcntl.lockf(self.__fd, fcntl.LOCK_EX, _file_header_size, 0)
+        try:
+            data = os.read(self.__fd, _file_header.size)
+            if len(data) < _file_header.size:
+                os.ftruncate(self.__fd, length)
+                os.lseek(self.__fd, 0, os.SEEK_SET)
+                os.write(self.__fd, _file_header.pack(*header))
+
+            elif _file_header.unpack(data) != header:
+                raise ValueError("%r is a cache file with different "
+                                 "parameters" % self.path)
+
+        finally:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, _file_header_size, 0)
+
+    def close(self):
+        self.__map.close()
+        os.close(self.__fd)
+
+    def get_key(self, method_name, args, in_header=None):
+        """Returns the key of the response of the given method to the given
+        arguments and header, or None if they can't be fingerprinted."""
+
+        try:
+            parts = (method_name, get_fingerprint(args),
+                                                get_fingerprint(in_header))
+
+        except TypeError:
+            return None
+
+        key = [_digest(part, end - begin)
+                                for part, (begin, end) in zip(parts, _key_parts)]
+        key.append(_digest(parts, 20))
+
+        return ''.join(key)
+
+    def get(self, key):
+        """Returns the response with the given key or None when there's no
+        fresh one."""
+
+        now = time.time()
+        start = self.__lock_set(key)
+        try:
+            for i in range(self.ways):
+                offset = start + _set_header.size + i * self.slot_size
+                digest, expires, length, ref = _slot_header.unpack_from(
+                                                             self.__map, offset)
+                if digest != key:
+                    continue
+
+                if expires <= now:
+                    self.__clear(offset)
+                    self.expirations += 1
+                    break
+
+                if not ref:
+                    _slot_header.pack_into(self.__map, offset, digest,
+                                                           expires, length, 1)
+                self.hits += 1
+
+                offset += _slot_header.size
+                return self.__map[offset:offset + length]
+
+            self.misses += 1
+            return None
+
+        finally:
+            self.__unlock_set(start)
+
+    def set(self, key, value):
+        """Adds the given response. Responses that don't fit in a slot are not
+        cached. Returns whether the response was added."""
+
+        if len(value) > self.capacity:
+            return False
+
+        now = time.time()
+        start = self.__lock_set(key)
+        try:
+            slots = []
+            target = None
+            for i in range(self.ways):
+                offset = start + _set_header.size + i * self.slot_size
+                digest, expires, length, ref = _slot_header.unpack_from(
+                                                             self.__map, offset)
+                if digest == key:
+                    target = offset
+                    break
+
+                slots.append((offset, expires, ref))
+
+            if target is None:
+                for offset, expires, ref in slots:
+                    if expires <= now:
+                        target = offset
+                        break
+
+            if target is None:
+                target = self.__evict(start)
+
+            self.__map[target + _slot_header.size:
+                               target + _slot_header.size + len(value)] = value
+            _slot_header.pack_into(self.__map, target, key, now + self.ttl,
+                                                                 len(value), 0)
+
+        finally:
+            self.__unlock_set(start)
+
+        return True
+
+    def __evict(self, start):
+        """Returns the offset of the slot the clock hand of the set at the given
+        offset stops at, clearing the reference bits it passes."""
+
+        hand, = _set_header.unpack_from(self.__map, start)
+        while True:
+            offset = start + _set_header.size + hand * self.slot_size
+            hand = (hand + 1) % self.ways
+
+            digest, expires, length, ref = _slot_header.unpack_from(
+                                                             self.__map, offset)
+            if ref:
+                _slot_header.pack_into(self.__map, offset, digest, expires,
+                                                                     length, 0)
+                continue
+
+            _set_header.pack_into(self.__map, start, hand)
+            self.evictions += 1
+
+            return offset
+
+    def invalidate(self, method_name=None, args=None, in_header=None):
+        """Removes the cached responses of the method with the given name to
+        the given arguments and header. When in_header is None, the responses
+        for all headers are removed, when args is None, all responses of the
+        method and when method_name is None, all responses."""
+
+        parts = []
+        for i, value in enumerate((method_name, args, in_header)):
+            if value is not None:
+                if i > 0:
+                    value = get_fingerprint(value)
+                begin, end = _key_parts[i]
+                parts.append((begin, end, _digest(value, end - begin)))
+
+        for n in range(self.n_sets):
+            start = _file_header_size + n * self.set_size
+            self.__lock_range(start)
+            try:
+                for i in range(self.ways):
+                    offset = start + _set_header.size + i * self.slot_size
+                    digest = self.__map[offset:offset + _key_size]
+                    for begin, end, value in parts:
+                        if digest[begin:end] != value:
+                            break
+                    else:
+                        self.__clear(offset)
+
+            finally:
+                self.__unlock_set(start)
+
+    def __clear(self, offset):
+        _slot_header.pack_into(self.__map, offset, '', 0, 0, 0)
+
+    def __lock_set(self, key):
+        a, b = struct.unpack_from('<QQ', key, 16)
+        n = (a ^ b) % self.n_sets
+        start = _file_header_size + n * self.set_size
+        self.__lock_range(start)
+
+        return start
+
+    def __lock_range(self, start):
+        self.__lock.acquire()
+        try:
+            fcntl.lockf(self.__fd, fcntl.LOCK_EX, self.set_size, start)
+        except:
+            self.__lock.release()
+            raise
+
+    def __unlock_set(self, start):
+        try:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, self.set_size, start)
+        finally:
+            self.__lock.release()
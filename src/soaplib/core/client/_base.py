@@ -0,0 +1,212 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""The transport-independent part of the soap client."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import sys
+import threading
+
+from lxml import etree
+
+from soaplib.core import MethodContext
+from soaplib.core import namespaces
+from soaplib.core.deadline import ns_deadline
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import string_encoding
+
+class _RemoteProcedure(object):
+    def __init__(self, client, service_class, descriptor):
+        self.client = client
+        self.service_class = service_class
+        self.descriptor = descriptor
+        self.__doc__ = descriptor.doc
+
+    def __call__(self, *args, **kwargs):
+        return self.client.call(self.service_class, self.descriptor,
+                                                                  args, kwargs)
+
+class _RemoteService(object):
+    """Has one callable attribute per remote procedure."""
+
+class Base(object):
+    """Calls the methods of the given application's services over some
+    transport. The requests are built and the responses are parsed with the
+    message classes of the service definitions, so the server's own
+    DefinitionBase subclasses can be used to talk to it.
+
+    The methods are called through the service attribute, e.g.:
+
+        client.service.some_method(arg1, arg2)
+
+    They return the return value of the method, or a tuple when it has more
+    than one, and raise the Fault the server returns.
+
+    Many calls can be made concurrently with the gather method.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.service = _RemoteService()
+
+        for service_class in app.services:
+            service = app.get_service(service_class)
+            for descriptor in service.public_methods:
+                setattr(self.service, descriptor.name,
+                         _RemoteProcedure(self, service_class, descriptor))
+
+    def get_request_string(self, ctx, args, kwargs, timeout=None):
+        """Serializes the arguments of the call described by the given context
+        to a soap request. When a timeout is given, it's sent to the server as
+        the deadline of the request, see soaplib.core.deadline."""
+
+        type_info = ctx.descriptor.in_message._type_info
+        if len(args) > len(type_info):
+            raise TypeError("%s takes at most %d arguments (%d given)" %
+                            (ctx.descriptor.name, len(type_info), len(args)))
+
+        values = list(args)
+        for k in type_info.keys()[len(args):]:
+            values.append(kwargs.pop(k, None))
+
+        if len(kwargs) > 0:
+            raise TypeError("%s got unexpected keyword arguments %r" %
+                                           (ctx.descriptor.name, kwargs.keys()))
+
+        # serialize_soap expects a single argument unencapsulated.
+        if len(values) == 1:
+            values = values[0]
+
+        in_xml = self.app.serialize_soap(ctx, self.app.IN_WRAPPER, values)
+
+        if timeout is not None:
+            header = in_xml.find('{%s}Header' % namespaces.ns_soap_env)
+            if header is None:
+                header = etree.Element('{%s}Header' % namespaces.ns_soap_env)
+                in_xml.insert(0, header)
+
+            etree.SubElement(header, '{%s}Timeout' % ns_deadline).text = \
+                                                                   repr(timeout)
+
+        return etree.tostring(in_xml, xml_declaration=True,
+                                                       encoding=string_encoding)
+
+    def get_response_object(self, ctx, response_string):
+        """Parses the response to the call described by the given context.
+        Returns the return value of the method or raises the fault in the
+        response."""
+
+        root, xmlids = self.app.parse_xml_string(response_string)
+        retval = self.app.deserialize_soap(ctx, self.app.OUT_WRAPPER,
+                                                                   root, xmlids)
+
+        if isinstance(retval, Fault):
+            raise retval
+
+        n_results = len(ctx.descriptor.out_message._type_info)
+        if n_results == 0:
+            return None
+
+        elif n_results == 1:
+            return retval[0]
+
+        else:
+            return tuple(retval)
+
+    def call(self, service_class, descriptor, args, kwargs, timeout=None):
+        ctx = MethodContext()
+        ctx.service_class = service_class
+        ctx.service = self.app.get_service(service_class)
+        ctx.descriptor = descriptor
+
+        request_string = self.get_request_string(ctx, args, kwargs, timeout)
+        response_string = self.send(ctx, request_string, timeout)
+
+        return self.get_response_object(ctx, response_string)
+
+    def gather(self, calls, max_concurrency=8, timeout=None,
+                                                      return_exceptions=False):
+        """Makes the given calls concurrently and returns their results in the
+        same order.
+
+        @param An iterable of (procedure, args) or (procedure, args, kwargs)
+               tuples, where procedure is an attribute of self.service, e.g.
+               [(client.service.get_user, (1,)), (client.service.get_user, (2,))]
+        @param The maximum number of calls that are in progress at the same
+               time. Each one holds a connection, so this should not exceed the
+               connection limit of the transport.
+        @param The timeout of each call, in seconds. Calls that time out fail
+               with socket.timeout. It's also sent to the server as the
+               deadline of the call.
+        @param When False, the first exception a call raises is raised once
+               all calls are finished. When True, the exceptions are returned
+               in place of the results.
+        """
+
+        calls = list(calls)
+        results = [None] * len(calls)
+        errors = [None] * len(calls)
+        pending = list(reversed(range(len(calls))))
+
+        # list.pop is atomic, so the workers don't need a lock to share it.
+        def work():
+            while True:
+                try:
+                    i = pending.pop()
+                except IndexError:
+                    return
+
+                call = calls[i]
+                proc, args = call[0], call[1]
+                kwargs = {}
+                if len(call) > 2:
+                    kwargs = call[2]
+
+                try:
+                    results[i] = self.call(proc.service_class, proc.descriptor,
+                                                 args, dict(kwargs), timeout)
+                except Exception:
+                    errors[i] = sys.exc_info()
+
+        workers = [threading.Thread(target=work)
+                               for i in range(min(max_concurrency, len(calls)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        for i, error in enumerate(errors):
+            if error is None:
+                continue
+
+            if return_exceptions:
+                results[i] = error[1]
+            else:
+                raise error[0], error[1], error[2]
+
+        return results
+
+    def send(self, ctx, request_string, timeout=None):
+        """Sends the given request and returns the response, waiting at most
+        timeout seconds for each socket operation when it's not None.
+        Implemented by the transports."""
+
+        raise NotImplementedError()
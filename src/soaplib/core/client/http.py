@@ -0,0 +1,238 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A soap client that uses http as transport. The connections are kept open
+and reused by the following calls."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import cStringIO
+import gzip
+import httplib
+import socket
+import threading
+import time
+
+from soaplib.core.client import Base
+from soaplib.core.model.exception import Fault
+from soaplib.core.util import split_url
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time."""
+
+class ConnectionPool(object):
+    """A thread-safe pool of persistent HTTP/1.1 connections.
+
+    There are at most max_connections connections per host. Threads that need
+    a connection to a host that has none left wait for one to be released.
+    The timeout is used both for that wait and for the socket operations.
+
+    A pool can be shared by more than one Client.
+    """
+
+    def __init__(self, max_connections=4, timeout=None):
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1, not %r" %
+                                                                max_connections)
+
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        self.__condition = threading.Condition()
+        self.__idle = {}  # (scheme, host) -> list of idle connections
+        self.__count = {} # (scheme, host) -> number of open connections
+
+    def create_connection(self, scheme, host):
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(host, timeout=self.timeout)
+        else:
+            connection = httplib.HTTPConnection(host, timeout=self.timeout)
+
+        # requests are small and sent in one go, so waiting to coalesce them
+        # with what follows only adds latency.
+        connection.connect()
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        return connection
+
+    def acquire(self, scheme, host):
+        """Returns an idle connection to the given host, or a new one. The
+        second return value tells whether the connection was used before."""
+
+        key = (scheme, host)
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        self.__condition.acquire()
+        try:
+            while True:
+                idle = self.__idle.get(key)
+                if idle:
+                    return idle.pop(), True
+
+                count = self.__count.get(key, 0)
+                if count < self.max_connections:
+                    self.__count[key] = count + 1
+                    break
+
+                if deadline is None:
+                    self.__condition.wait()
+
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeout("No connection to %r is available"
+                                                                       % host)
+                    self.__condition.wait(remaining)
+
+        finally:
+            self.__condition.release()
+
+        try:
+            return self.create_connection(scheme, host), False
+
+        except:
+            self.__discarded(key)
+            raise
+
+    def release(self, scheme, host, connection, reusable=True):
+        """Returns the connection to the pool. Connections that are not
+        reusable are closed."""
+
+        key = (scheme, host)
+        if not reusable:
+            connection.close()
+            self.__discarded(key)
+            return
+
+        self.__condition.acquire()
+        try:
+            self.__idle.setdefault(key, []).append(connection)
+            self.__condition.notify()
+
+        finally:
+            self.__condition.release()
+
+    def __discarded(self, key):
+        self.__condition.acquire()
+        try:
+            self.__count[key] -= 1
+            self.__condition.notify()
+
+        finally:
+            self.__condition.release()
+
+    def close(self):
+        """Closes the idle connections."""
+
+        self.__condition.acquire()
+        try:
+            for key, idle in self.__idle.items():
+                for connection in idle:
+                    connection.close()
+                self.__count[key] -= len(idle)
+            self.__idle.clear()
+            self.__condition.notifyAll()
+
+        finally:
+            self.__condition.release()
+
+class Client(Base):
+    """Calls the methods of the services in the given application at the given
+    url, e.g.:
+
+        client = Client('http://localhost:7789/', Application([S], 'tns'))
+        client.service.some_method(arg1, arg2)
+
+    @param The url of the server.
+    @param A soaplib.core.Application instance with the service definitions.
+    @param The ConnectionPool to use. A new one is created by default.
+    @param Whether to ask the server for gzip-compressed responses.
+    """
+
+    def __init__(self, url, app, pool=None, gzip=False):
+        Base.__init__(self, app)
+
+        self.url = url
+        self.scheme, self.host, self.path = split_url(url)
+        if not self.path:
+            self.path = '/'
+
+        if pool is None:
+            pool = ConnectionPool()
+
+        self.pool = pool
+        self.gzip = gzip
+
+    def send(self, ctx, request_string, timeout=None):
+        headers = {
+            'Content-Type': 'text/xml; charset=utf-8',
+            'SOAPAction': '"%s"' % ctx.descriptor.public_name,
+        }
+        if self.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+
+        while True:
+            connection, reused = self.pool.acquire(self.scheme, self.host)
+            if timeout is not None:
+                connection.sock.settimeout(timeout)
+
+            try:
+                connection.request('POST', self.path, request_string, headers)
+                response = connection.getresponse()
+                response_string = response.read()
+
+            except socket.timeout:
+                self.pool.release(self.scheme, self.host, connection, False)
+                raise
+
+            except (httplib.BadStatusLine, socket.error), e:
+                self.pool.release(self.scheme, self.host, connection, False)
+
+                # the server may have closed the idle connection. the request
+                # didn't get to it in that case, so it's sent again.
+                if reused:
+                    logger.debug("retrying with a new connection: %r", e)
+                    continue
+
+                raise
+
+            except:
+                self.pool.release(self.scheme, self.host, connection, False)
+                raise
+
+            if timeout is not None and not response.will_close:
+                connection.sock.settimeout(self.pool.timeout)
+
+            self.pool.release(self.scheme, self.host, connection,
+                                                     not response.will_close)
+            break
+
+        content_type = response.getheader('Content-Type', '')
+        if response.status != 200 and not content_type.startswith('text/xml'):
+            raise Fault('Server', 'HTTP %d %s' % (response.status,
+                                                             response.reason))
+
+        if response.getheader('Content-Encoding') == 'gzip':
+            response_string = gzip.GzipFile(
+                         fileobj=cStringIO.StringIO(response_string)).read()
+
+        return response_string
@@ -0,0 +1,203 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A soap client for soaplib.core.server.unix. All the calls made through a
+client share one connection: concurrent calls, e.g. those made by the gather
+method, are pipelined on it rather than waiting for each other's responses."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import collections
+import socket
+import threading
+
+from soaplib.core.client import Base
+from soaplib.core.util.framing import FrameError
+from soaplib.core.util.framing import pack_frame
+from soaplib.core.util.framing import read_frame
+
+class _PendingCall(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+    def set(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.event.set()
+
+class Connection(object):
+    """A connection to a unix socket server. Requests can be sent from many
+    threads at once, the responses are read by a thread of its own and handed
+    to the callers in the order of the requests."""
+
+    def __init__(self, path, max_response_size=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+        self.max_response_size = max_response_size
+        self.closed = False
+
+        self.__lock = threading.Lock()
+        self.__pending = collections.deque()
+
+        reader = threading.Thread(target=self.__read)
+        reader.daemon = True
+        reader.start()
+
+    def send(self, name, request_string, timeout=None):
+        """Sends the request and returns the response. Raises socket.timeout
+        if the response doesn't arrive in timeout seconds when it's not None.
+        """
+
+        call = _PendingCall()
+        frame = pack_frame(name, request_string)
+
+        self.__lock.acquire()
+        try:
+            if self.closed:
+                raise socket.error("The connection is closed")
+
+            self.__pending.append(call)
+            try:
+                self.sock.sendall(frame)
+            except:
+                self.__close()
+                raise
+
+        finally:
+            self.__lock.release()
+
+        if not call.event.wait(timeout):
+            raise socket.timeout("No response in %r seconds" % timeout)
+
+        if call.error is not None:
+            raise call.error
+
+        return call.response
+
+    def __read(self):
+        stream = self.sock.makefile('rb')
+
+        try:
+            while True:
+                frame = read_frame(stream, self.max_response_size)
+                if frame is None:
+                    raise socket.error("The connection was closed by the "
+                                                                      "server")
+
+                self.__lock.acquire()
+                try:
+                    call = self.__pending.popleft()
+                finally:
+                    self.__lock.release()
+
+                call.set(frame[1])
+
+        except (socket.error, FrameError, IndexError), e:
+            if not self.closed:
+                logger.debug("Connection lost: %s", e)
+
+            self.__lock.acquire()
+            try:
+                self.__close(e)
+            finally:
+                self.__lock.release()
+
+        finally:
+            stream.close()
+
+    def __close(self, error=None):
+        """Must be called with the lock held."""
+
+        if error is None:
+            error = socket.error("The connection is closed")
+
+        self.closed = True
+        self.sock.close()
+
+        while self.__pending:
+            self.__pending.popleft().set(error=error)
+
+    def close(self):
+        self.__lock.acquire()
+        try:
+            if not self.closed:
+                self.sock.shutdown(socket.SHUT_RDWR)
+                self.__close()
+        finally:
+            self.__lock.release()
+
+class Client(Base):
+    """Calls the methods of the services in the given application through the
+    unix socket at the given path, e.g.:
+
+        client = Client('/tmp/some_service.sock', Application([S], 'tns'))
+        client.service.some_method(arg1, arg2)
+
+    The connection is opened by the first call, and opened again by the call
+    that follows its loss. The calls that were waiting for a response when it
+    was lost fail with socket.error.
+
+    @param The path of the server's socket.
+    @param A soaplib.core.Application instance with the service definitions.
+    @param The size in bytes of the largest response that's accepted. The
+           connection is closed when a larger one arrives.
+    """
+
+    def __init__(self, path, app, max_response_size=None):
+        Base.__init__(self, app)
+
+        self.path = path
+        self.max_response_size = max_response_size
+
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+    def get_connection(self):
+        self.__lock.acquire()
+        try:
+            if self.__connection is None or self.__connection.closed:
+                self.__connection = Connection(self.path,
+                                                        self.max_response_size)
+
+            return self.__connection
+
+        finally:
+            self.__lock.release()
+
+    def send(self, ctx, request_string, timeout=None):
+        # the server finds the method by the name of the request element,
+        # without looking at the body.
+        name = '{%s}%s' % (self.app.get_tns(),
+                                       ctx.descriptor.in_message.get_type_name())
+
+        return self.get_connection().send(name, request_string, timeout)
+
+    def close(self):
+        self.__lock.acquire()
+        try:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+        finally:
+            self.__lock.release()
@@ -0,0 +1,181 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Coalescing of identical concurrent requests.
+
+When a Coalescer is passed to the @soap decorator, concurrent requests to the
+method with the same arguments and soap header wait for the first one to
+finish instead of calling the method themselves, and get its return value or
+fault:
+
+    class StockService(DefinitionBase):
+        @soap(String, _returns=Float, _coalesce=Coalescer(timeout=10))
+        def get_price(self, symbol):
+            ...
+
+It's meant for idempotent methods, and it can be combined with a response
+cache to spare the backend the requests that arrive while a cached response is
+being recomputed.
+"""
+
+import threading
+
+from soaplib.core.cache import get_fingerprint
+from soaplib.core.deadline import DeadlineExceeded
+from soaplib.core.deadline import min_timeout
+from soaplib.core.model.exception import Fault
+
+class _Flight(object):
+    """The execution of a request that other requests wait for."""
+
+    def __init__(self, key, leader):
+        self.key = key
+        self.leader = leader
+        self.result = None
+        self.out_string = None
+        self.done = threading.Event()
+        self.serialized = threading.Event()
+        self.callbacks = []
+
+def get_timeout_fault(deadline):
+    """Returns the fault of a request that timed out waiting for an identical
+    one."""
+
+    if deadline is not None and deadline.expired():
+        return DeadlineExceeded()
+
+    return Fault('Server', 'Timed out waiting for an identical request')
+
+class Coalescer(object):
+    """Makes identical concurrent requests share one execution.
+
+    @param The number of seconds the requests wait for the one that is being
+           executed. The ones that time out fail with a Server fault. None
+           means no limit.
+    @param Whether the waiting requests also get the serialized response of
+           the first one instead of serializing the return value themselves.
+
+    The executions and coalesced attributes count the requests that called the
+    method and the ones that waited for another one.
+    """
+
+    def __init__(self, timeout=None, share_response=False):
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive, not %r" % timeout)
+
+        self.timeout = timeout
+        self.share_response = share_response
+
+        self.executions = 0
+        self.coalesced = 0
+
+        self.__lock = threading.Lock()
+        self.__flights = {}
+
+    def get_key(self, method_name, args, in_header=None):
+        """Returns the key of the request to the given method with the given
+        arguments and header, or None if they can't be fingerprinted."""
+
+        try:
+            return (method_name, get_fingerprint(args),
+                                                   get_fingerprint(in_header))
+        except TypeError:
+            return None
+
+    def join(self, key, ctx):
+        """Returns the flight of the request with the given key, and whether
+        the given context is its leader, i.e. has to execute the request."""
+
+        self.__lock.acquire()
+        try:
+            flight = self.__flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+
+            flight = self.__flights[key] = _Flight(key, ctx)
+            self.executions += 1
+
+            return flight, True
+
+        finally:
+            self.__lock.release()
+
+    def wait(self, flight, deadline=None):
+        """Returns the return value or fault of the leader of the given
+        flight. Doesn't wait past the given soaplib.core.deadline.Deadline."""
+
+        if not flight.done.wait(min_timeout(self.timeout, deadline)):
+            return get_timeout_fault(deadline)
+
+        return flight.result
+
+    def add_callback(self, flight, callback):
+        """Calls the given function with the return value or fault of the
+        leader of the given flight when it finishes, right away if it has. It's
+        called in the thread of the leader, for the servers that can't block
+        in wait()."""
+
+        self.__lock.acquire()
+        try:
+            if not flight.done.isSet():
+                flight.callbacks.append(callback)
+                return
+
+        finally:
+            self.__lock.release()
+
+        callback(flight.result)
+
+    def finish(self, flight, result):
+        """Called by the leader of the flight with its return value or fault.
+        The requests that arrive afterwards start a new flight."""
+
+        self.__lock.acquire()
+        try:
+            if self.__flights.get(flight.key) is flight:
+                del self.__flights[flight.key]
+
+            flight.result = result
+            flight.done.set()
+
+            callbacks = flight.callbacks
+            flight.callbacks = []
+
+        finally:
+            self.__lock.release()
+
+        for callback in callbacks:
+            callback(result)
+
+    def get_out_string(self, flight):
+        """Returns the serialized response of the leader of the given flight,
+        or None if it's not available in time."""
+
+        if not flight.serialized.wait(self.timeout):
+            return None
+
+        return flight.out_string
+
+    def set_out_string(self, flight, out_string):
+        """Called by the leader of the flight with its serialized response,
+        or None when it couldn't serialize it."""
+
+        flight.out_string = out_string
+        flight.serialized.set()
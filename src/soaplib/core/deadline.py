@@ -0,0 +1,108 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Deadlines of requests.
+
+A request gets a deadline when its method has a default timeout, set with the
+_timeout argument of the @soap decorator, or when the client sends the number
+of seconds it's going to wait for the response in a Timeout header:
+
+    <senv:Header>
+        <Timeout xmlns="urn:soaplib:deadline">2.5</Timeout>
+    </senv:Header>
+
+The earlier of the two is used. The method isn't called when the deadline has
+passed before it's dispatched, and its return value isn't serialized when the
+deadline passes while it runs. A DeadlineExceeded fault is returned instead in
+both cases. Service code can get the deadline from the deadline attribute of
+the service instance to check it or to pass the remaining time on to its
+backends.
+"""
+
+import logging
+import time
+
+from soaplib.core.model.exception import Fault
+
+ns_deadline = 'urn:soaplib:deadline'
+
+class DeadlineExceeded(Fault):
+    log_level = logging.WARNING
+    log_traceback = False
+
+    def __init__(self, faultcode='Server.DeadlineExceeded',
+                 faultstring='The deadline of the request has passed',
+                 faultactor='', detail=None):
+        Fault.__init__(self, faultcode, faultstring, faultactor, detail)
+
+class Deadline(object):
+    """The point in time a request has to be answered by."""
+
+    def __init__(self, timeout):
+        self.expires = time.time() + timeout
+
+    def __repr__(self):
+        return "Deadline(%r)" % self.remaining()
+
+    def remaining(self):
+        """Returns the number of seconds left, or 0 if the deadline has
+        passed."""
+
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def check(self):
+        """Raises DeadlineExceeded if the deadline has passed."""
+
+        if self.expired():
+            raise DeadlineExceeded()
+
+    @classmethod
+    def from_header(cls, element):
+        try:
+            return cls(float(element.text))
+
+        except (TypeError, ValueError):
+            raise Fault('Client.SoapError', 'Invalid timeout header: %r' %
+                                                                  element.text)
+
+def earliest(a, b):
+    """Returns the earlier of the given deadlines, either of which may be
+    None."""
+
+    if a is None:
+        return b
+    if b is None or a.expires <= b.expires:
+        return a
+    return b
+
+def min_timeout(timeout, deadline):
+    """Returns the smaller of the given timeout and the time remaining until
+    the given deadline. Either may be None."""
+
+    if deadline is None:
+        return timeout
+
+    remaining = deadline.remaining()
+    if timeout is None or remaining < timeout:
+        return remaining
+
+    return timeout
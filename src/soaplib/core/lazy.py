@@ -0,0 +1,220 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Lazy decoding of the arguments and the soap header of requests.
+
+Methods that only read a few fields of large requests can be declared with
+_lazy=True:
+
+    class OrderService(DefinitionBase):
+        @soap(Array(Order), _returns=Integer, _lazy=True)
+        def count_urgent(self, orders):
+            return len([o for o in orders if o.urgent])
+
+Their ClassModel arguments and the in_header of their service are then
+proxies: instances of a subclass of their class that decode each of their
+fields from the request element the first time it's read, and keep it.
+Nested ClassModels are proxies too, and arrays of ClassModels are lists of
+proxies. The other values are decoded when the field they're in is read.
+Fields can be assigned as usual, and a field that's assigned is never decoded.
+
+The rules for the request element are:
+
+  * A proxy keeps a reference to its element, and so to the whole request
+    document, until all of its fields are read or assigned. It can be kept
+    after the method returns, but it keeps the document in memory. Pass it to
+    decode() to decode the rest of its fields and release the element.
+  * The request document must not be modified while there are proxies, e.g.
+    by the on_method_call hook of the service, which gets the body element.
+  * A proxy whose fields are not all decoded must not be read by several
+    threads at the same time.
+  * Requests with multi-ref references (href="#id") or with attachments are
+    decoded at once, as the references and the attachments are only resolved
+    while the request is being deserialized.
+
+A field that can't be decoded raises a Client fault when it's read, which the
+method can let through to the client.
+"""
+
+from lxml import etree
+
+from soaplib.core import namespaces
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModelBase
+from soaplib.core.model.clazz import _get_member_table
+from soaplib.core.model.exception import Fault
+
+# the key of the children index in the __dict__ of proxies. it's not a valid
+# identifier, so it can't clash with a member name.
+_index_key = ' lazy index'
+
+_lazy_classes = {}
+
+def _get_kind(cls):
+    return getattr(cls, '_is_clone_of', cls)
+
+def _is_overridden(cls, name):
+    return getattr(cls, name).im_func is not \
+                                          getattr(ClassModelBase, name).im_func
+
+def _can_be_lazy(cls):
+    # classes that decode themselves, or that build their instances
+    # differently, are decoded as they usually are.
+    return (issubclass(cls, ClassModelBase) and
+            not issubclass(_get_kind(cls), Array) and
+            not _is_overridden(cls, 'from_xml') and
+            not _is_overridden(cls, 'get_deserialization_instance'))
+
+def _is_nil(element):
+    return bool(element.get('{%s}nil' % namespaces.ns_xsi))
+
+class _Field(object):
+    """Decodes the member it's named after on first access."""
+
+    def __init__(self, key, default):
+        self.key = key
+        self.default = default
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self.default
+
+        d = inst.__dict__
+        if self.key in d:
+            return d[self.key]
+
+        value = d[self.key] = _decode_field(inst, self.key)
+        return value
+
+    def __set__(self, inst, value):
+        d = inst.__dict__
+        d[self.key] = value
+
+        index = d.get(_index_key, None)
+        if index is not None:
+            index[1].discard(self.key)
+            if not index[1]:
+                del d[_index_key]
+
+def _get_lazy_class(cls):
+    retval = _lazy_classes.get(cls, None)
+
+    if retval is None:
+        cls_dict = {'__module__': cls.__module__, '_is_lazy': True}
+        for key in _get_member_table(cls):
+            cls_dict[key] = _Field(key, getattr(cls, key, None))
+
+        # the metaclass is bypassed, as it'd make the subclass extend cls.
+        retval = type.__new__(type(cls), cls.__name__, (cls,), cls_dict)
+        _lazy_classes[cls] = retval
+
+    return retval
+
+def get_lazy_instance(cls, element):
+    """Returns a proxy that decodes the given element as an instance of cls on
+    access, or the decoded instance when cls can't be decoded lazily."""
+
+    if not _can_be_lazy(cls):
+        return cls.from_xml(element)
+
+    if _is_nil(element):
+        return None
+
+    lazy_class = _get_lazy_class(cls)
+    retval = lazy_class.__new__(lazy_class)
+
+    # [the element, the member names that are not decoded yet, the child
+    # elements by member name once a member is read]
+    retval.__dict__[_index_key] = [element, set(_get_member_table(cls)), None]
+
+    return retval
+
+def _decode_field(inst, key):
+    d = inst.__dict__
+    index = d[_index_key]
+    element, pending, children_by_key = index
+
+    pending.discard(key)
+    if not pending:
+        del d[_index_key]
+
+    member, is_attribute, is_multiple, is_class = \
+                                           _get_member_table(type(inst))[key]
+
+    if is_attribute:
+        return element.get(key)
+
+    # the children are sorted out once, when the first member is read.
+    if children_by_key is None:
+        children_by_key = index[2] = {}
+        for c in element:
+            if isinstance(c, etree._Comment):
+                continue
+            children_by_key.setdefault(c.tag.split('}')[-1], []).append(c)
+
+    children = children_by_key.get(key, None)
+
+    try:
+        if is_multiple:
+            if not children:
+                return None
+            return [_decode_member(member, c) for c in children]
+
+        if not children:
+            return None
+        return _decode_member(member, children[-1])
+
+    except Fault:
+        raise
+
+    except Exception, e:
+        raise Fault('Client', "Can't decode %r: %s" % (key, e))
+
+def _decode_member(member, element):
+    if _can_be_lazy(member):
+        return get_lazy_instance(member, element)
+
+    # arrays of ClassModels are lists of proxies, unless they're decoded to
+    # a container.
+    if (issubclass(_get_kind(member), Array) and
+                                        member.Attributes.decode_as is None):
+        (serializer,) = member._type_info.values()
+        if _can_be_lazy(serializer):
+            if _is_nil(element):
+                return None
+
+            return [_decode_member(serializer, c) for c in element
+                                      if not isinstance(c, etree._Comment)]
+
+    return member.from_xml(element)
+
+def decode(value):
+    """Decodes the fields of the given proxy that are not decoded yet, and
+    those of the proxies in them, so that they no longer refer to the request
+    document. Values that aren't proxies are left alone. Returns the value."""
+
+    if isinstance(value, list):
+        for v in value:
+            decode(v)
+
+    elif getattr(type(value), '_is_lazy', False):
+        for key in _get_member_table(type(value)):
+            decode(getattr(value, key))
+
+    return value
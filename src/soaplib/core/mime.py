@@ -1,9 +1,17 @@
 
 import logging
 logger = logging.getLogger(__name__)
+import cStringIO
+import mmap
+import os
+import quopri
+import tempfile
+import uuid
 from lxml import etree
 
 from base64 import b64encode
+from base64 import decodestring
+from email.parser import HeaderParser
 from urllib import unquote
 
 # import email data format related stuff
@@ -22,6 +30,9 @@ from email import message_from_string
 
 # import soaplib stuff
 from soaplib.core.model.binary import Attachment
+from soaplib.core.model.binary import get_expanded_length
+from soaplib.core.model.binary import has_attachments
+from soaplib.core.model.binary import iter_expanded
 from soaplib.core import namespaces
 
 
@@ -251,7 +262,7 @@ def apply_mtom(headers, envelope, params, paramvals):
             incl = etree.SubElement(param, "{%s}Include" % namespaces.ns_xop)
             incl.attrib["href"] = "cid:%s" % id
 
-            if paramvals[i].fileName and not paramvals[i].data:
+            if paramvals[i].file_name and not paramvals[i].data:
                 paramvals[i].load_from_file()
 
             data = paramvals[i].data
@@ -291,3 +302,337 @@ def apply_mtom(headers, envelope, params, paramvals):
         return (headers, envelope)
 
     return (mtomheaders, mtombody)
+
+def _is_attachment(cls):
+    return cls is Attachment or getattr(cls, '_is_clone_of', None) is Attachment
+
+def get_mtom_parts(params, paramvals):
+    '''
+    Prepares the values of a response for apply_mtom_streaming. Every
+    Attachment value is replaced by one that serializes to an xop:Include
+    element, so the envelope can be serialized once without base64 encoding
+    the attachments.
+
+    @param params    (name, type) pairs of the parameters of the message
+    @param paramvals values of the params
+    @return          tuple of length 2 with the list of values to serialize
+                     and a list of (content id, Attachment) tuples
+    '''
+
+    values = list(paramvals)
+    parts = []
+
+    for i in range(len(params)):
+        name, typ = params[i]
+        value = values[i]
+
+        if _is_attachment(typ) and not (value is None):
+            id = "soaplibAttachment_%s" % (len(parts) + 1, )
+
+            include = Attachment(value.data, value.file_name)
+            include.xop_href = "cid:%s" % id
+
+            values[i] = include
+            parts.append((id, value))
+
+    return values, parts
+
+def apply_mtom_streaming(headers, envelope, parts):
+    '''
+    Builds an MTOM response from an envelope prepared with get_mtom_parts, in
+    a single pass. The attachments are sent as they are, without encoding, and
+    file-backed attachments are read in chunks while the response is sent.
+
+    @param headers   Headers dictionary of the SOAP message that would
+                     originally be sent.
+    @param envelope  SOAP envelope string, as returned by etree.tostring.
+                     It may contain placeholders for streamed attachments.
+    @param parts     (content id, Attachment) tuples from get_mtom_parts
+    @return          tuple of length 3 with the dictionary of headers, an
+                     iterable of strings that make up the body and the length
+                     of the body
+    '''
+
+    if not parts:
+        return headers, [envelope], len(envelope)
+
+    # Get additional parameters from original Content-Type
+    ctarray = []
+    for n, v in headers.items():
+        if n.lower() == 'content-type':
+            ctarray = v.split(';')
+            break
+
+    roottype = ctarray[0].strip()
+    rootparams = ''.join(['; %s' % p.strip() for p in ctarray[1:]])
+
+    boundary = 'soaplib_MIME_boundary_%s' % uuid.uuid4().hex
+
+    mtomheaders = dict([(n, v) for n, v in headers.items()
+                                    if n.lower() not in ('content-type',
+                                                          'content-length')])
+    mtomheaders['Content-Type'] = ('multipart/related; '
+        'type="application/xop+xml"; boundary="%s"; '
+        'start="<soaplibEnvelope>"; start-info="%s"' % (boundary, roottype))
+
+    root_header = ('--%s\r\n'
+        'Content-Type: application/xop+xml%s; type="%s"\r\n'
+        'Content-Transfer-Encoding: 8bit\r\n'
+        'Content-ID: <soaplibEnvelope>\r\n'
+        '\r\n' % (boundary, rootparams, roottype))
+
+    part_headers = []
+    for id, attachment in parts:
+        part_headers.append('\r\n--%s\r\n'
+            'Content-Type: application/octet-stream\r\n'
+            'Content-Transfer-Encoding: binary\r\n'
+            'Content-ID: <%s>\r\n'
+            '\r\n' % (boundary, id))
+
+    trailer = '\r\n--%s--\r\n' % boundary
+
+    if has_attachments(envelope):
+        envelope_length = get_expanded_length(envelope)
+        envelope = iter_expanded(envelope)
+    else:
+        envelope_length = len(envelope)
+        envelope = [envelope]
+
+    length = len(root_header) + envelope_length + len(trailer)
+    for i in range(len(parts)):
+        length += len(part_headers[i]) + parts[i][1].get_size()
+
+    def iter_body():
+        yield root_header
+        for chunk in envelope:
+            yield chunk
+
+        for i in range(len(parts)):
+            yield part_headers[i]
+            for chunk in parts[i][1].iter_data():
+                yield chunk
+
+        yield trailer
+
+    return mtomheaders, iter_body(), length
+
+# the non-root parts of incoming multipart/related messages that are larger
+# than this are written to temporary files instead of being kept in memory.
+spool_size = 1 << 20
+
+_read_size = 64 * 1024
+_max_header_size = 64 * 1024
+
+class _PartWriter(object):
+    '''
+    Collects the body of a MIME part in memory, moving it to a temporary file
+    once it grows larger than spool_size.
+    '''
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.buffer = cStringIO.StringIO()
+        self.size = 0
+        self.file = None
+        self.file_name = None
+
+    def write(self, data):
+        self.size += len(data)
+
+        if self.file is None and self.spool and self.size > spool_size:
+            fd, self.file_name = tempfile.mkstemp(prefix='soaplib-')
+            self.file = os.fdopen(fd, 'wb')
+            self.file.write(self.buffer.getvalue())
+            self.buffer = None
+
+        if self.file is None:
+            self.buffer.write(data)
+        else:
+            self.file.write(data)
+
+    def get_value(self):
+        return self.buffer.getvalue()
+
+    def get_attachment(self, encoding):
+        '''
+        Returns the part as an Attachment, decoding it if needed.
+        '''
+
+        if self.file is None:
+            data = self.buffer.getvalue()
+            if encoding == 'base64':
+                data = decodestring(data)
+            elif encoding == 'quoted-printable':
+                data = quopri.decodestring(data)
+
+            return Attachment(data=data)
+
+        self.file.close()
+
+        if encoding == 'base64':
+            fd, file_name = tempfile.mkstemp(prefix='soaplib-')
+            f = os.fdopen(fd, 'wb')
+            src = open(self.file_name, 'rb')
+            text = mmap.mmap(src.fileno(), self.size, access=mmap.ACCESS_READ)
+            try:
+                Attachment.decode_to_file(text, f)
+            finally:
+                text.close()
+                src.close()
+                f.close()
+                os.unlink(self.file_name)
+
+            self.file_name = file_name
+
+        return Attachment(file_name=self.file_name)
+
+    def discard(self):
+        if not (self.file is None):
+            self.file.close()
+            os.unlink(self.file_name)
+
+def remove_spooled_parts(parts):
+    '''
+    Removes the temporary files of the parts returned by parse_multipart.
+    '''
+
+    for attachment in set(parts.values()):
+        if not (attachment.file_name is None):
+            try:
+                os.unlink(attachment.file_name)
+            except OSError:
+                pass
+
+def parse_multipart(stream, content_type, length):
+    '''
+    Parses an SwA or MTOM multipart/related message incrementally, reading at
+    most 'length' bytes from the given stream. The root part is kept in memory,
+    the others are spooled to temporary files when they're large. Binary
+    parts are returned as they are, without going through base64.
+
+    Pass the returned parts to soaplib.core.model.binary.set_xop_parts while
+    deserializing the root part so that the Attachments referred to by
+    xop:Include elements or hrefs are bound to them, and remove them with
+    remove_spooled_parts when they are no longer needed.
+
+    @param  stream       a file-like object to read the message from
+    @param  content_type value of the Content-Type header field, parsed by
+                         cgi.parse_header() function
+    @param  length       length of the message
+    @return              tuple of length 3 with the root part, its charset
+                         and a dict of hrefs ('cid:...') and content locations
+                         to Attachment instances
+    '''
+
+    params = content_type[1]
+    boundary = params.get('boundary', None)
+    if not boundary:
+        raise ValueError("multipart message without a boundary")
+
+    start = params.get('start', None)
+    charset = params.get('charset', None)
+
+    # lines may end with LF only. the CR, if any, is stripped from the end of
+    # the part body below.
+    delimiter = '\n--%s' % boundary
+    keep = len(delimiter) + 1
+
+    # the first delimiter doesn't have to be preceded by a line break
+    state = {'buffer': '\n', 'remaining': length}
+    def fill():
+        remaining = state['remaining']
+        if remaining <= 0:
+            raise ValueError("Unexpected end of multipart message")
+
+        data = stream.read(min(remaining, _read_size))
+        if not data:
+            raise ValueError("Unexpected end of multipart message")
+
+        state['remaining'] = remaining - len(data)
+        state['buffer'] += data
+
+    root = None
+    parts = {}
+    writer = None
+
+    try:
+        while True:
+            # copy the part body to the writer until the next delimiter
+            i = state['buffer'].find(delimiter)
+            while i < 0:
+                buffer = state['buffer']
+                if len(buffer) > keep:
+                    if not (writer is None):
+                        writer.write(buffer[:-keep])
+                    state['buffer'] = buffer[-keep:]
+                fill()
+                i = state['buffer'].find(delimiter)
+
+            buffer = state['buffer']
+            if not (writer is None):
+                if i > 0 and buffer[i - 1] == '\r':
+                    writer.write(buffer[:i - 1])
+                else:
+                    writer.write(buffer[:i])
+
+                if is_root:
+                    root = writer.get_value()
+                    charset = headers.get_content_charset(charset)
+
+                else:
+                    attachment = writer.get_attachment(encoding)
+                    cid = headers.get('Content-ID', None)
+                    if cid:
+                        parts['cid:%s' % cid.strip('<>')] = attachment
+                    loc = headers.get('Content-Location', None)
+                    if loc:
+                        parts[loc] = attachment
+
+                writer = None
+
+            state['buffer'] = buffer[i + len(delimiter):]
+            while len(state['buffer']) < 2:
+                fill()
+
+            if state['buffer'].startswith('--'):
+                break
+
+            # the rest of the delimiter line is ignored, the headers follow
+            # up to the first empty line.
+            while True:
+                buffer = state['buffer']
+                i = buffer.find('\n')
+                if i >= 0:
+                    j = buffer.find('\n\n', i)
+                    k = buffer.find('\n\r\n', i)
+                    if j >= 0 and (k < 0 or j < k):
+                        header_end, body_start = j, j + 2
+                        break
+                    elif k >= 0:
+                        header_end, body_start = k, k + 3
+                        break
+
+                if len(buffer) > _max_header_size:
+                    raise ValueError("MIME part headers too long")
+                fill()
+
+            headers = HeaderParser().parsestr(buffer[i + 1:header_end + 1])
+            encoding = (headers.get('Content-Transfer-Encoding', None) or
+                                                                 '').lower()
+
+            is_root = root is None and (start is None or
+                                     headers.get('Content-ID', None) == start)
+            writer = _PartWriter(spool=not is_root)
+            state['buffer'] = buffer[body_start:]
+
+    except:
+        if not (writer is None):
+            writer.discard()
+        remove_spooled_parts(parts)
+        raise
+
+    if root is None:
+        remove_spooled_parts(parts)
+        raise ValueError("multipart message without a root part")
+
+    return root, charset, parts
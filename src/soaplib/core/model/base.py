@@ -23,12 +23,20 @@ along with several helper functions.
 """
 
 
+import threading
+
 from soaplib.core import namespaces
 
 from lxml import etree
 
 __all__ = ('nillable_value','nillable_element','nillable_string','Base','Null',
-           'SimpleType')
+           'SimpleType','decode_targets','set_xmlids','set_multiref_output')
+
+# the values accepted by the decode_as argument of ClassModel.from_xml:
+#   'instance': instances of the ClassModel itself (the default)
+#   'dict': dicts of member names to member values
+#   'namedtuple': instances of a namedtuple generated for each ClassModel
+decode_targets = ('instance', 'dict', 'namedtuple')
 
 def nillable_value(func):
     def wrapper(cls, value, tns, parent_elt, *args, **kwargs):
@@ -38,12 +46,148 @@ def nillable_value(func):
             func(cls, value, tns, parent_elt, *args, **kwargs)
     return wrapper
 
+# the multi-ref (id/href) state of the message that's being deserialized in the
+# current thread. see set_xmlids.
+_multiref = threading.local()
+
+# the number of threads that have xmlids set. nillable_element only looks up the
+# thread-local state while it's not zero, so that decoding messages without
+# references doesn't pay for it.
+_multiref_threads = 0
+_multiref_lock = threading.Lock()
+
+def set_xmlids(xmlids):
+    """Sets the id -> element map that href="#id" references are resolved
+    against while deserializing in the current thread. Every referenced element
+    is deserialized once, and the same object is returned for each reference
+    to it. Pass None to unset it."""
+
+    global _multiref_threads
+
+    active = bool(xmlids)
+    if active != getattr(_multiref, 'active', False):
+        _multiref_lock.acquire()
+        try:
+            if active:
+                _multiref_threads += 1
+            else:
+                _multiref_threads -= 1
+        finally:
+            _multiref_lock.release()
+        _multiref.active = active
+
+    _multiref.xmlids = xmlids
+    _multiref.objects = {}
+    _multiref.pending = set()
+
+def _get_multiref_class(cls):
+    # clones made by customize() decode the same way as the class they're
+    # cloned from, unless they have their own members (e.g. Arrays).
+    original = cls.__dict__.get('_is_clone_of', None)
+    if original is None or (cls.__dict__.get('_type_info', None) is not
+                                    original.__dict__.get('_type_info', None)):
+        return cls
+
+    return original
+
+def _from_multiref_xml(func, cls, element, xmlids, args, kwargs):
+    # follow the references iteratively, until an element that has content.
+    href = element.get('href')
+    seen = None
+    while not (href is None) and href.startswith('#'):
+        if seen is None:
+            seen = set()
+        if href in seen:
+            from soaplib.core.model.exception import Fault
+            raise Fault('Client', 'Circular reference: %r' % href)
+        seen.add(href)
+
+        element = xmlids.get(href[1:], None)
+        if element is None:
+            from soaplib.core.model.exception import Fault
+            raise Fault('Client', 'Unresolved reference: %r' % href)
+        href = element.get('href')
+
+    id = element.get('id')
+    if id is None:
+        if bool(element.get('{%s}nil' % namespaces.ns_xsi)):
+            return None
+        return func(cls, element, *args, **kwargs)
+
+    key = (id, _get_multiref_class(cls)) + args
+    objects = _multiref.objects
+    if key in objects:
+        return objects[key]
+
+    # an element can't contain a reference to one of its ancestors, as there
+    # would be no object to return for it yet.
+    pending = _multiref.pending
+    if key in pending:
+        from soaplib.core.model.exception import Fault
+        raise Fault('Client', 'Circular reference: %r' % ('#' + id))
+
+    pending.add(key)
+    try:
+        if bool(element.get('{%s}nil' % namespaces.ns_xsi)):
+            retval = None
+        else:
+            retval = func(cls, element, *args, **kwargs)
+    finally:
+        pending.discard(key)
+
+    objects[key] = retval
+
+    return retval
+
+def set_multiref_output(enabled):
+    """Enables or disables multi-ref encoding in the current thread. When it's
+    enabled, a ClassModel instance that occurs more than once in the document
+    is only serialized the first time, with an id attribute, and its other
+    occurrences refer to it with href="#id"."""
+
+    if enabled:
+        _multiref.refs = {}
+        _multiref.ref_count = 0
+    else:
+        _multiref.refs = None
+
+def get_multiref_href(cls, value, element):
+    """Called by ClassModels before serializing the given value to the given
+    (empty) element. Returns None when the value has to be serialized, or the
+    href to use instead when it has already been serialized."""
+
+    refs = getattr(_multiref, 'refs', None)
+    if refs is None:
+        return None
+
+    key = (id(value), _get_multiref_class(cls))
+    ref = refs.get(key, None)
+    if ref is None:
+        # the value is kept so that its id can't be reused.
+        refs[key] = (value, element)
+        return None
+
+    first = ref[1]
+    ref_id = first.get('id')
+    if ref_id is None:
+        _multiref.ref_count += 1
+        ref_id = 'ref%d' % _multiref.ref_count
+        first.set('id', ref_id)
+
+    return '#' + ref_id
+
 def nillable_element(func):
-    def wrapper(cls, element):
+    def wrapper(cls, element, *args, **kwargs):
+        if _multiref_threads:
+            xmlids = getattr(_multiref, 'xmlids', None)
+            if xmlids:
+                return _from_multiref_xml(func, cls, element, xmlids, args,
+                                                                        kwargs)
+
         if bool(element.get('{%s}nil' % namespaces.ns_xsi)):
             return None
         else:
-            return func(cls, element)
+            return func(cls, element, *args, **kwargs)
     return wrapper
 
 def nillable_string(func):
@@ -194,6 +338,10 @@ class SimpleType(Base):
     __namespace__ = "http://www.w3.org/2001/XMLSchema"
     __base_type__ = None
 
+    # the array.array typecode of the native values of this type, for types
+    # that can be (de)serialized in bulk. see clazz.Array
+    __typecode__ = None
+
     class Attributes(Base.Attributes):
         values = set()
 
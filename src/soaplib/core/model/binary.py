@@ -18,17 +18,191 @@
 #
 
 import base64
-import cStringIO
+import os
+import re
+import tempfile
+import threading
 
+from urllib import unquote
+
+from soaplib.core import namespaces
 from soaplib.core.model.base import Base
 from soaplib.core.model import nillable_value, nillable_element
 
 from lxml import etree
 
+# The amount of raw data that's base64-encoded at once. It's a multiple of 57,
+# the number of bytes base64.encodestring puts on a line, so that the chunks
+# add up to exactly what encoding the whole data at once would produce.
+chunk_size = 57 * 1024
+
+# The processing instruction that stands for the base64 encoded contents of a
+# file in serialized xml documents. See Attachment.Attributes.stream. It
+# contains a random token, which is only expanded when the document records
+# it, so that the data of the document can't refer to arbitrary files.
+_pi_target = 'soaplib-attachment'
+_pi_prefix = '<?%s ' % _pi_target
+_pi_re = re.compile(r'<\?%s ([0-9a-f]{32})\?>' % _pi_target)
+
+# The dict the streamed attachments that are being serialized in the current
+# thread are recorded in. See set_streamed_files.
+_streamed = threading.local()
+
+# The attachments of the multipart/related request that is being deserialized
+# in the current thread, keyed by the hrefs that refer to them.
+_xop = threading.local()
+
+def set_xop_parts(parts):
+    """Sets the dict of hrefs ('cid:...') to Attachment instances that
+    xop:Include elements and SwA hrefs are resolved against when
+    deserializing Attachments in the current thread. Pass None to unset it."""
+
+    _xop.parts = parts
+
+def get_xop_parts():
+    """Returns the dict set by set_xop_parts() in the current thread."""
+
+    return getattr(_xop, 'parts', None)
+
+def set_streamed_files(files):
+    """Sets the dict that the streamed Attachments serialized in the current
+    thread record their files in, as (file name, size) tuples keyed by the
+    token of their placeholder. Pass None to unset it. Streamed Attachments
+    are serialized inline when it's not set."""
+
+    _streamed.files = files
+
+class StreamedDocument(str):
+    """A serialized xml document that contains placeholders for streamed
+    attachments. The files attribute is the dict that was given to
+    set_streamed_files() while it was serialized."""
+
+    def __new__(cls, xml_string, files):
+        retval = str.__new__(cls, xml_string)
+        retval.files = files
+        return retval
+
+def _get_xop_part(element):
+    href = None
+    if len(element) > 0 and element[0].tag == '{%s}Include' % namespaces.ns_xop:
+        href = element[0].get('href')
+
+    elif (element.get('href') or '').startswith('cid:'):
+        href = element.get('href')
+
+    if href is None:
+        return None
+
+    href = unquote(href)
+    parts = getattr(_xop, 'parts', None)
+    if parts is None or not (href in parts):
+        raise ValueError("Attachment %r not found" % href)
+
+    return parts[href]
+
+def _encoded_length(size):
+    """Returns the length of the output of base64.encodestring for an input of
+    the given size."""
+
+    return 4 * ((size + 2) // 3) + (size + 56) // 57
+
+def _iter_file_chunks(file_name, size=None):
+    """Reads the given file in chunks, up to size bytes when it's given.
+    Raises IOError if the file is shorter than that."""
+
+    f = open(file_name, 'rb')
+    try:
+        if size is None:
+            chunk = f.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = f.read(chunk_size)
+
+        else:
+            while size > 0:
+                chunk = f.read(min(size, chunk_size))
+                if not chunk:
+                    raise IOError("%r is shorter than it was" % file_name)
+                size -= len(chunk)
+                yield chunk
+
+    finally:
+        f.close()
+
+def _iter_placeholders(xml_string):
+    files = getattr(xml_string, 'files', None)
+    if not files:
+        return
+
+    for match in _pi_re.finditer(xml_string):
+        entry = files.get(match.group(1), None)
+        if entry is not None:
+            yield match, entry
+
+def has_attachments(xml_string):
+    """Returns True when the given serialized xml document contains
+    placeholders for streamed attachments."""
+
+    return bool(getattr(xml_string, 'files', None)) and \
+                                                    _pi_prefix in xml_string
+
+def iter_expanded(xml_string):
+    """Replaces the streamed attachment placeholders in the given serialized xml
+    document by the base64 encoded contents of the files they refer to. Returns
+    a generator of strings. The files are read in chunks, so the memory needed
+    does not depend on their size. As many bytes as the files had when they
+    were serialized are read from them."""
+
+    pos = 0
+    for match, (file_name, size) in _iter_placeholders(xml_string):
+        yield xml_string[pos:match.start()]
+        for chunk in _iter_file_chunks(file_name, size):
+            yield base64.encodestring(chunk)
+        pos = match.end()
+
+    yield xml_string[pos:]
+
+def get_expanded_length(xml_string):
+    """Returns the length of the document iter_expanded() would produce,
+    without reading the files."""
+
+    retval = len(xml_string)
+    for match, (file_name, size) in _iter_placeholders(xml_string):
+        retval -= match.end() - match.start()
+        retval += _encoded_length(size)
+
+    return retval
+
 class Attachment(Base):
+    """Binary data, sent as base64Binary. The data can either be given as a
+    string or as the name of a file to read it from.
+
+    Large files can be handled without holding them in memory:
+
+        * Attachment.customize(stream=True) does not read files during
+          serialization, but leaves a placeholder in the document which the
+          server transports expand by encoding the file chunk by chunk while
+          sending the response. See set_streamed_files() and
+          iter_expanded().
+        * Attachment.customize(spool=True) decodes incoming data in chunks to
+          a temporary file. The returned Attachment has its file_name set, and
+          it's up to the caller to remove the file. The base64 text is still
+          parsed as a whole with the rest of the document, only the decoded
+          data isn't held in memory. Requests that send the data in MTOM
+          parts are spooled while they're read, see mime.parse_multipart.
+    """
+
     __type_name__ = 'base64Binary'
     __namespace__ = "http://www.w3.org/2001/XMLSchema"
 
+    class Attributes(Base.Attributes):
+        stream = False
+        spool = False
+
+    # when set, the data is sent in a separate MIME part and the element only
+    # contains an xop:Include element that points to it. See mime.py.
+    xop_href = None
+
     def __init__(self, data=None, file_name=None):
         self.data = data
         self.file_name = file_name
@@ -39,7 +213,7 @@ class Attachment(Base):
         assumes that the file_name is the full path to the file to be written.
         This method also assumes that self.data is the base64 decoded data,
         and will do no additional transformations on it, simply write it to
-        disk.
+        disk. It's written chunk by chunk, without copying it.
         '''
 
         if not self.data:
@@ -48,9 +222,13 @@ class Attachment(Base):
         if not self.file_name:
             raise Exception("No file_name specified")
 
+        data = self.data
         f = open(self.file_name, 'wb')
-        f.write(self.data)
-        f.close()
+        try:
+            for i in xrange(0, len(data), chunk_size):
+                f.write(buffer(data, i, chunk_size))
+        finally:
+            f.close()
 
     def load_from_file(self):
         '''
@@ -60,8 +238,77 @@ class Attachment(Base):
         if not self.file_name:
             raise Exception("No file_name specified")
         f = open(self.file_name, 'rb')
-        self.data = f.read()
-        f.close()
+        try:
+            self.data = f.read()
+        finally:
+            f.close()
+
+    def get_size(self):
+        '''
+        Returns the length of the data, or the size of the file when there's
+        no data.
+        '''
+
+        if not (self.data is None):
+            return len(self.data)
+
+        elif not (self.file_name is None):
+            return os.path.getsize(self.file_name)
+
+        else:
+            raise Exception("Neither data nor a file_name has been specified")
+
+    def iter_data(self):
+        '''
+        Returns a generator of chunks of the data, or of the contents of the
+        file when there's no data.
+        '''
+
+        if not (self.data is None):
+            yield self.data
+
+        elif not (self.file_name is None):
+            for chunk in _iter_file_chunks(self.file_name):
+                yield chunk
+
+        else:
+            raise Exception("Neither data nor a file_name has been specified")
+
+    def iter_encoded(self):
+        '''
+        Returns a generator of base64 encoded chunks of the data, or of the
+        contents of the file when there's no data. The file is read and encoded
+        chunk by chunk, so it's never held in memory as a whole.
+        '''
+
+        if not (self.data is None):
+            data = self.data
+            for i in xrange(0, len(data), chunk_size):
+                yield base64.encodestring(data[i:i + chunk_size])
+
+        elif not (self.file_name is None):
+            for chunk in _iter_file_chunks(self.file_name):
+                yield base64.encodestring(chunk)
+
+        else:
+            raise Exception("Neither data nor a file_name has been specified")
+
+    @staticmethod
+    def decode_to_file(text, f):
+        '''
+        Decodes the given base64 string chunk by chunk, writing the result to
+        the given file object.
+        '''
+
+        rest = ''
+        for i in xrange(0, len(text), chunk_size):
+            chunk = rest + ''.join(text[i:i + chunk_size].split())
+            end = len(chunk) - len(chunk) % 4
+            f.write(base64.decodestring(chunk[:end]))
+            rest = chunk[end:]
+
+        if rest:
+            raise ValueError("Incorrect base64 padding")
 
     @classmethod
     @nillable_value
@@ -73,10 +320,14 @@ class Attachment(Base):
         from the file
         '''
 
-        assert isinstance(value, cls)
+        assert isinstance(value, Attachment)
 
         element = etree.SubElement(parent_elt, '{%s}%s' % (tns,name))
-        if not (value.data is None):
+        if not (value.xop_href is None):
+            etree.SubElement(element, '{%s}Include' % namespaces.ns_xop,
+                                                          href=value.xop_href)
+
+        elif not (value.data is None):
             # the data has already been loaded, just encode
             # and return the element
             element.text = base64.encodestring(value.data)
@@ -84,16 +335,15 @@ class Attachment(Base):
         elif not (value.file_name is None):
             # the data hasn't been loaded, but a file has been
             # specified
-            data_string = cStringIO.StringIO()
-
-            file_name = value.file_name
-            file = open(file_name, 'rb')
-            base64.encode(file, data_string)
-            file.close()
+            files = getattr(_streamed, 'files', None)
+            if cls.Attributes.stream and files is not None:
+                token = os.urandom(16).encode('hex')
+                files[token] = (os.path.abspath(value.file_name),
+                                              os.path.getsize(value.file_name))
+                element.append(etree.ProcessingInstruction(_pi_target, token))
 
-            # go back to the begining of the data
-            data_string.seek(0)
-            element.text = str(data_string.read())
+            else:
+                element.text = ''.join(value.iter_encoded())
 
         else:
             raise Exception("Neither data nor a file_name has been specified")
@@ -103,8 +353,28 @@ class Attachment(Base):
     def from_xml(cls, element):
         '''
         This method returns an Attachment object that contains
-        the base64 decoded string of the text of the given element
+        the base64 decoded string of the text of the given element. When the
+        element refers to a part of a multipart/related request, the data of
+        that part is returned as is. See set_xop_parts().
         '''
+
+        part = _get_xop_part(element)
+        if not (part is None):
+            return cls(part.data, part.file_name)
+
+        if cls.Attributes.spool:
+            fd, file_name = tempfile.mkstemp(prefix='soaplib-')
+            f = os.fdopen(fd, 'wb')
+            try:
+                cls.decode_to_file(element.text or '', f)
+            except:
+                f.close()
+                os.unlink(file_name)
+                raise
+            f.close()
+
+            return cls(file_name=file_name)
+
         data = base64.decodestring(element.text)
-        a = Attachment(data=data)
+        a = cls(data=data)
         return a
@@ -17,13 +17,26 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
 #
 
+import array
+import re
+
+from collections import namedtuple
+
 from lxml import etree
+from xml.sax.saxutils import quoteattr
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from soaplib.core import namespaces
 
 from soaplib.core.model import Base
 from soaplib.core.model import nillable_element
 from soaplib.core.model import nillable_value
+from soaplib.core.model import decode_targets
+from soaplib.core.model.base import get_multiref_href
 
 from soaplib.core.util.odict import odict as TypeInfo
 
@@ -58,6 +71,238 @@ class XMLAttributeRef(XMLAttribute):
             element.set('use', self._use)
 
 
+def _is_typed_array(value):
+    return isinstance(value, array.array) or \
+                        (numpy is not None and isinstance(value, numpy.ndarray))
+
+def _typed_array_to_parent_element(serializer, values, tns, parent_elt, name):
+    """Serializes the contents of an array.array or a numpy.ndarray as a
+    sequence of 'name' elements in one go. The values are formatted in bulk and
+    parsed back as a single xml fragment, which is a lot cheaper than calling
+    to_parent_element once per value. This is only safe for types whose string
+    representations don't need escaping, i.e. the ones that define a
+    __typecode__.
+    """
+
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        values = values.ravel()
+
+    strings = serializer.to_string_list(values.tolist())
+    if len(strings) == 0:
+        return
+
+    fragment = '<a xmlns=%s><%s>%s</%s></a>' % (quoteattr(tns), name,
+                        ('</%s><%s>' % (name, name)).join(strings), name)
+
+    parent_elt.extend(etree.fromstring(fragment))
+
+_flat_keys = {}
+
+def _get_flat_keys(cls):
+    retval = _flat_keys.get(cls, None)
+
+    if retval is None:
+        retval = _flat_keys[cls] = tuple(cls.get_flat_type_info().keys())
+
+    return retval
+
+_member_tables = {}
+
+def _get_member_table(cls):
+    """Returns a dict of member names to (member, is_attribute, is_multiple,
+    is_class) tuples, which is what from_xml needs to know about a member."""
+
+    retval = _member_tables.get(cls, None)
+
+    if retval is None:
+        retval = {}
+
+        for k, v in cls.get_flat_type_info().items():
+            if isinstance(v, XMLAttribute):
+                retval[k] = (v, True, False, False)
+
+            else:
+                mo = v.Attributes.max_occurs
+                retval[k] = (v, False, (mo == 'unbounded' or mo > 1),
+                                                 issubclass(v, ClassModelBase))
+
+        _member_tables[cls] = retval
+
+    return retval
+
+_namedtuple_classes = {}
+
+def _get_namedtuple_class(cls):
+    retval = _namedtuple_classes.get(cls, None)
+
+    if retval is None:
+        type_name = re.sub('[^0-9a-zA-Z_]', '_', cls.__name__)
+        retval = namedtuple(type_name, _get_flat_keys(cls), rename=True)
+        _namedtuple_classes[cls] = retval
+
+    return retval
+
+def _member_from_xml(member, element, decode_as):
+    """Deserializes a member element, passing the decode target down to
+    ClassModels."""
+
+    if decode_as is None or not issubclass(member, ClassModelBase):
+        return member.from_xml(element)
+
+    return member.from_xml(element, decode_as)
+
+def _columns_from_xml(serializer, element, decode_as=None):
+    rows = list(element.iterchildren(tag=etree.Element))
+    type_info = serializer.get_flat_type_info()
+
+    columns = TypeInfo()
+    for k in type_info:
+        columns[k] = [None] * len(rows)
+
+    for i, row in enumerate(rows):
+        if bool(row.get('{%s}nil' % namespaces.ns_xsi)):
+            continue
+
+        for k, v in type_info.items():
+            if isinstance(v, XMLAttribute):
+                columns[k][i] = row.get(k)
+
+        for c in row.iterchildren(tag=etree.Element):
+            key = c.tag.split('}')[-1]
+
+            member = type_info.get(key, None)
+            if member is None or isinstance(member, XMLAttribute):
+                continue
+
+            mo = member.Attributes.max_occurs
+            if mo == 'unbounded' or mo > 1:
+                value = columns[key][i]
+                if value is None:
+                    value = columns[key][i] = []
+                value.append(_member_from_xml(member, c, decode_as))
+            else:
+                columns[key][i] = _member_from_xml(member, c, decode_as)
+
+    return Columns(columns)
+
+def _typed_array_from_xml(serializer, element, decode_as):
+    strings = [c.text for c in element.iterchildren(tag=etree.Element)]
+    if None in strings:
+        raise ValueError("Nil or empty values can't be decoded into %r" %
+                                                                      decode_as)
+
+    values = serializer.from_string_list(strings)
+
+    return _to_typed_array(values, serializer.__typecode__, decode_as)
+
+def _to_typed_array(values, typecode, decode_as):
+    try:
+        if decode_as == 'ndarray':
+            if typecode == 'b':
+                return numpy.array(values, dtype=bool)
+            return numpy.array(values, dtype=typecode)
+
+        return array.array(typecode, values)
+
+    except OverflowError:
+        raise Fault('Client', "The values are out of the range of the %r "
+                              "typecode of %r" % (typecode, decode_as))
+
+# member getters, see ClassModelBase.get_members
+def _get_self(inst, key, default):
+    return inst
+
+_sequence_getters = {}
+
+def _get_sequence_getter(cls):
+    """Returns a member getter for values passed as sequences of member values
+    in the order of cls._type_info."""
+
+    retval = _sequence_getters.get(cls, None)
+
+    if retval is None:
+        indexes = dict([(k, i) for i, k in enumerate(cls._type_info.keys())])
+
+        def retval(inst, key, default):
+            i = indexes.get(key, None)
+            if i is None or i >= len(inst):
+                return default
+            return inst[i]
+
+        _sequence_getters[cls] = retval
+
+    return retval
+
+class Columns(object):
+    """Struct-of-arrays representation of a sequence of ClassModel instances.
+
+    Takes a mapping of member names to equally-sized sequences of member
+    values. When passed as the value of an Array of ClassModels, rows are
+    serialized straight from the columns, without constructing an object per
+    row. Missing columns are treated as None.
+
+    This is also what Array(..., decode_as='columns') deserializes to.
+    """
+
+    def __init__(self, columns):
+        lengths = set([len(c) for c in columns.values()])
+        if len(lengths) > 1:
+            raise ValueError("Columns must be of equal length, not %r" %
+                                                                sorted(lengths))
+
+        self.columns = columns
+        if len(lengths) == 0:
+            self.__len = 0
+        else:
+            (self.__len,) = lengths
+
+    def __len__(self):
+        return self.__len
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def get_rows(self):
+        """Returns an iterable of rows, and a member getter that fetches
+        values from them."""
+
+        columns = self.columns
+
+        def getter(i, key, default):
+            column = columns.get(key, None)
+            if column is None:
+                return default
+            return column[i]
+
+        return xrange(self.__len), getter
+
+class Rows(object):
+    """Sequence of ClassModel instances as an iterable of tuples.
+
+    Member values in each tuple are in the order given by 'fields'. Members
+    that are not in 'fields' are treated as None. When passed as the value of
+    an Array of ClassModels, rows are serialized straight from the tuples, so
+    e.g. a database cursor can be passed as-is.
+    """
+
+    def __init__(self, fields, rows):
+        self.fields = tuple(fields)
+        self.rows = rows
+
+    def get_rows(self):
+        """Returns an iterable of rows, and a member getter that fetches
+        values from them."""
+
+        indexes = dict([(k, i) for i, k in enumerate(self.fields)])
+
+        def getter(row, key, default):
+            i = indexes.get(key, None)
+            if i is None:
+                return default
+            return row[i]
+
+        return self.rows, getter
+
 class ClassModelMeta(type(Base)):
     """This is the metaclass that populates ClassModel instances with
     the appropriate datatypes for (de)serialization.
@@ -173,14 +418,33 @@ class ClassModelBase(Base):
         return cls()
 
     @classmethod
-    def get_members(cls, inst, parent):
+    def get_flat_type_info(cls):
+        """Returns the _type_info of this class merged with the _type_info of
+        the classes it extends, base class members first."""
+
+        retval = TypeInfo()
+
+        parent_cls = getattr(cls, '__extends__', None)
+        if parent_cls:
+            retval.update(parent_cls.get_flat_type_info().items())
+
+        retval.update(cls._type_info.items())
+
+        return retval
+
+    @classmethod
+    def get_members(cls, inst, parent, getter=getattr):
+        """Serializes the members of inst as children of the parent element.
+        Member values are fetched by calling getter(inst, member_name, None),
+        so inst needs not be an instance of cls."""
+
         parent_cls = getattr(cls, '__extends__', None)
         if parent_cls :
-            parent_cls.get_members(inst, parent)
+            parent_cls.get_members(inst, parent, getter)
 
         for k, v in cls._type_info.items():
 
-            subvalue = getattr(inst, k, None)
+            subvalue = getter(inst, k, None)
 
             if isinstance(v, XMLAttribute):
                 v.marshall(k, subvalue, parent)
@@ -189,7 +453,19 @@ class ClassModelBase(Base):
             mo = v.Attributes.max_occurs
 
             if mo == 'unbounded' or mo > 1:
-                if subvalue != None:
+                if _is_typed_array(subvalue) and \
+                                       getattr(v, '__typecode__', None):
+                    _typed_array_to_parent_element(v, subvalue,
+                                                cls.get_namespace(), parent, k)
+
+                elif isinstance(subvalue, (Columns, Rows)):
+                    tag = "{%s}%s" % (cls.get_namespace(), k)
+                    rows, row_getter = subvalue.get_rows()
+                    for row in rows:
+                        v.get_members(row, etree.SubElement(parent, tag),
+                                                                     row_getter)
+
+                elif subvalue is not None:
                     for sv in subvalue:
                         v.to_parent_element(sv, cls.get_namespace(), parent, k)
 
@@ -212,14 +488,44 @@ class ClassModelBase(Base):
 
         element = etree.SubElement(parent_elt, "{%s}%s" % (tns, name))
 
-        inst = cls.get_serialization_instance(value)
+        if isinstance(value, ClassModelBase):
+            href = get_multiref_href(cls, value, element)
+            if not (href is None):
+                element.set('href', href)
+                return
+
+        # lists, tuples and dicts are serialized as they are, see
+        # get_serialization_instance for the rationale.
+        if isinstance(value, dict):
+            cls.get_members(value, element, dict.get)
+
+        elif isinstance(value, list) or isinstance(value, tuple):
+            assert len(value) <= len(cls._type_info)
+            cls.get_members(value, element, _get_sequence_getter(cls))
 
-        cls.get_members(inst, element)
+        else:
+            inst = cls.get_serialization_instance(value)
+            cls.get_members(inst, element)
 
     @classmethod
     @nillable_element
-    def from_xml(cls, element):
-        inst = cls.get_deserialization_instance()
+    def from_xml(cls, element, decode_as=None):
+        """Deserializes the given element. The decode_as argument determines
+        what ClassModels (including the nested ones) are deserialized to. See
+        soaplib.core.model.base.decode_targets for the accepted values.
+        """
+
+        if decode_as is None or decode_as == 'instance':
+            decode_as = None
+            inst = cls.get_deserialization_instance()
+            getter, setter = getattr, setattr
+
+        else:
+            assert decode_as in decode_targets, decode_as
+            inst = dict.fromkeys(_get_flat_keys(cls))
+            getter, setter = dict.get, dict.__setitem__
+
+        members = _get_member_table(cls)
 
         for c in element:
             if isinstance(c, etree._Comment):
@@ -227,28 +533,33 @@ class ClassModelBase(Base):
 
             key = c.tag.split('}')[-1]
 
-            member = cls._type_info.get(key, None)
-            clz = getattr(cls,'__extends__', None)
-            while not (clz is None) and (member is None):
-                member = clz._type_info.get(key, None)
-                clz = getattr(clz,'__extends__', None)
-
-            if member is None:
+            entry = members.get(key, None)
+            if entry is None:
                 continue
 
-            if isinstance(member, XMLAttribute):
+            member, is_attribute, is_multiple, is_class = entry
+
+            if is_attribute:
                 value = element.get(key)
+
+            elif is_class and decode_as is not None:
+                value = member.from_xml(c, decode_as)
+
             else:
-                mo = member.Attributes.max_occurs
-                if mo == 'unbounded' or mo > 1:
-                    value = getattr(inst, key, None)
-                    if value is None:
-                        value = []
-                    value.append(member.from_xml(c))
-                else:
-                    value = member.from_xml(c)
+                value = member.from_xml(c)
+
+            if is_multiple:
+                values = getter(inst, key, None)
+                if values is None:
+                    values = []
+                values.append(value)
+                value = values
+
+            setter(inst, key, value)
 
-            setattr(inst, key, value)
+        if decode_as == 'namedtuple':
+            inst = _get_namedtuple_class(cls)._make(
+                                       [inst[k] for k in _get_flat_keys(cls)])
 
         return inst
 
@@ -364,7 +675,39 @@ class ClassModel(ClassModelBase):
     __metaclass__ = ClassModelMeta
 
 class Array(ClassModel):
+    """Sequence of values of the given type.
+
+    Arrays of Integer, Double, Float and Boolean values can also be given
+    array.array or numpy.ndarray instances, which are serialized in bulk. Pass
+    decode_as='array' or decode_as='ndarray' to get the deserialized values in
+    a typed container instead of a list.
+
+    Arrays of ClassModels can also be given Columns or Rows instances, and can
+    be deserialized to Columns by passing decode_as='columns'.
+    """
+
+    class Attributes(ClassModel.Attributes):
+        decode_as = None
+
     def __new__(cls, serializer, ** kwargs):
+        decode_as = kwargs.get('decode_as', None)
+        if decode_as == 'columns':
+            if not issubclass(serializer, ClassModelBase):
+                raise ValueError("%r values can't be decoded into columns" %
+                                                     serializer.get_type_name())
+
+        elif decode_as is not None:
+            if not (decode_as in ('array', 'ndarray')):
+                raise ValueError("decode_as must be one of 'array', 'ndarray' "
+                                 "or 'columns', not %r" % decode_as)
+
+            if getattr(serializer, '__typecode__', None) is None:
+                raise ValueError("%r values can't be decoded into %r" %
+                                          (serializer.get_type_name(), decode_as))
+
+            if decode_as == 'ndarray' and numpy is None:
+                raise ImportError("decode_as='ndarray' requires numpy")
+
         retval = cls.customize(**kwargs)
 
         # hack to default to unbounded arrays when the user didn't specify
@@ -403,6 +746,17 @@ class Array(ClassModel):
 
         ClassModel.resolve_namespace(cls, default_ns)
 
+    @classmethod
+    @nillable_value
+    def to_parent_element(cls, value, tns, parent_elt, name=None):
+        if name is None:
+            name = cls.get_type_name()
+
+        element = etree.SubElement(parent_elt, "{%s}%s" % (tns, name))
+
+        # the array value is the value of its only member.
+        cls.get_members(value, element, _get_self)
+
     @classmethod
     def get_serialization_instance(cls, value):
         inst = ClassModel.__new__(Array)
@@ -414,12 +768,22 @@ class Array(ClassModel):
 
     @classmethod
     @nillable_element
-    def from_xml(cls, element):
-        retval = []
+    def from_xml(cls, element, decode_as=None):
         (serializer,) = cls._type_info.values()
 
+        if decode_as == 'instance':
+            decode_as = None
+
+        container = cls.Attributes.decode_as
+        if container == 'columns':
+            return _columns_from_xml(serializer, element, decode_as)
+
+        elif container is not None:
+            return _typed_array_from_xml(serializer, element, container)
+
+        retval = []
         for child in element.getchildren():
-            retval.append(serializer.from_xml(child))
+            retval.append(_member_from_xml(serializer, child, decode_as))
 
         return retval
 
@@ -17,6 +17,8 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
 #
 
+import logging
+
 from soaplib.core import namespaces
 from lxml import etree
 from soaplib.core.model import Base
@@ -25,8 +27,25 @@ _ns_xsd = namespaces.ns_xsd
 _pref_soap_env = namespaces.const_prefmap[namespaces.ns_soap_env]
 
 class Fault(Exception, Base):
+    """A soap fault.
+
+    Faults raised by services are logged by Application.process_request
+    according to the following class attributes, which can be overridden in
+    subclasses:
+
+    log_level: The level the fault is logged at. None disables logging.
+    log_traceback: Whether the traceback is logged along with the fault.
+    log_rate: The maximum number of faults of this class that are logged per
+              second. The rest are counted and reported with the next logged
+              one. None means no limit.
+    """
+
     __type_name__ = "Fault"
 
+    log_level = logging.ERROR
+    log_traceback = True
+    log_rate = None
+
     def __init__(self, faultcode='Server', faultstring="",
                  faultactor="", detail=None):
         if faultcode.startswith('%s:' % _pref_soap_env):
@@ -19,11 +19,8 @@
 
 import datetime
 import decimal
-import re
-import pytz
 
 from lxml import etree
-from pytz import FixedOffset
 
 from soaplib.core import namespaces
 
@@ -31,22 +28,13 @@ from soaplib.core.model import SimpleType
 from soaplib.core.model import nillable_element
 from soaplib.core.model import nillable_value
 from soaplib.core.model import nillable_string
+from soaplib.core.util import iso8601
 from soaplib.core.util.duration import XmlDuration
 from soaplib.core.util.etreeconv import etree_to_dict
 from soaplib.core.util.etreeconv import dict_to_etree
 
 string_encoding = 'utf-8'
 
-_date_pattern = r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
-_time_pattern = r'(?P<hr>\d{2}):(?P<min>\d{2}):(?P<sec>\d{2})(?P<sec_frac>\.\d+)?'
-_offset_pattern = r'(?P<tz_hr>[+-]\d{2}):(?P<tz_min>\d{2})'
-_datetime_pattern = _date_pattern + '[T ]' + _time_pattern
-
-_local_re = re.compile(_datetime_pattern)
-_utc_re = re.compile(_datetime_pattern + 'Z')
-_offset_re = re.compile(_datetime_pattern + _offset_pattern)
-_date_re = re.compile(_date_pattern)
-
 _ns_xs = namespaces.ns_xsd
 _ns_xsi = namespaces.ns_xsi
 
@@ -185,6 +173,8 @@ class Decimal(SimpleType):
         return decimal.Decimal(string)
 
 class Integer(Decimal):
+    __typecode__ = 'l'
+
     @classmethod
     @nillable_string
     def from_string(cls, string):
@@ -193,6 +183,14 @@ class Integer(Decimal):
         except:
             return long(string)
 
+    @classmethod
+    def to_string_list(cls, values):
+        return map(str, values)
+
+    @classmethod
+    def from_string_list(cls, strings):
+        return map(int, strings)
+
 class Date(SimpleType):
     @classmethod
     @nillable_value
@@ -203,17 +201,7 @@ class Date(SimpleType):
     @nillable_string
     def from_string(cls, string):
         """expect ISO formatted dates"""
-        def parse_date(date_match):
-            fields = date_match.groupdict(0)
-            year, month, day = [int(fields[x]) for x in
-                ("year", "month", "day")]
-            return datetime.date(year, month, day)
-
-        match = _date_re.match(string)
-        if not match:
-            raise Exception("Date [%s] not in known format" % string)
-
-        return parse_date(match)
+        return iso8601.parse_date(string)
 
 class DateTime(SimpleType):
     __type_name__ = 'dateTime'
@@ -227,31 +215,7 @@ class DateTime(SimpleType):
     @nillable_string
     def from_string(cls, string):
         """expect ISO formatted dates"""
-        def parse_date(date_match, tz=None):
-            fields = date_match.groupdict(0)
-            year, month, day, hour, min, sec = [int(fields[x]) for x in
-                ("year", "month", "day", "hr", "min", "sec")]
-
-            # use of decimal module here (rather than float) might be better
-            # here, if willing to require python 2.4 or higher
-            microsec = int(float(fields.get("sec_frac", 0)) * 10 ** 6)
-
-            return datetime.datetime(year,month,day, hour,min,sec, microsec, tz)
-
-        match = _utc_re.match(string)
-        if match:
-            return parse_date(match, tz=pytz.utc)
-
-        match = _offset_re.match(string)
-        if match:
-            tz_hr, tz_min = [int(match.group(x)) for x in "tz_hr", "tz_min"]
-            return parse_date(match, tz=FixedOffset(tz_hr * 60 + tz_min, {}))
-
-        match = _local_re.match(string)
-        if not match:
-            raise Exception("DateTime [%s] not in known format" % string)
-
-        return parse_date(match)
+        return iso8601.parse_datetime(string)
 
 class Duration(SimpleType):
     __type_name__ = 'duration'
@@ -259,15 +223,21 @@ class Duration(SimpleType):
     @classmethod
     @nillable_value
     def to_parent_element(cls, value, tns, parent_elt, name='retval'):
-        duration = XmlDuration.parse(value)
-        SimpleType.to_parent_element(str(duration), tns, parent_elt, name)
+        if isinstance(value, datetime.timedelta):
+            string = iso8601.format_duration(value)
+        else:
+            string = str(XmlDuration.parse(value))
+
+        SimpleType.to_parent_element(string, tns, parent_elt, name)
 
     @classmethod
     @nillable_string
     def from_string(cls, string):
-        return XmlDuration.from_string(string).as_timedelta()
+        return iso8601.parse_duration(string)
 
 class Double(SimpleType):
+    __typecode__ = 'd'
+
     @classmethod
     @nillable_value
     def to_parent_element(cls, value, tns, parent_elt, name='retval'):
@@ -278,10 +248,20 @@ class Double(SimpleType):
     def from_string(cls, string):
         return float(string)
 
+    @classmethod
+    def to_string_list(cls, values):
+        return map(str, values)
+
+    @classmethod
+    def from_string_list(cls, strings):
+        return map(float, strings)
+
 class Float(Double):
     pass
 
 class Boolean(SimpleType):
+    __typecode__ = 'b'
+
     @classmethod
     @nillable_value
     def to_parent_element(cls, value, tns, parent_elt, name='retval'):
@@ -292,6 +272,14 @@ class Boolean(SimpleType):
     def from_string(cls, string):
         return (string.lower() in ['true', '1'])
 
+    @classmethod
+    def to_string_list(cls, values):
+        return [(v and 'true' or 'false') for v in values]
+
+    @classmethod
+    def from_string_list(cls, strings):
+        return [(s.lower() in ('true', '1')) for s in strings]
+
 # a class that is really a namespace
 class Mandatory(object):
     String = String(min_len=1, min_occurs=1, nillable=False)
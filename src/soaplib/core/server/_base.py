@@ -19,13 +19,25 @@
 
 """A soap server that uses http as transport, and wsgi as bridge api"""
 
+import re
+
 from lxml import etree
 
 import logging
 logger = logging.getLogger(__name__)
 
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.cache import CachedResponse
+from soaplib.core.deadline import DeadlineExceeded
+from soaplib.core.model.binary import get_expanded_length
+from soaplib.core.model.binary import has_attachments
+from soaplib.core.model.binary import iter_expanded
+from soaplib.core.model.binary import set_streamed_files
+from soaplib.core.model.binary import StreamedDocument
 from soaplib.core.model.exception import Fault
 from soaplib.core.model.primitive import string_encoding
+from soaplib.core.service import DefinitionBase
 
 HTTP_500 = '500 Internal server error'
 HTTP_200 = '200 OK'
@@ -34,12 +46,51 @@ HTTP_405 = '405 Method Not Allowed'
 class ValidationError(Fault):
     pass
 
+# the faultcode, faultstring and faultactor values of the fault that's
+# rendered to build the fault templates.
+_fault_markers = ('soaplib-fault-code', 'soaplib-fault-string',
+                                                        'soaplib-fault-actor')
+
+# characters lxml refuses to serialize.
+_xml_invalid_re = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def _escape_text(value):
+    """Escapes the given fault field the way lxml does. Returns None if it
+    can't be put in a template."""
+
+    if isinstance(value, str):
+        try:
+            value = value.decode('ascii')
+        except UnicodeDecodeError:
+            return None
+
+    elif not isinstance(value, unicode):
+        return None
+
+    if _xml_invalid_re.search(value) is not None:
+        return None
+
+    value = value.replace('&', '&amp;').replace('<', '&lt;') \
+                             .replace('>', '&gt;').replace('\r', '&#13;')
+
+    return value.encode(string_encoding)
+
+def _is_overridden(obj, name, base):
+    return getattr(type(obj), name).im_func is not getattr(base, name).im_func
+
 class Base(object):
     transport = None
 
     def __init__(self, app):
         self.app = app
-        self.app.transport = self.transport
+
+        # the transport is advertised in the wsdl. servers that don't speak
+        # soap don't have one, and leave the application's alone.
+        if self.transport is not None:
+            self.app.transport = self.transport
+
+        # (the nsmap the template was built with, the template)
+        self.__fault_template = None
 
     def get_in_object(self, ctx, in_string, in_string_charset=None):
         in_object = None
@@ -56,6 +107,15 @@ class Base(object):
     def get_out_object(self, ctx, in_object):
         out_object = self.app.process_request(ctx, in_object)
 
+        # nobody is waiting for the response anymore, so it's not serialized.
+        # responses that are shared by coalesced requests are serialized once
+        # for all of them, so they're left alone.
+        if (ctx.deadline is not None and ctx.deadline.expired() and
+                not isinstance(out_object, Fault) and
+                not (ctx.flight is not None and
+                                      ctx.descriptor.coalesce.share_response)):
+            out_object = DeadlineExceeded()
+
         if isinstance(out_object, Fault):
             ctx.out_error = out_object
         else:
@@ -63,8 +123,151 @@ class Base(object):
 
         return out_object
 
-    def get_out_string(self, ctx, out_object):
-        out_xml = self.app.serialize_soap(ctx, self.app.OUT_WRAPPER, out_object)
+    def resolve_flight(self, ctx):
+        """Tells the requests that share the serialized response of the given
+        one to serialize it themselves, unless it's been published already.
+        Servers call it for the requests whose soap response they don't
+        serialize, or fail to, so that coalesced requests never wait for it."""
+
+        flight = ctx.flight
+        if (flight is not None and flight.leader is ctx and
+                                   ctx.descriptor.coalesce.share_response and
+                                   not flight.serialized.isSet()):
+            ctx.descriptor.coalesce.set_out_string(flight, None)
+
+    def get_out_xml_string(self, ctx, out_object):
+        """Returns the serialized response, which may contain placeholders for
+        streamed attachments."""
+
+        flight = ctx.flight
+        if flight is not None and ctx.descriptor.coalesce.share_response:
+            coalescer = ctx.descriptor.coalesce
+            if flight.leader is not ctx:
+                out_string = coalescer.get_out_string(flight)
+                if out_string is not None:
+                    return out_string
+
+            else:
+                out_string = None
+                try:
+                    out_string = self.__get_out_xml_string(ctx, out_object)
+                finally:
+                    coalescer.set_out_string(flight, out_string)
+
+                return out_string
+
+        return self.__get_out_xml_string(ctx, out_object)
+
+    def __get_out_xml_string(self, ctx, out_object):
+        if isinstance(out_object, CachedResponse):
+            return out_object.out_string
+
+        if isinstance(out_object, Fault):
+            out_string = self.get_fault_string(ctx, out_object)
+            if out_string is not None:
+                return out_string
+
+        # the files of the streamed attachments are recorded on the side, only
+        # the placeholders they stand for are expanded.
+        files = {}
+        set_streamed_files(files)
+        try:
+            out_xml = self.app.serialize_soap(ctx, self.app.OUT_WRAPPER,
+                                                                     out_object)
+        finally:
+            set_streamed_files(None)
+
         out_string = etree.tostring(out_xml, xml_declaration=True,
                                                        encoding=string_encoding)
+        if files:
+            out_string = StreamedDocument(out_string, files)
+
+        # responses with streamed attachments depend on the files, so they
+        # aren't cached.
+        if ctx.cache_key is not None and not isinstance(out_object, Fault) \
+                                         and not has_attachments(out_string):
+            ctx.descriptor.cache.set(ctx.cache_key, out_string)
+
+        return out_string
+
+    def get_fault_string(self, ctx, fault):
+        """Returns the serialized response for the given fault without building
+        its tree, by filling the fault fields in a pre-rendered template.
+
+        Returns None when the fault can't be rendered that way, i.e. when it
+        has a detail element or a custom serializer, when the application
+        serializes faults differently, when the implementation hooks that get
+        the fault xml are overridden, or when the debug log is enabled.
+        """
+
+        if fault.detail is not None or logger.isEnabledFor(logging.DEBUG):
+            return None
+
+        for name in ('to_parent_element', 'add_to_parent_element'):
+            if _is_overridden(fault, name, Fault):
+                return None
+
+        for name in ('serialize_soap', 'on_exception_xml'):
+            if _is_overridden(self.app, name, Application):
+                return None
+
+        if ctx.service is not None and _is_overridden(ctx.service,
+                                   'on_method_exception_xml', DefinitionBase):
+            return None
+
+        values = []
+        for value in (fault.faultcode, fault.faultstring, fault.faultactor):
+            value = _escape_text(value)
+            if value is None:
+                return None
+
+            values.append(value)
+
+        # the namespace declarations on the envelope come from the nsmap of
+        # the application, so the template is rebuilt when it changes. it's
+        # replaced at once, so concurrent requests don't see a template that
+        # doesn't match its nsmap.
+        fault_template = self.__fault_template
+        if fault_template is None or fault_template[0] != self.app.nsmap:
+            fault_template = self.__fault_template = (dict(self.app.nsmap),
+                                                 self.__build_fault_template())
+
+        template = fault_template[1]
+
+        return ''.join((template[0], values[0], template[1], values[1],
+                                     template[2], values[2], template[3]))
+
+    def __build_fault_template(self):
+        fault = Fault()
+        fault.faultcode, fault.faultstring, fault.faultactor = _fault_markers
+
+        out_xml = self.app.serialize_soap(MethodContext(),
+                                                 self.app.OUT_WRAPPER, fault)
+        out_string = etree.tostring(out_xml, xml_declaration=True,
+                                                       encoding=string_encoding)
+
+        template = []
+        for marker in _fault_markers:
+            head, out_string = out_string.split('>%s<' % marker)
+            template.append(head + '>')
+            out_string = '<' + out_string
+        template.append(out_string)
+
+        return template
+
+    def get_out_string(self, ctx, out_object):
+        out_string = self.get_out_xml_string(ctx, out_object)
+        if has_attachments(out_string):
+            out_string = ''.join(iter_expanded(out_string))
+
         return out_string
+
+    def get_out_chunks(self, out_string):
+        """Takes the return value of get_out_xml_string and returns it as an
+        iterable of strings, along with its total length. Streamed attachments
+        are read while the iterable is consumed."""
+
+        if has_attachments(out_string):
+            return iter_expanded(out_string), get_expanded_length(out_string)
+
+        return [out_string], len(out_string)
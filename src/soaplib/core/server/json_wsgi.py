@@ -0,0 +1,221 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A wsgi application that serves the methods of an application as json over
+http, for the callers that don't need soap. The services are defined once, and
+this application can be mounted next to soaplib.core.server.wsgi.Application
+to serve them both ways.
+
+The method is called by posting a json object of its arguments to a url that
+ends with its name, e.g.:
+
+    POST /json/get_user
+    {"user_id": 42}
+
+The response is an object of the members of the method's response message, and
+faults are objects with their faultcode, faultstring, faultactor and detail:
+
+    {"get_userResult": {"name": "alice", "created": "2010-06-01T12:00:00"}}
+    {"faultcode": "Client.NotFound", "faultstring": "...", ...}
+
+The values are converted with soaplib.core.util.jsonconv. Soap headers aren't
+supported.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import json
+
+from lxml import etree
+
+from soaplib.core import MethodContext
+from soaplib.core.admission import Busy
+from soaplib.core.cache import CachedResponse
+from soaplib.core.deadline import Deadline
+from soaplib.core.deadline import earliest
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.exception import _pref_soap_env
+from soaplib.core.server import Base
+from soaplib.core.server.wsgi import HTTP_200
+from soaplib.core.server.wsgi import HTTP_405
+from soaplib.core.server.wsgi import HTTP_500
+from soaplib.core.server.wsgi import HTTP_503
+from soaplib.core.util.jsonconv import get_decoder
+from soaplib.core.util.jsonconv import get_encoder
+
+HTTP_404 = '404 Not Found'
+
+_fault_prefix = '%s:' % _pref_soap_env
+
+def get_fault_object(fault):
+    """Returns the json representation of the given fault."""
+
+    faultcode = fault.faultcode
+    if faultcode.startswith(_fault_prefix):
+        faultcode = faultcode[len(_fault_prefix):]
+
+    detail = fault.detail
+    if detail is not None and not isinstance(detail, basestring):
+        detail = etree.tostring(detail)
+
+    return {
+        'faultcode': faultcode,
+        'faultstring': fault.faultstring,
+        'faultactor': fault.faultactor,
+        'detail': detail,
+    }
+
+class Application(Base):
+    # json isn't a soap transport, the wsdl keeps describing the soap one.
+    transport = None
+
+    def __init__(self, app):
+        """@param The soaplib.core.Application instance to serve."""
+
+        Base.__init__(self, app)
+
+        self.routes = {}
+        for service_class in app.services:
+            for descriptor in app.get_service(service_class).public_methods:
+                self.routes[descriptor.name] = (service_class, descriptor)
+
+    def __call__(self, req_env, start_response):
+        if req_env['REQUEST_METHOD'].lower() != 'post':
+            start_response(HTTP_405, [('Allow', 'POST')])
+            return ['']
+
+        method_name = req_env.get('PATH_INFO', '').rstrip('/').split('/')[-1]
+        route = self.routes.get(method_name, None)
+        if route is None:
+            return self.__respond(start_response, HTTP_404, get_fault_object(
+              Fault('Client', 'Method not found: %r' % method_name)))
+
+        length = req_env.get('CONTENT_LENGTH')
+        if length:
+            in_string = req_env['wsgi.input'].read(int(length))
+        else:
+            in_string = ''
+
+        ctx = MethodContext()
+        ctx.service_class, ctx.descriptor = route
+        ctx.method_name = '{%s}%s' % (self.app.get_tns(),
+                                 ctx.descriptor.in_message.get_type_name())
+
+        try:
+            out_object = self.get_out_object(ctx,
+                                           self.get_in_object(ctx, in_string))
+
+            # the response cache holds soap messages, so the response is also
+            # serialized as one when it's to be cached. that also publishes
+            # it for the soap requests coalesced with this one.
+            if ctx.cache_key is not None and not isinstance(out_object,
+                                                  (Fault, CachedResponse)) and \
+                         (ctx.flight is None or ctx.flight.leader is ctx):
+                self.get_out_xml_string(ctx, out_object)
+
+            if isinstance(out_object, Fault):
+                status = HTTP_500
+                if isinstance(out_object, Busy):
+                    status = HTTP_503
+
+                return self.__respond(start_response, status,
+                                                  get_fault_object(out_object))
+
+            return self.__respond(start_response, HTTP_200,
+                                   self.get_result_object(ctx, out_object))
+
+        except Fault, e:
+            return self.__respond(start_response, HTTP_500,
+                                                           get_fault_object(e))
+
+        except Exception, e:
+            logger.exception(e)
+
+            return self.__respond(start_response, HTTP_500,
+                                   get_fault_object(Fault('Server', str(e))))
+
+        finally:
+            # the soap requests coalesced with this one don't get a response
+            # to share otherwise.
+            self.resolve_flight(ctx)
+
+    def get_in_object(self, ctx, in_string):
+        """Decodes the arguments of the method described by the given context
+        from the json request. Raises a Fault when they're invalid."""
+
+        ctx.service = self.app.get_service(ctx.service_class)
+
+        descriptor = ctx.descriptor
+        if descriptor.timeout is not None:
+            ctx.deadline = earliest(ctx.deadline, Deadline(descriptor.timeout))
+        ctx.service.deadline = ctx.deadline
+
+        decode_as = descriptor.decode_as
+        if decode_as is None:
+            decode_as = self.app.decode_as
+
+        body_class = descriptor.in_message
+        try:
+            args = {}
+            if in_string.strip():
+                args = json.loads(in_string)
+
+            in_object = get_decoder(body_class, decode_as)(args)
+
+        except ValueError, e:
+            raise Fault('Client.JsonError', str(e))
+
+        # the arguments are passed around as a sequence.
+        if decode_as == 'dict':
+            in_object = [in_object[k] for k in body_class._type_info.keys()]
+
+        return in_object
+
+    def get_result_object(self, ctx, out_object):
+        """Returns the json representation of the response message for the
+        given return value of the method."""
+
+        out_message = ctx.descriptor.out_message
+
+        # the responses in the cache are soap messages.
+        if isinstance(out_object, CachedResponse):
+            cached_ctx = MethodContext()
+            cached_ctx.service_class = ctx.service_class
+            cached_ctx.descriptor = ctx.descriptor
+
+            root, xmlids = self.app.parse_xml_string(out_object.out_string)
+            out_object = self.app.deserialize_soap(cached_ctx,
+                                        self.app.OUT_WRAPPER, root, xmlids)
+
+        # a single return value is returned unencapsulated.
+        elif len(out_message._type_info) == 1:
+            out_object = [out_object]
+
+        return get_encoder(out_message)(out_object) or {}
+
+    def __respond(self, start_response, status, obj):
+        out_string = json.dumps(obj, separators=(',', ':'))
+
+        start_response(status, [
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('Content-Length', str(len(out_string))),
+        ])
+
+        return [out_string]
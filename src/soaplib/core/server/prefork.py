@@ -0,0 +1,350 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A prefork http server for soaplib applications.
+
+The application is built, warmed up and frozen once in the parent process,
+which then forks worker processes that share its memory pages and accept
+connections on the same listening socket:
+
+    server = Server(Application([HelloWorldService], 'tns'), ('', 7789),
+                                                 workers=4, max_requests=10000)
+    server.serve_forever()
+
+Each worker handles one request at a time. Workers are replaced when they've
+handled max_requests requests and when they exit unexpectedly. SIGHUP replaces
+all workers gracefully: new ones are started, and the old ones exit once
+they've finished the request they're handling. SIGTERM and SIGINT stop the
+server the same way.
+
+With reuse_port=True, each worker listens on a socket of its own bound with
+SO_REUSEPORT, and the kernel spreads the connections evenly among them instead
+of waking them all up for each connection.
+
+The parent runs a full garbage collection before forking, so the workers don't
+inherit garbage whose collection would make them copy the pages it's in.
+Python only runs a full collection when the long-lived objects have grown by a
+quarter since the last one, so this also keeps the workers from traversing,
+and thereby copying, the objects they've inherited for a long time.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import errno
+import gc
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+
+from soaplib.core.server import wsgi
+
+# python 2 doesn't define it.
+_SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+if _SO_REUSEPORT is None and sys.platform.startswith('linux'):
+    _SO_REUSEPORT = 15
+
+class _RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.client_address[0], format % args)
+
+class _Worker(WSGIServer):
+    """Serves requests from a listening socket that's already bound."""
+
+    # how often the worker checks whether it should exit, in seconds.
+    timeout = 0.5
+
+    def __init__(self, sock, application):
+        WSGIServer.__init__(self, sock.getsockname()[:2], _RequestHandler,
+                                                        bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+
+        host, port = sock.getsockname()[:2]
+        self.server_address = (host, port)
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self.set_app(application)
+
+        self.requests = 0
+        self.stopping = False
+
+    def handle_request(self):
+        # SocketServer would take the timeout of the listening socket, which
+        # is non-blocking, and poll it.
+        try:
+            readable, writable, errors = select.select([self], [], [],
+                                                                  self.timeout)
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+            return
+
+        if readable:
+            self._handle_request_noblock()
+
+    def finish_request(self, request, client_address):
+        self.requests += 1
+        WSGIServer.finish_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        logger.error("Error handling a request from %s", client_address[0],
+                                                                  exc_info=True)
+
+class Server(object):
+    def __init__(self, app, address=('', 7789), workers=None, max_requests=0,
+                      reuse_port=False, backlog=128, graceful_timeout=30,
+                      wsdl_cache=None, url=None, freeze=True):
+        """The listening socket is bound right away, so server_address has the
+        actual port when port 0 is given.
+
+        @param The soaplib.core.Application instance to serve.
+        @param The (host, port) tuple to listen on.
+        @param The number of worker processes. Defaults to the number of cpus.
+        @param The number of requests after which a worker is replaced, or 0
+               to keep the workers running.
+        @param Whether each worker should listen on a socket of its own bound
+               with SO_REUSEPORT.
+        @param The length of the queue of connections that aren't accepted
+               yet.
+        @param The number of seconds the workers have to finish the requests
+               they're handling when they're stopped. They're killed
+               afterwards.
+        @param An optional cache to keep the wsdl documents in, see
+               soaplib.core.server.wsgi.Application.
+        @param The url the service is published at, which the wsdl document
+               is built with. Defaults to the url of the listening socket.
+        @param Whether to freeze the application before forking, see
+               soaplib.core.Application.freeze.
+        """
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers < 1:
+            raise ValueError("workers must be at least 1, not %r" % workers)
+        if max_requests < 0:
+            raise ValueError("max_requests must not be negative, not %r" %
+                                                                  max_requests)
+        if reuse_port and _SO_REUSEPORT is None:
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
+
+        self.app = app
+        self.wsgi_app = wsgi.Application(app, wsdl_cache)
+        self.workers = workers
+        self.max_requests = max_requests
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.freeze = freeze
+
+        self.socket = self.__bind(address)
+        self.server_address = self.socket.getsockname()[:2]
+
+        if url is None:
+            host, port = self.server_address
+            if host in ('', '0.0.0.0'):
+                host = socket.getfqdn()
+            url = 'http://%s:%d/' % (host, port)
+        self.url = url
+
+        # when reusing the port, the parent only holds on to the address. a
+        # listening socket of its own would get connections nobody accepts.
+        if not reuse_port:
+            self.__listen(self.socket)
+
+        # pid -> the generation of workers it belongs to.
+        self.__pids = {}
+        self.__generation = 0
+        self.__reload_requested = False
+        self.__stop_requested = False
+        self.__stop_time = None
+
+    def __bind(self, address):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, _SO_REUSEPORT, 1)
+        sock.bind(address)
+
+        return sock
+
+    def __listen(self, sock):
+        sock.listen(self.backlog)
+
+        # all the workers wake up when a connection arrives, and the ones that
+        # don't get it must not block in accept().
+        sock.setblocking(0)
+
+    def warm_up(self):
+        """Builds what's otherwise built by the first requests, so that the
+        workers inherit it instead of building it each."""
+
+        if self.freeze:
+            self.app.freeze(self.url)
+
+        else:
+            for service_class in self.app.services:
+                self.app.get_service(service_class)
+
+            self.app.get_wsdl(self.url)
+
+        gc.collect()
+
+    def reload(self):
+        """Replaces the workers gracefully. Can be called from a signal
+        handler."""
+
+        self.__reload_requested = True
+
+    def stop(self):
+        """Stops the workers gracefully and makes serve_forever return. Can be
+        called from a signal handler."""
+
+        self.__stop_requested = True
+
+    def serve_forever(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+
+        self.warm_up()
+
+        for i in range(self.workers):
+            self.__spawn()
+
+        try:
+            while len(self.__pids) > 0:
+                self.__handle_requests()
+
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+
+                except OSError, e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+
+                if pid == 0:
+                    # returns early when a signal arrives.
+                    time.sleep(0.1)
+                else:
+                    self.__reap(pid, status)
+
+        finally:
+            self.socket.close()
+
+    def __handle_requests(self):
+        if self.__stop_requested and self.__stop_time is None:
+            logger.info("Stopping %d workers", len(self.__pids))
+            self.__stop_time = time.time()
+            self.__kill(self.__pids.keys(), signal.SIGTERM)
+
+        elif self.__reload_requested and self.__stop_time is None:
+            self.__reload_requested = False
+            logger.info("Replacing %d workers", len(self.__pids))
+
+            old_pids = self.__pids.keys()
+            self.__generation += 1
+            for i in range(self.workers):
+                self.__spawn()
+            self.__kill(old_pids, signal.SIGTERM)
+
+        if self.__stop_time is not None and \
+                     time.time() - self.__stop_time > self.graceful_timeout:
+            self.__kill(self.__pids.keys(), signal.SIGKILL)
+
+    def __kill(self, pids, signum):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+
+            except OSError, e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def __reap(self, pid, status):
+        generation = self.__pids.pop(pid, None)
+        if generation is None:
+            return
+
+        if os.WIFSIGNALED(status) or os.WEXITSTATUS(status) != 0:
+            logger.error("Worker %d exited with status %d", pid, status)
+
+            # don't replace workers that can't start as fast as they can.
+            time.sleep(1)
+
+        if self.__stop_time is None and generation == self.__generation:
+            self.__spawn()
+
+    def __spawn(self):
+        pid = os.fork()
+        if pid != 0:
+            self.__pids[pid] = self.__generation
+            return
+
+        status = 1
+        try:
+            self.__run_worker()
+            status = 0
+
+        except:
+            logger.exception("Worker %d failed", os.getpid())
+
+        finally:
+            os._exit(status)
+
+    def __run_worker(self):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        parent_pid = os.getppid()
+
+        if self.reuse_port:
+            sock = self.__bind(self.server_address)
+            self.__listen(sock)
+            self.socket.close()
+        else:
+            sock = self.socket
+
+        worker = _Worker(sock, self.wsgi_app)
+
+        def stop(signum, frame):
+            worker.stopping = True
+        signal.signal(signal.SIGTERM, stop)
+
+        # the request that is being handled isn't interrupted.
+        signal.siginterrupt(signal.SIGTERM, False)
+
+        while not worker.stopping:
+            if self.max_requests > 0 and worker.requests >= self.max_requests:
+                break
+
+            # the parent is gone.
+            if os.getppid() != parent_pid:
+                break
+
+            worker.handle_request()
@@ -0,0 +1,324 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A soap server that runs in the twisted reactor as a twisted.web resource.
+
+Unlike wsgi.Application mounted with twisted.web.wsgi.WSGIResource, the
+requests are handled in the reactor thread, so the number of concurrent
+requests isn't bound by the size of the thread pool, and the service methods
+can return Deferreds:
+
+    class PageService(DefinitionBase):
+        @soap(String, _returns=String)
+        def fetch(self, url):
+            return getPage(url)
+
+    root.putChild('soap', TwistedWebResource(Application([PageService], 'tns')))
+
+Parsing and serializing large messages can be moved to the reactor's thread
+pool with the thread_threshold argument, the methods are always called in the
+reactor thread. The responses are written with request.write, and streamed
+attachments are read as the transport consumes them.
+
+The reactor thread never blocks: the requests a limiter would queue are
+rejected with a Busy fault, and coalesced requests wait for the identical one
+without holding it. Limiters only count methods that return Deferreds until
+they return, but coalesced requests get what the Deferred fires with. Mtom
+responses are not supported, their attachments are sent inline.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from twisted.internet import defer
+from twisted.internet import threads
+from twisted.internet.interfaces import IPullProducer
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
+from zope.interface import implementer
+
+from soaplib.core import MethodContext
+from soaplib.core._base import _log_fault
+from soaplib.core.admission import Busy
+from soaplib.core.coalesce import get_timeout_fault
+from soaplib.core.deadline import DeadlineExceeded
+from soaplib.core.deadline import min_timeout
+from soaplib.core.mime import remove_spooled_parts
+from soaplib.core.model.binary import set_xop_parts
+from soaplib.core.model.exception import Fault
+from soaplib.core.server import Base
+from soaplib.core.server.wsgi import _reconstruct_soap_request
+
+@implementer(IPullProducer)
+class _ChunkProducer(object):
+    """Writes the chunks of a response as the transport asks for them."""
+
+    def __init__(self, request, chunks):
+        self.request = request
+        self.chunks = chunks
+        self.iterator = iter(chunks)
+
+    def resumeProducing(self):
+        try:
+            chunk = self.iterator.next()
+
+        except StopIteration:
+            self.request.unregisterProducer()
+            self.request.finish()
+            self.stopProducing()
+
+        else:
+            self.request.write(chunk)
+
+    def stopProducing(self):
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+
+class TwistedWebResource(Resource, Base):
+    transport = 'http://schemas.xmlsoap.org/soap/http'
+
+    isLeaf = True
+
+    def __init__(self, app, thread_threshold=None, reactor=None):
+        """@param The soaplib.core.Application instance to serve.
+        @param The size in bytes of the requests that are parsed, and whose
+               responses are serialized, in the reactor's thread pool. None
+               keeps all of them in the reactor thread.
+        @param The reactor. Defaults to the global one.
+        """
+
+        Resource.__init__(self)
+        Base.__init__(self, app)
+
+        if reactor is None:
+            from twisted.internet import reactor
+
+        self.reactor = reactor
+        self.thread_threshold = thread_threshold
+
+    def render_GET(self, request):
+        # Assume the path matches the pattern:
+        # /stuff/stuff/stuff/serviceName.wsdl or
+        # /stuff/stuff/stuff/serviceName/?wsdl
+        if not request.uri.endswith('wsdl'):
+            request.setResponseCode(405)
+            request.setHeader('Allow', 'POST')
+            return ''
+
+        url = request.prePathURL()
+        if request.postpath:
+            url = '/'.join([url.rstrip('/')] + request.postpath)
+        url = url.split('.wsdl')[0]
+
+        try:
+            wsdl = self.app.get_wsdl(url)
+
+        except Exception, e:
+            logger.exception(e)
+            request.setResponseCode(500)
+            return ''
+
+        request.setHeader('Content-Type', 'text/xml; charset=utf-8')
+        request.setHeader('Content-Length', str(len(wsdl)))
+
+        return wsdl
+
+    def render_POST(self, request):
+        ctx = MethodContext()
+        ctx.blocking = False
+
+        content = request.content
+        content.seek(0, 2)
+        length = content.tell()
+        content.seek(0)
+
+        try:
+            in_string, in_string_charset, in_parts = \
+                                               _reconstruct_soap_request({
+                'wsgi.input': content,
+                'CONTENT_LENGTH': str(length),
+                'CONTENT_TYPE': request.getHeader('content-type') or 'text/xml',
+            })
+
+        except Fault, e:
+            self.__write_fault(request, e)
+            return NOT_DONE_YET
+
+        in_thread = (self.thread_threshold is not None and
+                                        len(in_string) >= self.thread_threshold)
+
+        lost = []
+        request.notifyFinish().addErrback(lambda failure: lost.append(failure))
+
+        if in_thread:
+            d = self.__defer_to_thread(self.__get_in_object, ctx, in_string,
+                                                   in_string_charset, in_parts)
+        else:
+            d = defer.maybeDeferred(self.__get_in_object, ctx, in_string,
+                                                   in_string_charset, in_parts)
+
+        d.addCallback(self.__get_out_object, ctx)
+
+        if in_thread:
+            d.addCallback(lambda out_object: self.__defer_to_thread(
+                                   self.get_out_xml_string, ctx, out_object))
+        else:
+            d.addCallback(lambda out_object: self.get_out_xml_string(ctx,
+                                                                   out_object))
+
+        d.addCallback(self.__write, request, ctx, lost)
+        d.addErrback(self.__fail, request, lost)
+        d.addBoth(lambda result: self.resolve_flight(ctx))
+        d.addBoth(lambda result: remove_spooled_parts(in_parts))
+
+        return NOT_DONE_YET
+
+    def get_out_xml_string(self, ctx, out_object):
+        # a coalesced request that doesn't lead its flight would block the
+        # reactor thread waiting for the leader to serialize the shared
+        # response, so it serializes its own. the leaders still publish
+        # theirs for the requests of the other transports.
+        if ctx.flight is not None and ctx.flight.leader is not ctx:
+            ctx.flight = None
+
+        return Base.get_out_xml_string(self, ctx, out_object)
+
+    def __defer_to_thread(self, f, *args):
+        return threads.deferToThreadPool(self.reactor,
+                                       self.reactor.getThreadPool(), f, *args)
+
+    def __get_in_object(self, ctx, in_string, in_string_charset, in_parts):
+        set_xop_parts(in_parts)
+        try:
+            return self.get_in_object(ctx, in_string, in_string_charset)
+        finally:
+            set_xop_parts(None)
+
+    def __get_out_object(self, in_object, ctx):
+        if ctx.in_error:
+            return ctx.in_error
+
+        out_object = self.get_out_object(ctx, in_object)
+        if ctx.flight is not None and out_object is ctx.flight:
+            return self.__wait_flight(ctx).addCallback(self.__get_result, ctx)
+
+        if not isinstance(out_object, defer.Deferred):
+            return out_object
+
+        out_object.addErrback(self.__get_fault, ctx)
+        out_object.addCallback(self.__get_result, ctx)
+
+        return out_object
+
+    def __wait_flight(self, ctx):
+        """Returns a Deferred that fires with the result of the request the
+        given one is coalesced with."""
+
+        coalescer = ctx.descriptor.coalesce
+        d = defer.Deferred()
+        timers = []
+
+        def fire(result):
+            if d.called:
+                return
+
+            for timer in timers:
+                if timer.active():
+                    timer.cancel()
+            d.callback(result)
+
+        timeout = min_timeout(coalescer.timeout, ctx.deadline)
+        if timeout is not None:
+            timers.append(self.reactor.callLater(timeout,
+                                   lambda: fire(get_timeout_fault(ctx.deadline))))
+
+        # the leader may finish in another thread.
+        coalescer.add_callback(ctx.flight,
+                          lambda result: self.reactor.callFromThread(fire, result))
+
+        return d
+
+    def __get_fault(self, failure, ctx):
+        fault = failure.value
+        if not isinstance(fault, Fault):
+            fault = Fault('Server', str(fault))
+
+        _log_fault(fault, (failure.type, failure.value,
+                                                 failure.getTracebackObject()))
+
+        # implementation hooks
+        ctx.service.on_method_exception_object(fault)
+        self.app.on_exception_object(fault)
+
+        return fault
+
+    def __get_result(self, result, ctx):
+        if not isinstance(result, Fault) and ctx.deadline is not None and \
+                                                       ctx.deadline.expired():
+            result = DeadlineExceeded()
+
+        if isinstance(result, Fault):
+            ctx.out_error = result
+
+        return result
+
+    def __write(self, out_string, request, ctx, lost):
+        if lost:
+            return
+
+        fault = ctx.in_error or ctx.out_error
+        if isinstance(fault, Busy):
+            request.setResponseCode(503)
+        elif fault is not None:
+            request.setResponseCode(500)
+
+        out_chunks, out_length = self.get_out_chunks(out_string)
+
+        request.setHeader('Content-Type', 'text/xml; charset=utf-8')
+        request.setHeader('Content-Length', str(out_length))
+
+        if isinstance(out_chunks, list):
+            for chunk in out_chunks:
+                request.write(chunk)
+            request.finish()
+
+        else:
+            request.registerProducer(_ChunkProducer(request, out_chunks), False)
+
+    def __fail(self, failure, request, lost):
+        logger.error("Error handling a soap request",
+                 exc_info=(failure.type, failure.value,
+                                                failure.getTracebackObject()))
+        if lost:
+            return
+
+        self.__write_fault(request, Fault('Server', str(failure.value)))
+
+    def __write_fault(self, request, fault):
+        request.setResponseCode(500)
+        request.setHeader('Content-Type', 'text/xml; charset=utf-8')
+
+        try:
+            out_string = self.get_out_xml_string(MethodContext(), fault)
+        except Exception:
+            out_string = ''
+
+        request.setHeader('Content-Length', str(len(out_string)))
+        request.write(out_string)
+        request.finish()
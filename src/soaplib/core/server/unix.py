@@ -0,0 +1,165 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A soap server that listens on a unix domain socket, for the callers that run
+on the same host.
+
+The requests and the responses are sent as frames (see
+soaplib.core.util.framing) instead of http messages. The name field of a
+request frame can hold the qualified name of the method's request element,
+e.g. '{tns}some_method', in which case it's used to find the method instead of
+the body. It's empty in the responses. A connection carries any number of
+requests, which the client can send without waiting for the previous responses.
+They're handled one at a time, and answered in the same order.
+
+Each connection is served by its own thread:
+
+    server = Server(Application([SomeService], 'tns'), '/tmp/some_service.sock')
+    server.serve_forever()
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import stat
+import SocketServer
+
+from soaplib.core import MethodContext
+from soaplib.core.model.exception import Fault
+from soaplib.core.server import Base
+from soaplib.core.util.framing import FrameError
+from soaplib.core.util.framing import pack_frame
+from soaplib.core.util.framing import read_frame
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        self.server.soap_server.handle_connection(self.rfile, self.wfile)
+
+class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, soap_server, path, backlog):
+        self.soap_server = soap_server
+        self.request_queue_size = backlog
+
+        SocketServer.UnixStreamServer.__init__(self, path, _RequestHandler)
+
+    def handle_error(self, request, client_address):
+        logger.exception("Error serving a connection")
+
+class Server(Base):
+    transport = 'urn:soaplib:transport:unix'
+
+    def __init__(self, app, path, max_request_size=16 * 1024 * 1024,
+                                                                  backlog=128):
+        """@param The soaplib.core.Application instance to serve.
+        @param The path of the socket. A socket left there by a previous server
+               is replaced.
+        @param The size in bytes of the largest request that's accepted. The
+               connections that send larger ones are closed.
+        @param The maximum number of connections waiting to be accepted.
+        """
+
+        Base.__init__(self, app)
+
+        if max_request_size < 1:
+            raise ValueError("max_request_size must be at least 1, not %r" %
+                                                               max_request_size)
+
+        self.path = path
+        self.max_request_size = max_request_size
+
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except OSError:
+            pass
+
+        self.server = _UnixServer(self, path, backlog)
+
+    def handle_connection(self, rfile, wfile):
+        """Answers the requests read from rfile until the connection is closed
+        or sends an invalid frame."""
+
+        while True:
+            try:
+                frame = read_frame(rfile, self.max_request_size)
+            except FrameError, e:
+                logger.warning("Closing the connection: %s", e)
+                return
+
+            if frame is None:
+                return
+
+            name, in_string = frame
+
+            # the frame is sent with a single write, as wfile isn't buffered.
+            wfile.write(pack_frame(None, self.handle_request(name, in_string)))
+
+    def handle_request(self, name, in_string):
+        """Returns the response to the given request. The method is found by
+        name when it's not empty."""
+
+        ctx = MethodContext()
+        if name:
+            ctx.method_name = name.decode('utf8')
+
+        try:
+            in_object = self.get_in_object(ctx, in_string)
+            if ctx.in_error:
+                out_object = ctx.in_error
+            else:
+                out_object = self.get_out_object(ctx, in_object)
+
+            return self.get_out_string(ctx, out_object)
+
+        except Fault, e:
+            return self.get_out_string(MethodContext(), e)
+
+        except Exception, e:
+            logger.exception(e)
+
+            return self.get_out_string(MethodContext(), Fault('Server', str(e)))
+
+        finally:
+            self.resolve_flight(ctx)
+
+    def serve_forever(self, poll_interval=0.5):
+        """Accepts connections until shutdown is called.
+
+        @param How often the shutdown flag is checked, in seconds.
+        """
+
+        self.server.serve_forever(poll_interval)
+
+    def shutdown(self):
+        """Stops serve_forever, which must be running in another thread."""
+
+        self.server.shutdown()
+
+    def close(self):
+        """Closes the listening socket and removes its path. The connections
+        that are already accepted stay open."""
+
+        self.server.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
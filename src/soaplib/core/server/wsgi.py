@@ -22,46 +22,126 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import binascii
 import cgi
 import traceback
 
 import soaplib
 
+from soaplib.core.admission import Busy
 from soaplib.core.model.exception import Fault
 
-from soaplib.core.mime import apply_mtom
-from soaplib.core.mime import collapse_swa
+from soaplib.core.mime import apply_mtom_streaming
+from soaplib.core.mime import get_mtom_parts
+from soaplib.core.mime import parse_multipart
+from soaplib.core.mime import remove_spooled_parts
+from soaplib.core.model.binary import has_attachments
+from soaplib.core.model.binary import iter_expanded
+from soaplib.core.model.binary import set_xop_parts
 from soaplib.core.util import reconstruct_url
 from soaplib.core.server import Base
+from soaplib.core.server._base import _is_overridden
 
 HTTP_500 = '500 Internal server error'
 HTTP_200 = '200 OK'
 HTTP_405 = '405 Method Not Allowed'
+HTTP_413 = '413 Request Entity Too Large'
+HTTP_503 = '503 Service Unavailable'
 
 class ValidationError(Fault):
     pass
 
+class RequestTooLarge(Fault):
+    """The fault the requests that are larger than the _max_request_size of
+    their method get."""
+
+    def __init__(self, faultcode='Client.RequestTooLarge',
+                 faultstring='The request is too large',
+                 faultactor='', detail=None):
+        Fault.__init__(self, faultcode, faultstring, faultactor, detail)
+
+def _get_fault_status(fault):
+    if isinstance(fault, Busy):
+        return HTTP_503
+    if isinstance(fault, RequestTooLarge):
+        return HTTP_413
+    return HTTP_500
+
+def _get_length(http_env):
+    return int(http_env.get('CONTENT_LENGTH') or 0)
+
 def _reconstruct_soap_request(http_env):
-    """Reconstruct http payload using information in the http header
+    """Reconstruct http payload using information in the http header. Returns
+    the soap envelope, its charset and the attachments of multipart/related
+    requests. Raises a Client fault when the request is malformed.
     """
 
     input = http_env.get('wsgi.input')
     length = http_env.get("CONTENT_LENGTH")
-    http_payload = input.read(int(length))
 
     # fyi, here's what the parse_header function returns:
     # >>> import cgi; cgi.parse_header("text/xml; charset=utf-8")
     # ('text/xml', {'charset': 'utf-8'})
     content_type = cgi.parse_header(http_env.get("CONTENT_TYPE"))
-    charset = content_type[1].get('charset',None)
+
+    try:
+        if 'multipart/related' in content_type[0]:
+            envelope, charset, parts = parse_multipart(input, content_type,
+                                                                    int(length))
+
+        else:
+            envelope = input.read(int(length))
+            charset = content_type[1].get('charset',None)
+            parts = {}
+
+    except (ValueError, binascii.Error), e:
+        raise Fault('Client', 'Malformed request: %s' % e)
+
     if charset is None:
         charset = 'ascii'
 
-    return collapse_swa(content_type, http_payload), charset
+    return envelope, charset, parts
+
+class _Response(object):
+    """Removes the spooled attachments of the request once the response is sent.
+    Wsgi servers call the close() method of the iterable they're given when
+    they're done with it."""
+
+    def __init__(self, chunks, parts):
+        self.chunks = chunks
+        self.parts = parts
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        try:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+        finally:
+            remove_spooled_parts(self.parts)
 
 class Application(Base):
     transport = 'http://schemas.xmlsoap.org/soap/http'
 
+    def __init__(self, app, wsdl_cache=None, reject_unknown_actions=False):
+        """@param The soaplib.core.Application instance to serve.
+        @param An optional soaplib.core.cache.ResponseCache or
+               SharedResponseCache to keep the wsdl documents in, so that
+               they're built once for all the processes that share it. A
+               wsdl larger than the entries of the cache is built for every
+               request, and a warning is logged.
+        @param Whether the requests whose SOAPAction header doesn't name a
+               method are rejected without being read. By default, their
+               method is found from the body, as some clients don't send the
+               soapAction of the wsdl.
+        """
+
+        Base.__init__(self, app)
+
+        self.wsdl_cache = wsdl_cache
+        self.reject_unknown_actions = reject_unknown_actions
+
     def __call__(self, req_env, start_response, wsgi_url=None):
         '''This method conforms to the WSGI spec for callable wsgi applications
         (PEP 333). It looks in environ['wsgi.input'] for a fully formed soap
@@ -105,7 +185,18 @@ class Application(Base):
         http_resp_headers = {'Content-Type': 'text/xml'}
 
         try:
-            wsdl = self.app.get_wsdl(url)
+            wsdl = None
+            key = None
+            if self.wsdl_cache is not None:
+                key = self.wsdl_cache.get_key('wsdl', [url])
+                wsdl = self.wsdl_cache.get(key)
+
+            if wsdl is None:
+                wsdl = self.app.get_wsdl(url)
+                if key is not None and not self.wsdl_cache.set(key, wsdl):
+                    logger.warning("the wsdl (%d bytes) is too large for the "
+                                   "wsdl cache, it's not cached" % len(wsdl))
+
             self.on_wsdl(req_env, wsdl) # implementation hook
 
             http_resp_headers['Content-Length'] = str(len(wsdl))
@@ -129,49 +220,142 @@ class Application(Base):
         # implementation hook
         self.on_wsgi_call(req_env)
 
-        in_string, in_string_charset = _reconstruct_soap_request(req_env)
+        # when the method is known from the SOAPAction header, the requests
+        # that would be rejected anyway are rejected before they're read.
+        soap_action = req_env.get('HTTP_SOAPACTION', '').strip().strip('"')
+        if soap_action:
+            error = None
+            if self.app.resolve_soap_action(ctx, soap_action):
+                error = self.__get_early_error(ctx, req_env)
+
+            elif self.reject_unknown_actions:
+                error = ValidationError('Client', 'Method not found: %r' %
+                                                                   soap_action)
+
+            if error is not None:
+                return self.__get_response(ctx, req_env, start_response,
+                                                 _get_fault_status(error), error)
+
+        try:
+            in_string, in_string_charset, in_parts = \
+                                          _reconstruct_soap_request(req_env)
+        except Fault, e:
+            return self.__get_response(ctx, req_env, start_response,
+                                                                  HTTP_500, e)
+
+        try:
+            out_chunks = self.__process_soap_request(ctx, req_env,
+                 start_response, in_string, in_string_charset, in_parts)
+
+        except:
+            self.resolve_flight(ctx)
+            remove_spooled_parts(in_parts)
+            raise
 
-        in_object = self.get_in_object(ctx, in_string, in_string_charset)
+        if in_parts:
+            out_chunks = _Response(out_chunks, in_parts)
+
+        return out_chunks
+
+    def __process_soap_request(self, ctx, req_env, start_response, in_string,
+                                                   in_string_charset, in_parts):
+        pre_dispatched = ctx.descriptor is not None
+
+        set_xop_parts(in_parts)
+        try:
+            in_object = self.get_in_object(ctx, in_string, in_string_charset)
+        finally:
+            set_xop_parts(None)
+
+        # the limit of the method is enforced whether it was known up front
+        # or not.
+        if not (ctx.in_error or pre_dispatched or ctx.descriptor is None):
+            max_size = ctx.descriptor.max_request_size
+            if max_size is not None and _get_length(req_env) > max_size:
+                ctx.in_error = RequestTooLarge()
 
         return_code = HTTP_200
         if ctx.in_error:
             out_object = ctx.in_error
-            return_code = HTTP_500
+            return_code = _get_fault_status(out_object)
         else:
             assert ctx.service != None
             out_object = self.get_out_object(ctx, in_object)
             if ctx.out_error:
                 out_object = ctx.out_error
-                return_code = HTTP_500
+                return_code = _get_fault_status(out_object)
+
+        return self.__get_response(ctx, req_env, start_response, return_code,
+                                                                     out_object)
 
-        out_string = self.get_out_string(ctx, out_object)
+    def __get_early_error(self, ctx, req_env):
+        """Returns the fault the request gets before it's read, or None."""
 
+        descriptor = ctx.descriptor
+
+        max_size = descriptor.max_request_size
+        if max_size is not None and _get_length(req_env) > max_size:
+            return RequestTooLarge()
+
+        limiter = descriptor.limiter
+        if limiter is not None and limiter.reject_if_full():
+            return Busy()
+
+        return None
+
+    def __get_response(self, ctx, req_env, start_response, return_code,
+                                                                   out_object):
         http_resp_headers = {
             'Content-Type': 'text/xml',
             'Content-Length': '0',
         }
 
-        # implementation hook
-        self.on_wsgi_return(req_env, http_resp_headers, out_string)
-
-        if ctx.descriptor and ctx.descriptor.mtom:
-            # when there are more than one return type, the result is 
+        if ctx.descriptor and ctx.descriptor.mtom and \
+                                           not isinstance(out_object, Fault):
+            # when there are more than one return type, the result is
             # encapsulated inside a list. when there's just one, the result
-            # is returned unencapsulated. the apply_mtom always expects the
+            # is returned unencapsulated. get_mtom_parts always expects the
             # objects to be inside an iterable, hence the following test.
-            out_type_info = ctx.descriptor.out_message._type_info
-            if len(out_type_info) == 1:
-                out_object = [out_object]
+            params = list(ctx.descriptor.out_message._type_info.items())
+            if len(params) == 1:
+                out_values, parts = get_mtom_parts(params, [out_object])
+                out_object = out_values[0]
 
-            http_resp_headers, out_string = apply_mtom(http_resp_headers,
-                    out_string, ctx.descriptor.out_message._type_info.values(),
-                    out_object)
+            else:
+                out_object, parts = get_mtom_parts(params, out_object)
+
+            out_string = self.__get_out_xml_string(ctx, out_object)
+
+            # implementation hook
+            self.on_wsgi_return(req_env, http_resp_headers, out_string)
+
+            http_resp_headers, out_chunks, out_length = apply_mtom_streaming(
+                                         http_resp_headers, out_string, parts)
+
+        else:
+            out_string = self.__get_out_xml_string(ctx, out_object)
+
+            # implementation hook
+            self.on_wsgi_return(req_env, http_resp_headers, out_string)
+
+            out_chunks, out_length = self.get_out_chunks(out_string)
 
         # initiate the response
-        http_resp_headers['Content-Length'] = str(len(out_string))
+        http_resp_headers['Content-Length'] = str(out_length)
         start_response(return_code, http_resp_headers.items())
 
-        return [out_string]
+        return out_chunks
+
+    def __get_out_xml_string(self, ctx, out_object):
+        out_string = self.get_out_xml_string(ctx, out_object)
+
+        # on_wsgi_return gets the whole response, so the streamed attachments
+        # are only kept out of memory when it's not overridden.
+        if has_attachments(out_string) and \
+                             _is_overridden(self, 'on_wsgi_return', Application):
+            out_string = ''.join(iter_expanded(out_string))
+
+        return out_string
 
     def on_wsgi_call(self, environ):
         '''This is the first method called when this WSGI app is invoked.
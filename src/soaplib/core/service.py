@@ -25,6 +25,7 @@ from lxml import etree
 
 from soaplib.core import namespaces, styles
 from soaplib.core import MethodDescriptor
+from soaplib.core.model import decode_targets
 from soaplib.core.model.clazz import ClassModel as Message
 from soaplib.core.model.clazz import ClassModelMeta as MessageMeta
 from soaplib.core.model.clazz import TypeInfo
@@ -160,6 +161,38 @@ def soap(*params, **kparams):
                 _out_header = kparams.get('_out_header', None)
                 _port_type = kparams.get('_port_type', None)
                 _style = kparams.get('_style', styles.RPC_STYLE)
+                _decode_as = kparams.get('_decode_as', None)
+                _multiref = kparams.get('_multiref', False)
+                _cache = kparams.get('_cache', None)
+                _coalesce = kparams.get('_coalesce', None)
+                _limiter = kparams.get('_limiter', None)
+                _priority = kparams.get('_priority', 0)
+                _timeout = kparams.get('_timeout', None)
+                _max_request_size = kparams.get('_max_request_size', None)
+                _lazy = kparams.get('_lazy', False)
+
+                if not (_decode_as is None or _decode_as in decode_targets):
+                    raise ValueError("_decode_as must be one of %r, not %r" %
+                                                 (decode_targets, _decode_as))
+
+                # get_mtom_parts needs the return value of the method, which
+                # isn't there when the response comes from the cache.
+                if _cache is not None and _mtom:
+                    raise ValueError("_cache can't be used with _mtom")
+
+                if not (_timeout is None or _timeout > 0):
+                    raise ValueError("_timeout must be a positive number of "
+                                     "seconds, not %r" % (_timeout,))
+
+                # lazily decoded arguments are always instances.
+                if _lazy and not (_decode_as is None or
+                                                  _decode_as == 'instance'):
+                    raise ValueError("_lazy can't be used with _decode_as=%r" %
+                                                                   _decode_as)
+
+                if not (_max_request_size is None or _max_request_size > 0):
+                    raise ValueError("_max_request_size must be a positive "
+                             "number of bytes, not %r" % (_max_request_size,))
 
                 # the decorator function does not have a reference to the
                 # class and needs to be passed in
@@ -211,6 +244,15 @@ def soap(*params, **kparams):
                                           _faults,
                                           _style,
                                           _port_type,
+                                          _decode_as,
+                                          _multiref,
+                                          _cache,
+                                          _coalesce,
+                                          _limiter,
+                                          _priority,
+                                          _timeout,
+                                          _max_request_size,
+                                          _lazy,
                                          )
             return retval
 
@@ -291,6 +333,9 @@ class DefinitionBase(object):
         self.in_header = None
         self.out_header = None
 
+        # the soaplib.core.deadline.Deadline of the request, if it has one.
+        self.deadline = None
+
         cls = self.__class__
         if not (cls in _public_methods_cache):
             _public_methods_cache[cls] = self.build_public_methods()
@@ -371,7 +416,7 @@ class DefinitionBase(object):
         return retval
 
     def build_public_methods(self):
-        '''Returns a list of method descriptors for this object'''
+        '''Returns a tuple of method descriptors for this object'''
 
         logger.debug('building public methods')
         public_methods = []
@@ -384,7 +429,7 @@ class DefinitionBase(object):
                 descriptor = func(_method_descriptor=True, clazz=self.__class__)
                 public_methods.append(descriptor)
 
-        return public_methods
+        return tuple(public_methods)
 
     def get_method(self, name):
         '''Returns the metod descriptor based on element name or soap action.'''
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import threading
+import time
+import unittest
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.admission import Busy
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.model.primitive import Float
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+backend = Limiter(max_concurrency=1, max_queue=10)
+small = Limiter(max_concurrency=1, max_queue=1)
+
+class LimitedService(DefinitionBase):
+    @soap(Float, _returns=Float, _limiter=backend)
+    def expensive(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @soap(Float, _returns=Float, _limiter=backend, _priority=10)
+    def cheap(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @soap(Float, _returns=Float, _limiter=small)
+    def limited(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+def _call(server, client, method_name, arg):
+    ctx = MethodContext()
+    ctx.service = server.app.get_service(LimitedService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    request = client.get_request_string(ctx, (arg,), {})
+
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    body = ''.join(server({
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': '',
+        'PATH_INFO': '/',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': 'text/xml; charset=utf-8',
+    }, start_response))
+
+    return status[0], body
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+class TestLimiter(unittest.TestCase):
+    def test_queue(self):
+        limiter = Limiter(max_concurrency=1, max_queue=1)
+        self.assertTrue(limiter.acquire())
+
+        results = []
+        thread = _start(lambda: results.append(limiter.acquire()))
+        while limiter.depth == 0:
+            time.sleep(0.01)
+
+        # the queue is full.
+        self.assertFalse(limiter.acquire())
+        self.assertEquals(limiter.rejected, 1)
+
+        limiter.release()
+        thread.join()
+        self.assertEquals(results, [True])
+        self.assertEquals((limiter.active, limiter.depth), (1, 0))
+
+        limiter.release()
+        self.assertEquals((limiter.active, limiter.admitted), (0, 2))
+
+    def test_priority(self):
+        limiter = Limiter(max_concurrency=1, max_queue=10)
+        limiter.acquire()
+
+        order = []
+        def wait(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+            limiter.release()
+
+        threads = []
+        for priority in (0, 5, 1, 5):
+            threads.append(_start(wait, priority))
+            while limiter.depth < len(threads):
+                time.sleep(0.01)
+
+        limiter.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(order, [5, 5, 1, 0])
+        self.assertEquals(limiter.active, 0)
+
+    def test_timeout(self):
+        limiter = Limiter(max_concurrency=1, max_queue=1, timeout=0.05)
+        limiter.acquire()
+        self.assertFalse(limiter.acquire())
+        self.assertEquals((limiter.timeouts, limiter.depth), (1, 0))
+
+        # the cancelled waiter doesn't get the slot.
+        limiter.release()
+        self.assertEquals(limiter.active, 0)
+
+        # cancelled waiters don't pile up while the limiter stays full.
+        limiter = Limiter(max_concurrency=1, max_queue=1, timeout=0.001)
+        limiter.acquire()
+        for i in range(20):
+            self.assertFalse(limiter.acquire())
+        self.assertEquals(limiter._Limiter__queue, [])
+
+        self.assertRaises(ValueError, Limiter, 0)
+
+class TestAdmission(unittest.TestCase):
+    def setUp(self):
+        app = Application([LimitedService], 'tns')
+        self.server = wsgi.Application(app)
+        self.client = Client(app)
+
+    def test_busy(self):
+        statuses = []
+        def call():
+            statuses.append(_call(self.server, self.client, 'limited', 0.2)[0])
+
+        threads = [_start(call) for i in range(2)]
+        while small.depth == 0:
+            time.sleep(0.01)
+
+        status, body = _call(self.server, self.client, 'limited', 0)
+        self.assertEquals(status, wsgi.HTTP_503)
+        self.assertTrue('Server.Busy' in body)
+
+        for thread in threads:
+            thread.join()
+        self.assertEquals(statuses, [wsgi.HTTP_200] * 2)
+
+    def test_non_blocking(self):
+        """Requests that can't block are rejected instead of queued."""
+
+        app = self.server.app
+        ctx = MethodContext()
+        ctx.service = app.get_service(LimitedService)
+        ctx.descriptor = ctx.service.get_method('limited')
+        ctx.blocking = False
+
+        rejected = small.rejected
+        self.assertTrue(small.acquire())
+        try:
+            self.assertTrue(isinstance(app.process_request(ctx, [0]), Busy))
+        finally:
+            small.release()
+
+        self.assertEquals((small.rejected, small.depth), (rejected + 1, 0))
+
+    def test_priority(self):
+        """A high-priority call waits for at most one low-priority call to
+        finish, however many are queued."""
+
+        threads = [_start(_call, self.server, self.client, 'expensive', 0.1)
+                                                             for i in range(6)]
+        while backend.depth < 5:
+            time.sleep(0.01)
+
+        t0 = time.time()
+        status, body = _call(self.server, self.client, 'cheap', 0)
+        latency = time.time() - t0
+
+        self.assertEquals(status, wsgi.HTTP_200)
+        self.assertTrue(latency < 0.3, latency)
+
+        for thread in threads:
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
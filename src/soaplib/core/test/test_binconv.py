@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import array
+import datetime
+import decimal
+import unittest
+
+from lxml import etree
+
+from soaplib.core.model.binary import Attachment
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.enum import Enum
+from soaplib.core.model.primitive import Any
+from soaplib.core.model.primitive import AnyAsDict
+from soaplib.core.model.primitive import AnyUri
+from soaplib.core.model.primitive import Boolean
+from soaplib.core.model.primitive import Date
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Duration
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import Mandatory
+from soaplib.core.model.primitive import String
+from soaplib.core.util import iso8601
+from soaplib.core.util.binconv import dumps
+from soaplib.core.util.binconv import get_fingerprint
+from soaplib.core.util.binconv import loads
+
+Color = Enum('red', 'green', type_name='Color')
+
+class Address(ClassModel):
+    street = String
+    number = Integer
+
+class Person(ClassModel):
+    name = String
+    born = Date
+    seen = DateTime
+    balance = Decimal
+    height = Double
+    active = Boolean
+    color = Color
+    addresses = Array(Address)
+    nicknames = String(max_occurs='unbounded')
+
+class Node(ClassModel):
+    id = Integer
+
+Node._type_info['next'] = Node
+
+class TestBinConv(unittest.TestCase):
+    def test_primitives(self):
+        values = [
+            (Integer, 0), (Integer, -1), (Integer, 2 ** 70), (Integer, -300),
+            (Decimal, decimal.Decimal('-0.10')),
+            (Double, 1.5), (Float, -2.25),
+            (Boolean, False), (Boolean, True),
+            (String, 'abc'), (String, u'\xe7\xf6\u0131'), (String, ''),
+            (AnyUri, 'http://example.com/'),
+            (Mandatory.String, 'x'),
+            (Date, datetime.date(1, 1, 1)),
+            (DateTime, datetime.datetime(2010, 6, 1, 23, 59, 59, 999999)),
+            (DateTime, datetime.datetime(2010, 6, 1, 12, 0, 0, 0,
+                                              iso8601.get_fixed_offset(-90))),
+            (DateTime, datetime.datetime(2010, 6, 1, 12, 0, 0, 0,
+                                              iso8601.get_fixed_offset(180))),
+            (Duration, datetime.timedelta(days=-1, seconds=5,
+                                                           microseconds=7)),
+            (Color, Color.green),
+            (AnyAsDict, {'a': [1, 2.5, None, True, u'x'], 'b': {'c': 'd'}}),
+        ]
+
+        for cls, value in values:
+            self.assertEquals(loads(cls, dumps(cls, value)), value)
+            self.assertEquals(type(loads(cls, dumps(cls, value))),
+                                                                   type(value))
+            self.assertEquals(loads(cls, dumps(cls, None)), None)
+
+        value = datetime.datetime(2010, 6, 1, 12, 0, 0, 0,
+                                               iso8601.get_fixed_offset(-90))
+        self.assertEquals(loads(DateTime, dumps(DateTime, value)).utcoffset(),
+                                           datetime.timedelta(minutes=-90))
+
+        self.assertEquals(loads(Duration, dumps(Duration, 'P1DT2S')),
+                                       datetime.timedelta(days=1, seconds=2))
+
+    def test_any(self):
+        element = etree.fromstring('<a><b>c</b></a>')
+        decoded = loads(Any, dumps(Any, element))
+        self.assertEquals(etree.tostring(decoded), '<a><b>c</b></a>')
+
+    def test_attachment(self):
+        data = ''.join([chr(i % 256) for i in range(1000)])
+        self.assertEquals(loads(Attachment, dumps(Attachment,
+                                              Attachment(data=data))).data, data)
+
+        decoded = loads(Attachment, dumps(Attachment,
+                                           Attachment(file_name='/tmp/file')))
+        self.assertEquals((decoded.data, decoded.file_name),
+                                                           (None, '/tmp/file'))
+
+    def test_class(self):
+        person = Person(name='alice', born=datetime.date(1980, 1, 2),
+                        balance=decimal.Decimal('12.30'), active=False,
+                        height=0.0,
+                        addresses=[Address(street='main', number=0), None],
+                        nicknames=['al', '', None])
+
+        decoded = loads(Person, dumps(Person, person))
+        self.assertTrue(isinstance(decoded, Person))
+        for k in Person._type_info:
+            if k != 'addresses':
+                self.assertEquals(getattr(decoded, k), getattr(person, k))
+        self.assertEquals(decoded.addresses[0].street, 'main')
+        self.assertEquals(decoded.addresses[0].number, 0)
+        self.assertEquals(decoded.addresses[1], None)
+
+        decoded = loads(Person, dumps(Person, person), 'dict')
+        self.assertEquals(decoded['addresses'][0],
+                                                {'street': 'main', 'number': 0})
+        self.assertEquals(decoded['seen'], None)
+
+        decoded = loads(Person, dumps(Person, person), 'namedtuple')
+        self.assertEquals(decoded.addresses[0].number, 0)
+
+        # dicts and sequences are encoded like instances.
+        self.assertEquals(dumps(Address, {'street': 'x', 'number': 2}),
+                          dumps(Address, Address(street='x', number=2)))
+        self.assertEquals(dumps(Address, ('x', 2)),
+                          dumps(Address, Address(street='x', number=2)))
+
+    def test_recursive(self):
+        node = Node(id=1, next=Node(id=2))
+        decoded = loads(Node, dumps(Node, node))
+        self.assertEquals(decoded.next.id, 2)
+        self.assertEquals(decoded.next.next, None)
+
+    def test_arrays(self):
+        data = dumps(Array(Integer), array.array('l', [1, -2]))
+        self.assertEquals(data, dumps(Array(Integer), [1, -2]))
+        self.assertEquals(loads(Array(Integer, decode_as='array'), data),
+                                                    array.array('l', [1, -2]))
+
+        rows = Rows(('number', 'street'), [(1, 'a'), (2, 'b')])
+        columns = loads(Array(Address, decode_as='columns'),
+                                                dumps(Array(Address), rows))
+        self.assertTrue(isinstance(columns, Columns))
+        self.assertEquals(columns['street'], ['a', 'b'])
+
+        values = [Color.red, None, Color.green]
+        self.assertEquals(loads(Array(Color), dumps(Array(Color), values)),
+                                                                       values)
+
+    def test_fingerprint(self):
+        class Address2(ClassModel):
+            street = String
+            number = Double
+
+        class Address3(ClassModel):
+            number = Integer
+            street = String
+
+        self.assertEquals(get_fingerprint(Address), get_fingerprint(Address))
+        self.assertNotEquals(get_fingerprint(Address),
+                                                    get_fingerprint(Address2))
+        self.assertNotEquals(get_fingerprint(Address),
+                                                    get_fingerprint(Address3))
+
+        data = dumps(Address, Address(street='x'))
+        self.assertRaises(ValueError, loads, Address2, data)
+
+    def test_invalid(self):
+        data = dumps(Person, Person(name='alice', nicknames=['a', 'b']))
+        self.assertRaises(ValueError, loads, Person, data[:-1])
+        self.assertRaises(ValueError, loads, Person, data + '\x00')
+
+if __name__ == '__main__':
+    unittest.main()
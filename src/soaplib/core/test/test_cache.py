@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.cache import ResponseCache
+from soaplib.core.cache import SharedResponseCache
+from soaplib.core.cache import get_fingerprint
+from soaplib.core.client import Base as Client
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Item(ClassModel):
+    name = String
+    tags = Array(String)
+
+class Node(ClassModel):
+    id = Integer
+
+Node._type_info['next'] = Node
+
+class TaggedItem(Item):
+    color = String
+
+class TestFingerprint(unittest.TestCase):
+    def test_equal_values(self):
+        a = [1, u'x', Item(name='a', tags=['b', 'c']), {'k': [1.5]},
+                                                   datetime.date(2010, 1, 1)]
+        b = [1, u'x', Item(name='a', tags=('b', 'c')), {'k': (1.5,)},
+                                                   datetime.date(2010, 1, 1)]
+
+        self.assertEquals(get_fingerprint(a), get_fingerprint(b))
+        hash(get_fingerprint(a))
+
+        self.assertNotEquals(get_fingerprint(Item(name='a')),
+                             get_fingerprint(Item(name='b')))
+
+    def test_inherited_members(self):
+        self.assertNotEquals(get_fingerprint(TaggedItem(name='a', color='c')),
+                             get_fingerprint(TaggedItem(name='b', color='c')))
+
+    def test_unsupported(self):
+        node = Node(id=1)
+        node.next = node
+        self.assertRaises(TypeError, get_fingerprint, node)
+        self.assertRaises(TypeError, get_fingerprint, [object()])
+
+        cache = ResponseCache()
+        self.assertEquals(cache.get_key('f', [node]), None)
+
+class TestResponseCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = ResponseCache()
+        key = cache.get_key('f', [1, 'a'])
+
+        self.assertEquals(cache.get(key), None)
+        cache.set(key, 'response')
+        self.assertEquals(cache.get(cache.get_key('f', (1, 'a'))), 'response')
+
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+        self.assertEquals((len(cache), cache.size), (1, 8))
+
+    def test_lru(self):
+        cache = ResponseCache(max_bytes=30)
+        for i in range(3):
+            cache.set(i, str(i) * 10)
+
+        cache.get(0)
+        cache.set(3, '3' * 10)
+
+        # 1 was the least recently used one.
+        self.assertEquals(cache.get(1), None)
+        self.assertEquals(cache.get(0), '0' * 10)
+        self.assertEquals(cache.evictions, 1)
+        self.assertEquals(cache.size, 30)
+
+        # replacing an entry doesn't evict anything else.
+        cache.set(3, '3' * 5)
+        self.assertEquals((len(cache), cache.size, cache.evictions), (3, 25, 1))
+
+        cache.set(4, 'x' * 31)
+        self.assertEquals(cache.get(4), None)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.05)
+        cache.set('a', 'response')
+        self.assertEquals(cache.get('a'), 'response')
+
+        time.sleep(0.1)
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.expirations, 1)
+        self.assertEquals((len(cache), cache.size), (0, 0))
+
+        self.assertRaises(ValueError, ResponseCache, ttl=0)
+        self.assertRaises(ValueError, ResponseCache, max_bytes=0)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        for method_name in ('f', 'g'):
+            for arg in (1, 2):
+                for header in (None, 'h'):
+                    cache.set(cache.get_key(method_name, [arg], header), 'x')
+
+        cache.invalidate('f', [1], 'h')
+        self.assertEquals(len(cache), 7)
+
+        cache.invalidate('f', [1])
+        self.assertEquals(len(cache), 6)
+
+        cache.invalidate('f')
+        self.assertEquals(len(cache), 4)
+        self.assertEquals(cache.get(cache.get_key('g', [1])), 'x')
+
+        cache.invalidate()
+        self.assertEquals((len(cache), cache.size), (0, 0))
+
+class TestSharedResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_set(self):
+        cache = SharedResponseCache(self.path, n_slots=16, slot_size=256)
+        key = cache.get_key('f', [1, 'a'])
+        self.assertEquals(key, cache.get_key('f', (1, u'a')))
+        self.assertNotEquals(key, cache.get_key('f', [1, 'b']))
+
+        self.assertEquals(cache.get(key), None)
+        cache.set(key, 'response')
+        self.assertEquals(cache.get(key), 'response')
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+        # responses that don't fit in a slot are not cached.
+        big_key = cache.get_key('f', [2])
+        self.assertFalse(cache.set(big_key, 'x' * 256))
+        self.assertEquals(cache.get(big_key), None)
+
+        # the members of the base classes of the arguments are part of it.
+        self.assertNotEquals(cache.get_key('f', [TaggedItem(name='a')]),
+                             cache.get_key('f', [TaggedItem(name='b')]))
+
+        # keys are compared in full, not only by the digests of their parts.
+        self.assertEquals(len(key), 36)
+        other_key = key[:-1] + chr(ord(key[-1]) ^ 1)
+        self.assertEquals(cache.get(other_key), None)
+        self.assertTrue(cache.set(other_key, 'other'))
+        self.assertEquals(cache.get(key), 'response')
+        self.assertEquals(cache.get(other_key), 'other')
+
+        # another instance on the same file sees the same responses.
+        other = SharedResponseCache(self.path, n_slots=16, slot_size=256)
+        self.assertEquals(other.get(key), 'response')
+        other.close()
+
+        self.assertRaises(ValueError, SharedResponseCache, self.path,
+                                                   n_slots=32, slot_size=256)
+        cache.close()
+
+    def test_processes(self):
+        cache = SharedResponseCache(self.path, n_slots=16, slot_size=256)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                child = SharedResponseCache(self.path, n_slots=16,
+                                                                slot_size=256)
+                child.set(child.get_key('f', [1]), 'from the child')
+            finally:
+                os._exit(0)
+
+        os.waitpid(pid, 0)
+        self.assertEquals(cache.get(cache.get_key('f', [1])), 'from the child')
+        cache.close()
+
+    def test_clock(self):
+        cache = SharedResponseCache(self.path, n_slots=2, slot_size=64,
+                                                                       ways=2)
+        a, b, c = [cache.get_key('f', [i]) for i in range(3)]
+        cache.set(a, 'a')
+        cache.set(b, 'b')
+        cache.get(a)
+        cache.set(c, 'c')
+
+        # b wasn't used since it was added.
+        self.assertEquals([cache.get(k) for k in (a, b, c)], ['a', None, 'c'])
+        self.assertEquals(cache.evictions, 1)
+        cache.close()
+
+    def test_ttl(self):
+        cache = SharedResponseCache(self.path, ttl=0.05, n_slots=4,
+                                                                slot_size=64)
+        key = cache.get_key('f', [1])
+        cache.set(key, 'a')
+        time.sleep(0.1)
+        self.assertEquals(cache.get(key), None)
+        self.assertEquals(cache.expirations, 1)
+        cache.close()
+
+    def test_invalidate(self):
+        cache = SharedResponseCache(self.path, n_slots=64, slot_size=64)
+        keys = []
+        for method_name in ('f', 'g'):
+            for arg in (1, 2):
+                for header in (None, 'h'):
+                    key = cache.get_key(method_name, [arg], header)
+                    cache.set(key, 'x')
+                    keys.append(key)
+
+        def count():
+            return len([k for k in keys if cache.get(k) is not None])
+
+        cache.invalidate('f', [1], 'h')
+        self.assertEquals(count(), 7)
+        cache.invalidate('f', [1])
+        self.assertEquals(count(), 6)
+        cache.invalidate('f')
+        self.assertEquals(count(), 4)
+        cache.invalidate(args=[2])
+        self.assertEquals(count(), 2)
+        cache.invalidate()
+        self.assertEquals(count(), 0)
+        cache.close()
+
+class EchoService(DefinitionBase):
+    @soap(String, _returns=String)
+    def echo(self, s):
+        return s
+
+class TaggedItemService(DefinitionBase):
+    @soap(TaggedItem, _returns=String, _cache=ResponseCache())
+    def get_name(self, item):
+        return item.name
+
+class TestCachedMethod(unittest.TestCase):
+    def test_inherited_members(self):
+        app = Application([TaggedItemService], 'tns')
+        server = wsgi.Application(app)
+        client = Client(app)
+
+        def call(item):
+            ctx = MethodContext()
+            ctx.service_class = TaggedItemService
+            ctx.service = app.get_service(TaggedItemService)
+            ctx.descriptor = ctx.service.get_method('get_name')
+            request = client.get_request_string(ctx, (item,), {})
+
+            response = ''.join(server({
+                'REQUEST_METHOD': 'POST',
+                'QUERY_STRING': '',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': cStringIO.StringIO(request),
+                'CONTENT_LENGTH': str(len(request)),
+                'CONTENT_TYPE': 'text/xml; charset=utf-8',
+            }, lambda status, headers: None))
+
+            return client.get_response_object(ctx, response)
+
+        # the items only differ in a member of the class they extend.
+        self.assertEquals(call(TaggedItem(name='a', color='red')), 'a')
+        self.assertEquals(call(TaggedItem(name='b', color='red')), 'b')
+        self.assertEquals(call(TaggedItem(name='a', color='red')), 'a')
+
+class TestWsdlCache(unittest.TestCase):
+    def test_wsdl_cache(self):
+        cache = ResponseCache()
+        server = wsgi.Application(Application([EchoService], 'tns'),
+                                                          wsdl_cache=cache)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'QUERY_STRING': 'wsdl',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+        }
+
+        def start_response(status, headers):
+            pass
+
+        wsdl = ''.join(server(dict(environ), start_response))
+        self.assertEquals(''.join(server(dict(environ), start_response)), wsdl)
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import gzip
+import socket
+import threading
+import time
+import unittest
+
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import ServerHandler
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+
+from soaplib.core import Application
+from soaplib.core.client.http import Client
+from soaplib.core.client.http import ConnectionPool
+from soaplib.core.client.http import PoolTimeout
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Person(ClassModel):
+    name = String
+    age = Integer
+
+class ClientTestService(DefinitionBase):
+    @soap(String, Integer, _returns=Array(String))
+    def repeat(self, s, n):
+        return [s] * n
+
+    @soap(String, _returns=Person)
+    def get_person(self, name):
+        return Person(name=name, age=len(name))
+
+    @soap(Integer, Integer, _returns=(Integer, Integer))
+    def div_mod(self, a, b):
+        return divmod(a, b)
+
+    @soap(String)
+    def fail(self, s):
+        raise Fault('Client.Invalid', s)
+
+    @soap(Float, _returns=Float)
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+class _ServerHandler(ServerHandler):
+    http_version = '1.1'
+
+    def log_exception(self, exc_info):
+        # the client closes the connections of the calls that time out.
+        pass
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """Serves the requests on a connection until the client closes it, which
+    the wsgiref request handler doesn't do."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        WSGIRequestHandler.setup(self)
+
+        # wsgiref writes the headers and the body separately.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        self.server.n_connections += 1
+
+        self.close_connection = 0
+        while not self.close_connection:
+            self.raw_requestline = self.rfile.readline()
+            if not self.raw_requestline or not self.parse_request():
+                return
+
+            handler = _ServerHandler(self.rfile, self.wfile,
+                                         self.get_stderr(), self.get_environ())
+            handler.request_handler = self
+            handler.run(self.server.get_app())
+
+    def log_message(self, *args):
+        pass
+
+class _Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    n_connections = 0
+
+    def handle_error(self, request, client_address):
+        # the client closes the connections of the calls that time out.
+        pass
+
+def _gzip_middleware(app):
+    def gzipped_app(environ, start_response):
+        headers = []
+        def gzip_start_response(status, response_headers):
+            headers.append(status)
+            headers.append(response_headers)
+
+        body = ''.join(app(environ, gzip_start_response))
+
+        response_headers = [(k, v) for k, v in headers[1]
+                                            if k.lower() != 'content-length']
+        if 'gzip' in environ.get('HTTP_ACCEPT_ENCODING', ''):
+            f = cStringIO.StringIO()
+            g = gzip.GzipFile(fileobj=f, mode='wb')
+            g.write(body)
+            g.close()
+            body = f.getvalue()
+            response_headers.append(('Content-Encoding', 'gzip'))
+
+        response_headers.append(('Content-Length', str(len(body))))
+        start_response(headers[0], response_headers)
+
+        return [body]
+
+    return gzipped_app
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        self.app = Application([ClientTestService], 'tns')
+        server_app = _gzip_middleware(wsgi.Application(self.app))
+
+        self.server = _Server(('127.0.0.1', 0), _KeepAliveRequestHandler)
+        self.server.set_app(server_app)
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                         kwargs={'poll_interval': 0.05})
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+        self.pool = ConnectionPool(max_connections=2, timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_call(self):
+        client = Client(self.url, self.app, self.pool)
+
+        self.assertEquals(client.service.repeat('a', 3), ['a', 'a', 'a'])
+        self.assertEquals(client.service.repeat(s='b', n=2), ['b', 'b'])
+        self.assertEquals(client.service.div_mod(7, 2), (3, 1))
+
+        person = client.service.get_person('bob')
+        self.assertEquals((person.name, person.age), ('bob', 3))
+
+        # all calls were made on the same connection.
+        self.assertEquals(self.server.n_connections, 1)
+
+        self.assertRaises(TypeError, client.service.repeat, 'a', 1, 2)
+        self.assertRaises(TypeError, client.service.repeat, x=1)
+
+    def test_fault(self):
+        client = Client(self.url, self.app, self.pool)
+
+        try:
+            client.service.fail('oops')
+        except Fault, e:
+            self.assertEquals(e.faultcode, 'senv:Client.Invalid')
+            self.assertEquals(e.faultstring, 'oops')
+        else:
+            self.fail('no fault raised')
+
+        # the connection is still usable after a fault.
+        self.assertEquals(client.service.repeat('a', 1), ['a'])
+        self.assertEquals(self.server.n_connections, 1)
+
+    def test_gzip(self):
+        client = Client(self.url, self.app, self.pool, gzip=True)
+        self.assertEquals(client.service.repeat('x', 1000), ['x'] * 1000)
+
+    def test_stale_connection(self):
+        client = Client(self.url, self.app, self.pool)
+        client.service.repeat('a', 1)
+
+        # simulate a connection the server closed while it was idle.
+        connection, reused = self.pool.acquire('http', self.server_host())
+        self.assertTrue(reused)
+        connection.sock.close()
+        self.pool.release('http', self.server_host(), connection)
+
+        self.assertEquals(client.service.repeat('a', 1), ['a'])
+        self.assertEquals(self.server.n_connections, 2)
+
+    def test_threads(self):
+        client = Client(self.url, self.app, self.pool)
+        results = []
+
+        def call():
+            for i in range(10):
+                results.append(client.service.repeat('a', i))
+
+        threads = [threading.Thread(target=call) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEquals(len(results), 40)
+        self.assertTrue(self.server.n_connections <= 2)
+
+    def test_gather(self):
+        client = Client(self.url, self.app, self.pool)
+
+        calls = [(client.service.repeat, ('a', i)) for i in range(50)]
+        calls.append((client.service.div_mod, (), {'a': 7, 'b': 2}))
+
+        results = client.gather(calls, max_concurrency=4)
+        self.assertEquals(results[:50], [['a'] * i for i in range(50)])
+        self.assertEquals(results[50], (3, 1))
+        self.assertTrue(self.server.n_connections <= 2)
+
+        self.assertEquals(client.gather([]), [])
+
+    def test_gather_errors(self):
+        client = Client(self.url, self.app, self.pool)
+        calls = [(client.service.repeat, ('a', 1)),
+                 (client.service.fail, ('oops',)),
+                 (client.service.sleep, (1.0,))]
+
+        results = client.gather(calls, timeout=0.2, return_exceptions=True)
+        self.assertEquals(results[0], ['a'])
+        self.assertTrue(isinstance(results[1], Fault))
+        self.assertEquals(results[1].faultstring, 'oops')
+        self.assertTrue(isinstance(results[2], socket.timeout))
+
+        self.assertRaises(Fault, client.gather, calls[:2])
+
+        # the timeout only applies to the calls made by gather.
+        self.assertEquals(client.service.sleep(0.3), 0.3)
+
+    def test_pool_limit(self):
+        host = self.server_host()
+        pool = ConnectionPool(max_connections=1, timeout=0.1)
+        connection, reused = pool.acquire('http', host)
+        self.assertFalse(reused)
+
+        self.assertRaises(PoolTimeout, pool.acquire, 'http', host)
+
+        pool.release('http', host, connection)
+        self.assertTrue(pool.acquire('http', host)[0] is connection)
+        connection.close()
+
+        self.assertRaises(ValueError, ConnectionPool, max_connections=0)
+
+    def server_host(self):
+        return '127.0.0.1:%d' % self.server.server_address[1]
+
+if __name__ == '__main__':
+    unittest.main()
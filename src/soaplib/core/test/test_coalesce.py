@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import threading
+import time
+import unittest
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.coalesce import Coalescer
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import String
+from soaplib.core.server import json_wsgi
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class Key(ClassModel):
+    name = String
+
+class TaggedKey(Key):
+    tag = String
+
+class BackendService(DefinitionBase):
+    n_calls = 0
+
+    @soap(Float, String, _returns=String, _coalesce=Coalescer())
+    def lookup(self, delay, key):
+        BackendService.n_calls += 1
+        time.sleep(delay)
+        if key == 'missing':
+            raise Fault('Client.NotFound', key)
+
+        return key.upper()
+
+    @soap(Float, String, _returns=String,
+                            _coalesce=Coalescer(timeout=0.05))
+    def lookup_timeout(self, delay, key):
+        BackendService.n_calls += 1
+        time.sleep(delay)
+        return key.upper()
+
+    @soap(Float, String, _returns=String,
+                            _coalesce=Coalescer(share_response=True))
+    def lookup_shared(self, delay, key):
+        BackendService.n_calls += 1
+        time.sleep(delay)
+        return key.upper()
+
+    @soap(Float, TaggedKey, _returns=String, _coalesce=Coalescer())
+    def lookup_key(self, delay, key):
+        BackendService.n_calls += 1
+        time.sleep(delay)
+        return key.name.upper()
+
+def _burst(method_name, args_list):
+    """Sends the requests with the given arguments concurrently and returns the
+    responses."""
+
+    app = Application([BackendService], 'tns')
+    server = wsgi.Application(app)
+    client = Client(app)
+
+    requests = []
+    for args in args_list:
+        ctx = MethodContext()
+        ctx.service = app.get_service(BackendService)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        requests.append(client.get_request_string(ctx, args, {}))
+
+    responses = [None] * len(requests)
+    def call(i):
+        status = []
+        def start_response(code, headers):
+            status.append(code)
+
+        body = ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(requests[i]),
+            'CONTENT_LENGTH': str(len(requests[i])),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+        responses[i] = (status[0], body)
+
+    threads = [threading.Thread(target=call, args=(i,))
+                                                  for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return responses
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        BackendService.n_calls = 0
+
+    def test_burst(self):
+        responses = _burst('lookup', [(0.2, 'a')] * 10 + [(0.2, 'b')] * 5)
+
+        self.assertEquals(BackendService.n_calls, 2)
+        self.assertEquals(len(set(responses[:10])), 1)
+        self.assertEquals(len(set(responses[10:])), 1)
+        self.assertEquals(responses[0][0], wsgi.HTTP_200)
+        self.assertTrue('>A<' in responses[0][1])
+        self.assertTrue('>B<' in responses[10][1])
+
+        # the next request is executed again.
+        _burst('lookup', [(0, 'a')])
+        self.assertEquals(BackendService.n_calls, 3)
+
+    def test_inherited_members(self):
+        # the keys only differ in a member of the class they extend.
+        responses = _burst('lookup_key', [(0.2, TaggedKey(name='a', tag='t')),
+                                          (0.2, TaggedKey(name='b', tag='t'))])
+
+        self.assertEquals(BackendService.n_calls, 2)
+        self.assertTrue('>A<' in responses[0][1])
+        self.assertTrue('>B<' in responses[1][1])
+
+    def test_fault(self):
+        responses = _burst('lookup', [(0.2, 'missing')] * 5)
+
+        self.assertEquals(BackendService.n_calls, 1)
+        for status, body in responses:
+            self.assertEquals(status, wsgi.HTTP_500)
+            self.assertTrue('NotFound' in body)
+
+    def test_timeout(self):
+        responses = _burst('lookup_timeout', [(0.3, 'a')] * 5)
+
+        self.assertEquals(BackendService.n_calls, 1)
+        statuses = sorted([status for status, body in responses])
+        self.assertEquals(statuses, [wsgi.HTTP_200] + [wsgi.HTTP_500] * 4)
+
+        self.assertRaises(ValueError, Coalescer, timeout=0)
+
+    def test_share_response(self):
+        descriptor = BackendService().get_method('lookup_shared')
+        coalescer = descriptor.coalesce
+
+        responses = _burst('lookup_shared', [(0.2, 'a')] * 5)
+        self.assertEquals(BackendService.n_calls, 1)
+        self.assertEquals(len(set(responses)), 1)
+        self.assertEquals((coalescer.executions, coalescer.coalesced), (1, 4))
+
+    def test_share_response_json(self):
+        """A soap request doesn't wait for the serialized response of a json
+        request it's coalesced with."""
+
+        server = json_wsgi.Application(Application([BackendService], 'tns'))
+        request = '{"delay": 0.2, "key": "a"}'
+        leader = threading.Thread(target=lambda: ''.join(server({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/lookup_shared',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'application/json',
+        }, lambda status, headers: None)))
+        leader.start()
+        while BackendService.n_calls == 0:
+            time.sleep(0.01)
+
+        responses = []
+        waiter = threading.Thread(target=lambda: responses.extend(
+                                     _burst('lookup_shared', [(0.2, 'a')])))
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(5)
+        leader.join()
+
+        self.assertFalse(waiter.isAlive())
+        self.assertEquals(BackendService.n_calls, 1)
+        self.assertEquals(responses[0][0], wsgi.HTTP_200)
+        self.assertTrue('>A<' in responses[0][1])
+
+if __name__ == '__main__':
+    unittest.main()
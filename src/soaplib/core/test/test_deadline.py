@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import threading
+import time
+import unittest
+
+from lxml import etree
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core import namespaces
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.deadline import Deadline
+from soaplib.core.deadline import DeadlineExceeded
+from soaplib.core.deadline import earliest
+from soaplib.core.deadline import ns_deadline
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class RequestHeader(ClassModel):
+    __namespace__ = 'tns'
+    user = String
+
+backend = Limiter(max_concurrency=1, max_queue=10)
+calls = []
+
+class DeadlineService(DefinitionBase):
+    @soap(Float, _returns=Float, _timeout=0.1)
+    def slow(self, seconds):
+        calls.append(self.deadline)
+        time.sleep(seconds)
+        return seconds
+
+    @soap(_returns=Float)
+    def remaining(self):
+        calls.append(self.deadline)
+        if self.deadline is None:
+            return -1
+        return self.deadline.remaining()
+
+    @soap(_returns=String, _in_header=RequestHeader)
+    def whoami(self):
+        return self.in_header.user
+
+    @soap(Float, _returns=Float)
+    def loop(self, seconds):
+        t0 = time.time()
+        while time.time() - t0 < seconds:
+            self.deadline.check()
+            time.sleep(0.01)
+        return seconds
+
+    @soap(Float, _returns=Float, _limiter=backend)
+    def limited(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+def _call(server, client, method_name, args, timeout=None, filter=None):
+    ctx = MethodContext()
+    ctx.service = server.app.get_service(DeadlineService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    request = client.get_request_string(ctx, args, {}, timeout)
+    if filter is not None:
+        request = filter(request)
+
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    body = ''.join(server({
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': '',
+        'PATH_INFO': '/',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': 'text/xml; charset=utf-8',
+    }, start_response))
+
+    return status[0], body
+
+class TestDeadline(unittest.TestCase):
+    def test_deadline(self):
+        deadline = Deadline(10)
+        self.assertFalse(deadline.expired())
+        self.assertTrue(9 < deadline.remaining() <= 10)
+        deadline.check()
+
+        passed = Deadline(-1)
+        self.assertTrue(passed.expired())
+        self.assertEquals(passed.remaining(), 0)
+        self.assertRaises(DeadlineExceeded, passed.check)
+
+        self.assertTrue(earliest(deadline, passed) is passed)
+        self.assertTrue(earliest(None, deadline) is deadline)
+        self.assertTrue(earliest(deadline, None) is deadline)
+
+    def test_from_header(self):
+        element = etree.Element('{%s}Timeout' % ns_deadline)
+        element.text = '2.5'
+        self.assertTrue(2 < Deadline.from_header(element).remaining() <= 2.5)
+
+        element.text = 'soon'
+        self.assertRaises(Fault, Deadline.from_header, element)
+
+class TestRequestDeadline(unittest.TestCase):
+    def setUp(self):
+        app = Application([DeadlineService], 'tns')
+        self.server = wsgi.Application(app)
+        self.client = Client(app)
+        del calls[:]
+
+    def test_no_deadline(self):
+        status, body = _call(self.server, self.client, 'remaining', ())
+        self.assertEquals(status, wsgi.HTTP_200)
+        self.assertEquals(calls, [None])
+
+    def test_operation_timeout(self):
+        status, body = _call(self.server, self.client, 'slow', (0,))
+        self.assertEquals(status, wsgi.HTTP_200)
+
+        # the method finishes, but its return value isn't serialized.
+        status, body = _call(self.server, self.client, 'slow', (0.2,))
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Server.DeadlineExceeded' in body)
+        self.assertEquals(len(calls), 2)
+
+    def test_client_deadline(self):
+        status, body = _call(self.server, self.client, 'remaining', (), 5)
+        self.assertEquals(status, wsgi.HTTP_200)
+        self.assertTrue(4 < calls[0].remaining() <= 5)
+
+        # the earlier of the two deadlines is used.
+        status, body = _call(self.server, self.client, 'slow', (0,), 5)
+        self.assertTrue(calls[1].remaining() <= 0.1)
+
+    def test_passed_deadline(self):
+        status, body = _call(self.server, self.client, 'remaining', (), 0)
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Server.DeadlineExceeded' in body)
+
+        # the method isn't called.
+        self.assertEquals(calls, [])
+
+    def test_check(self):
+        status, body = _call(self.server, self.client, 'loop', (10,), 0.05)
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Server.DeadlineExceeded' in body)
+
+    def test_invalid_header(self):
+        status, body = _call(self.server, self.client, 'remaining', (), 5,
+                                 filter=lambda s: s.replace('>5<', '>soon<'))
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Client.SoapError' in body)
+
+    def test_in_header(self):
+        """The Timeout header is not mistaken for the header of the method."""
+
+        def add_header(timeout_first):
+            def filter(request):
+                envelope = etree.fromstring(request)
+                header = envelope.find('{%s}Header' % namespaces.ns_soap_env)
+                user = etree.fromstring('<s0:RequestHeader xmlns:s0="tns">'
+                                            '<s0:user>alice</s0:user>'
+                                        '</s0:RequestHeader>')
+                header.insert(timeout_first and len(header) or 0, user)
+                return etree.tostring(envelope)
+            return filter
+
+        for timeout_first in (True, False):
+            status, body = _call(self.server, self.client, 'whoami', (), 5,
+                                              filter=add_header(timeout_first))
+            self.assertEquals(status, wsgi.HTTP_200)
+            self.assertTrue('alice' in body)
+
+    def test_admission_wait(self):
+        """Requests don't wait for admission past their deadline."""
+
+        thread = threading.Thread(target=_call,
+                   args=(self.server, self.client, 'limited', (0.3,)))
+        thread.start()
+        while backend.active == 0:
+            time.sleep(0.01)
+
+        t0 = time.time()
+        status, body = _call(self.server, self.client, 'limited', (0,), 0.05)
+        latency = time.time() - t0
+        thread.join()
+
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Server.DeadlineExceeded' in body)
+        self.assertTrue(latency < 0.25, latency)
+
+if __name__ == '__main__':
+    unittest.main()
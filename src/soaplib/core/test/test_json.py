@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import array
+import cStringIO
+import datetime
+import decimal
+import json
+import unittest
+
+from soaplib.core import Application
+from soaplib.core.cache import ResponseCache
+from soaplib.core.model.binary import Attachment
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.enum import Enum
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Boolean
+from soaplib.core.model.primitive import Date
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Duration
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import json_wsgi
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+from soaplib.core.util.jsonconv import get_decoder
+from soaplib.core.util.jsonconv import get_encoder
+
+Color = Enum('red', 'green', type_name='Color')
+
+class Address(ClassModel):
+    street = String
+    number = Integer
+
+class Person(ClassModel):
+    name = String
+    born = Date
+    seen = DateTime
+    balance = Decimal
+    height = Double
+    active = Boolean
+    color = Color
+    addresses = Array(Address)
+    nicknames = String(max_occurs='unbounded')
+
+class Node(ClassModel):
+    id = Integer
+
+Node._type_info['next'] = Node
+
+def _roundtrip(cls, value, decode_as=None):
+    # through a string, as the types json has change on the way.
+    string = json.dumps(get_encoder(cls)(value))
+    return get_decoder(cls, decode_as)(json.loads(string))
+
+class TestJsonConv(unittest.TestCase):
+    def test_primitives(self):
+        values = [
+            (Integer, 2 ** 40),
+            (Decimal, decimal.Decimal('0.1')),
+            (Double, 1.5),
+            (Boolean, False),
+            (String, 'abc'),
+            (Date, datetime.date(2010, 6, 1)),
+            (DateTime, datetime.datetime(2010, 6, 1, 12, 30, 5)),
+            (Duration, datetime.timedelta(days=1, seconds=5)),
+            (Color, Color.green),
+            (String(max_len=5), 'abc'),
+            (Integer(min_occurs=1), 3),
+        ]
+
+        for cls, value in values:
+            self.assertEquals(_roundtrip(cls, value), value)
+            self.assertEquals(_roundtrip(cls, None), None)
+
+        self.assertEquals(get_encoder(Decimal)(decimal.Decimal('0.1')), '0.1')
+        self.assertEquals(get_encoder(DateTime)(
+                           datetime.datetime(2010, 6, 1, 12, 30, 5)),
+                           '2010-06-01T12:30:05')
+
+    def test_attachment(self):
+        data = ''.join([chr(i % 256) for i in range(1000)])
+        self.assertEquals(_roundtrip(Attachment, Attachment(data=data)).data,
+                                                                          data)
+
+    def test_class(self):
+        person = Person(name='alice', born=datetime.date(1980, 1, 2),
+                        balance=decimal.Decimal('12.30'), active=True,
+                        addresses=[Address(street='main', number=1), None],
+                        nicknames=['al', 'ally'])
+
+        obj = get_encoder(Person)(person)
+        self.assertEquals(obj['addresses'], [{'street': 'main', 'number': 1},
+                                                                         None])
+        self.assertFalse('seen' in obj)
+
+        decoded = _roundtrip(Person, person)
+        self.assertTrue(isinstance(decoded, Person))
+        for k in Person._type_info:
+            if k != 'addresses':
+                self.assertEquals(getattr(decoded, k), getattr(person, k))
+        self.assertEquals(decoded.addresses[0].street, 'main')
+        self.assertEquals(decoded.addresses[1], None)
+
+        decoded = _roundtrip(Person, person, 'dict')
+        self.assertEquals(decoded['addresses'][0],
+                                               {'street': 'main', 'number': 1})
+
+        decoded = _roundtrip(Person, person, 'namedtuple')
+        self.assertEquals(decoded.addresses[0].number, 1)
+
+        # dicts and sequences are encoded like instances.
+        self.assertEquals(get_encoder(Address)({'street': 'x'}),
+                                                              {'street': 'x'})
+        self.assertEquals(get_encoder(Address)(('x', 2)),
+                                                {'street': 'x', 'number': 2})
+
+    def test_recursive(self):
+        node = Node(id=1, next=Node(id=2))
+        decoded = _roundtrip(Node, node)
+        self.assertEquals(decoded.next.id, 2)
+        self.assertEquals(decoded.next.next, None)
+
+    def test_arrays(self):
+        self.assertEquals(get_encoder(Array(Integer))(array.array('l',
+                                                           [1, 2])), [1, 2])
+
+        decoded = _roundtrip(Array(Integer, decode_as='array'), [1, 2])
+        self.assertEquals(decoded, array.array('l', [1, 2]))
+
+        rows = Rows(('number', 'street'), [(1, 'a'), (2, 'b')])
+        self.assertEquals(get_encoder(Array(Address))(rows),
+                [{'number': 1, 'street': 'a'}, {'number': 2, 'street': 'b'}])
+
+        columns = _roundtrip(Array(Address, decode_as='columns'), rows)
+        self.assertTrue(isinstance(columns, Columns))
+        self.assertEquals(columns['street'], ['a', 'b'])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, get_decoder(Integer), '1')
+        self.assertRaises(ValueError, get_decoder(Address), [])
+        self.assertRaises(ValueError, get_decoder(Array(Integer)), {})
+        self.assertRaises(ValueError, get_decoder, Address, 'object')
+
+class JsonTestService(DefinitionBase):
+    @soap(Person, _returns=Person)
+    def echo_person(self, person):
+        return person
+
+    @soap(Integer, Integer, _returns=(Integer, Integer))
+    def divmod(self, a, b):
+        return divmod(a, b)
+
+    @soap()
+    def nothing(self):
+        pass
+
+    @soap(_returns=String)
+    def fail(self):
+        raise Fault('Client.Failed', 'failed')
+
+    @soap(Integer, _returns=Integer, _cache=ResponseCache())
+    def cached(self, i):
+        JsonTestService.calls += 1
+        return i * 2
+
+    calls = 0
+
+def _post(server, path, body, method='POST'):
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    response = ''.join(server({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(body),
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': 'application/json',
+    }, start_response))
+
+    return status[0].split()[0], json.loads(response or 'null')
+
+class TestJsonWsgi(unittest.TestCase):
+    def setUp(self):
+        self.app = Application([JsonTestService], 'tns')
+        self.soap_server = wsgi.Application(self.app)
+        self.server = json_wsgi.Application(self.app)
+
+    def test_call(self):
+        status, obj = _post(self.server, '/json/echo_person',
+                  '{"person": {"name": "bob", "balance": "1.10", '
+                  '"addresses": [{"number": 3}]}}')
+
+        self.assertEquals(status, '200')
+        self.assertEquals(obj, {'echo_personResult': {'name': 'bob',
+                            'balance': '1.10', 'addresses': [{'number': 3}]}})
+
+    def test_multiple_results(self):
+        status, obj = _post(self.server, '/divmod', '{"a": 7, "b": 2}')
+        self.assertEquals(status, '200')
+        self.assertEquals(sorted(obj.values()), [1, 3])
+
+        status, obj = _post(self.server, '/nothing', '')
+        self.assertEquals((status, obj), ('200', {}))
+
+    def test_faults(self):
+        status, obj = _post(self.server, '/fail', '{}')
+        self.assertEquals(status, '500')
+        self.assertEquals(obj['faultcode'], 'Client.Failed')
+        self.assertEquals(obj['faultstring'], 'failed')
+
+        status, obj = _post(self.server, '/divmod', '{"a": 7, "b": 0}')
+        self.assertEquals(status, '500')
+        self.assertEquals(obj['faultcode'], 'Server')
+
+        status, obj = _post(self.server, '/divmod', '{"a": "7"}')
+        self.assertEquals(status, '500')
+        self.assertEquals(obj['faultcode'], 'Client.JsonError')
+
+        status, obj = _post(self.server, '/divmod', '{"a": ')
+        self.assertEquals(obj['faultcode'], 'Client.JsonError')
+
+        status, obj = _post(self.server, '/missing', '{}')
+        self.assertEquals(status, '404')
+
+        status, obj = _post(self.server, '/divmod', '', 'GET')
+        self.assertEquals(status, '405')
+
+    def test_transport(self):
+        self.assertEquals(self.app.transport, self.soap_server.transport)
+
+    def test_cached(self):
+        JsonTestService.calls = 0
+
+        # the soap response is cached, and served as json.
+        request = ('<senv:Envelope xmlns:senv="http://schemas.xmlsoap.org/'
+                   'soap/envelope/" xmlns:tns="tns"><senv:Body><tns:cached>'
+                   '<tns:i>4</tns:i></tns:cached></senv:Body></senv:Envelope>')
+        self.soap_server({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml',
+        }, lambda status, headers: None)
+
+        status, obj = _post(self.server, '/cached', '{"i": 4}')
+        self.assertEquals((status, obj), ('200', {'cachedResult': 8}))
+        self.assertEquals(JsonTestService.calls, 1)
+
+        # and the json responses are cached too.
+        for i in range(2):
+            status, obj = _post(self.server, '/cached', '{"i": 5}')
+            self.assertEquals((status, obj), ('200', {'cachedResult': 10}))
+        self.assertEquals(JsonTestService.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import unittest
+
+from lxml import etree
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as Client
+from soaplib.core.lazy import decode
+from soaplib.core.lazy import get_lazy_instance
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModel
+from soaplib.core.model.clazz import XMLAttribute
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+ns_test = 'test_namespace'
+
+class Address(ClassModel):
+    __namespace__ = ns_test
+
+    street = String
+    zip = Integer
+
+class Person(ClassModel):
+    __namespace__ = ns_test
+
+    name = String
+    age = Integer
+    address = Address
+    aliases = Array(String)
+    friends = Array(Address)
+    code = XMLAttribute('xs:string')
+
+class Employee(Person):
+    __namespace__ = ns_test
+
+    salary = Integer
+
+class RequestHeader(ClassModel):
+    __namespace__ = ns_test
+
+    token = String
+
+_seen = {}
+
+class LazyService(DefinitionBase):
+    @soap(Array(Person), _returns=String, _lazy=True,
+                          _in_header=RequestHeader, _out_header=RequestHeader)
+    def second_name(self, people):
+        _seen['people'] = people
+        _seen['header'] = self.in_header
+        return people[1].name
+
+    @soap(Person, _returns=Person, _lazy=True)
+    def echo(self, person):
+        return person
+
+    @soap(Person, _returns=Integer, _lazy=True)
+    def get_age(self, person):
+        return person.age
+
+def _to_xml(cls, value):
+    parent = etree.Element('parent')
+    cls.to_parent_element(value, ns_test, parent)
+    return parent[0]
+
+def _make_person(i):
+    return Person(name='person %d' % i, age=i,
+                  address=Address(street='street %d' % i, zip=i),
+                  aliases=['a', 'b'], friends=[Address(street='x', zip=1)],
+                  code='p%d' % i)
+
+class TestLazyInstance(unittest.TestCase):
+    def test_fields(self):
+        element = _to_xml(Person, _make_person(3))
+        person = get_lazy_instance(Person, element)
+
+        self.assertTrue(isinstance(person, Person))
+        self.assertEquals(person.__dict__.keys(), [' lazy index'])
+
+        self.assertEquals(person.name, 'person 3')
+        self.assertEquals(person.code, 'p3')
+        self.assertEquals(person.aliases, ['a', 'b'])
+
+        # nested ClassModels are proxies as well.
+        address = person.address
+        self.assertTrue(isinstance(address, Address))
+        self.assertFalse('street' in address.__dict__)
+        self.assertEquals(address.street, 'street 3')
+        self.assertEquals(person.friends[0].zip, 1)
+
+        person.age = 10
+        self.assertEquals(person.age, 10)
+
+        # all the members are decoded or assigned, the element is released.
+        self.assertFalse(' lazy index' in person.__dict__)
+
+        self.assertEquals(Person.name, String)
+
+    def test_decode(self):
+        person = decode(get_lazy_instance(Person, _to_xml(Person,
+                                                         _make_person(1))))
+        self.assertFalse(' lazy index' in person.__dict__)
+        self.assertFalse(' lazy index' in person.address.__dict__)
+        self.assertEquals(person.friends[0].street, 'x')
+
+    def test_extends(self):
+        employee = Employee(name='x', salary=10)
+        employee = get_lazy_instance(Employee, _to_xml(Employee, employee))
+        self.assertEquals((employee.name, employee.salary, employee.age),
+                                                              ('x', 10, None))
+
+    def test_invalid(self):
+        element = _to_xml(Person, Person(name='x'))
+        etree.SubElement(element, '{%s}age' % ns_test).text = 'nan'
+
+        person = get_lazy_instance(Person, element)
+        self.assertEquals(person.name, 'x')
+        self.assertRaises(Fault, getattr, person, 'age')
+
+class TestLazyMethod(unittest.TestCase):
+    def setUp(self):
+        self.app = Application([LazyService], 'tns')
+        self.server = wsgi.Application(self.app)
+        self.client = Client(self.app)
+
+    def _call(self, method_name, args, header=None):
+        ctx = MethodContext()
+        ctx.service_class = LazyService
+        ctx.service = self.app.get_service(LazyService)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        ctx.service.out_header = header
+        request = self.client.get_request_string(ctx, args, {})
+
+        status = []
+        def start_response(code, headers):
+            status.append(code)
+
+        body = ''.join(self.server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response))
+
+        self.assertEquals(status[0], wsgi.HTTP_200, body)
+
+        return self.client.get_response_object(ctx, body)
+
+    def test_sparse(self):
+        people = [_make_person(i) for i in range(3)]
+        result = self._call('second_name', (people,),
+                                                 RequestHeader(token='secret'))
+        self.assertEquals(result, 'person 1')
+
+        # the people that weren't read and the header are not decoded.
+        self.assertFalse('name' in _seen['people'][0].__dict__)
+        self.assertFalse('token' in _seen['header'].__dict__)
+        self.assertEquals(_seen['header'].token, 'secret')
+
+    def test_echo(self):
+        result = self._call('echo', (_make_person(2),))
+        self.assertEquals(result.name, 'person 2')
+        self.assertEquals(result.address.street, 'street 2')
+        self.assertEquals(result.friends[0].zip, 1)
+
+    def test_decode_as(self):
+        self.assertEquals(self._call('get_age', (_make_person(7),)), 7)
+
+        self.assertRaises(ValueError, LazyServiceWithDict)
+
+class LazyServiceWithDict(DefinitionBase):
+    @soap(Person, _returns=Integer, _lazy=True, _decode_as='dict')
+    def get_age(self, person):
+        return person['age']
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import os
+import signal
+import socket
+import time
+import unittest
+import urllib2
+
+from soaplib.core import Application
+from soaplib.core.client.http import Client
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.server.prefork import Server
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+class PreforkTestService(DefinitionBase):
+    @soap(_returns=Integer)
+    def get_pid(self):
+        return os.getpid()
+
+    @soap(Float, _returns=Float)
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+def _wait(pid, timeout=10):
+    """Returns the exit status of the given child process, or None if it's
+    still running after the timeout."""
+
+    end = time.time() + timeout
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited == pid:
+            return status
+        if time.time() >= end:
+            return None
+        time.sleep(0.05)
+
+class TestPrefork(unittest.TestCase):
+    def start(self, **kwargs):
+        app = Application([PreforkTestService], 'tns')
+        server = Server(app, ('127.0.0.1', 0), **kwargs)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+
+        server.socket.close()
+        self.pid = pid
+        self.url = 'http://%s:%d/' % server.server_address
+        self.client = Client(self.url, app)
+
+        return server
+
+    def setUp(self):
+        self.pid = None
+
+    def tearDown(self):
+        if self.pid is None:
+            return
+
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass # the test has stopped it.
+        else:
+            _wait(self.pid)
+
+    def get_pids(self, n):
+        return set([self.client.service.get_pid() for i in range(n)])
+
+    def test_serve(self):
+        self.start(workers=2)
+
+        pids = self.get_pids(10)
+        self.assertTrue(self.pid not in pids)
+        self.assertTrue(0 < len(pids) <= 2)
+        self.assertEquals(self.client.service.sleep(0.01), 0.01)
+
+        # the wsdl is built with the server's url before forking.
+        wsdl = urllib2.urlopen(self.url + '?wsdl').read()
+        self.assertTrue(self.url in wsdl)
+
+        os.kill(self.pid, signal.SIGTERM)
+        self.assertEquals(_wait(self.pid), 0)
+
+    def test_max_requests(self):
+        self.start(workers=1, max_requests=2)
+
+        self.assertEquals(len(self.get_pids(6)), 3)
+
+    def test_reload(self):
+        self.start(workers=1)
+        old_pid = self.client.service.get_pid()
+
+        os.kill(self.pid, signal.SIGHUP)
+        end = time.time() + 10
+        while time.time() < end:
+            if self.client.service.get_pid() != old_pid:
+                break
+        else:
+            self.fail("The worker wasn't replaced")
+
+    def test_graceful_stop(self):
+        self.start(workers=1)
+        self.client.service.get_pid()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # the request isn't interrupted by the stop.
+                os._exit(int(self.client.service.sleep(0.5) != 0.5))
+            finally:
+                os._exit(1)
+
+        time.sleep(0.2)
+        os.kill(self.pid, signal.SIGTERM)
+
+        self.assertEquals(_wait(pid), 0)
+        self.assertEquals(_wait(self.pid), 0)
+
+    def test_reuse_port(self):
+        self.start(workers=2, reuse_port=True)
+
+        # the workers start listening after they're forked.
+        end = time.time() + 10
+        while True:
+            try:
+                self.client.service.get_pid()
+                break
+            except socket.error:
+                if time.time() > end:
+                    raise
+                time.sleep(0.05)
+
+        self.assertTrue(0 < len(self.get_pids(10)) <= 2)
+
+    def test_invalid(self):
+        app = Application([PreforkTestService], 'tns')
+        self.assertRaises(ValueError, Server, app, workers=0)
+        self.assertRaises(ValueError, Server, app, max_requests=-1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,23 +17,31 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
 #
 
+import cStringIO
 import datetime
+import logging
+import threading
 import unittest
 
 from lxml import etree
 
 from soaplib.core.model.clazz import ClassModel
 from soaplib.core.model.clazz import Array
+from soaplib.core.model.exception import Fault
 from soaplib.core.model.primitive import DateTime
 from soaplib.core.model.primitive import Float
 from soaplib.core.model.primitive import Integer
 from soaplib.core.model.primitive import String
 
+from soaplib.core import namespaces
+from soaplib.core.cache import ResponseCache
 from soaplib.core import service
 from soaplib.core import Application
+from soaplib.core import MethodContext
 Application.transport = 'test'
 
 from soaplib.core.service import soap
+from soaplib.core.server import wsgi
 
 class Address(ClassModel):
     __namespace__ = "TestService"
@@ -121,6 +129,153 @@ class MultipleReturnService(service.DefinitionBase):
     def multi(self, s):
         return s, 'a', 'b'
 
+class DecodeTargetService(service.DefinitionBase):
+    @soap(Person, _returns=String)
+    def default(self, p):
+        return p.name
+
+    @soap(Person, _returns=String, _decode_as='dict')
+    def as_dict(self, p):
+        return p['name']
+
+    @soap(Person, _returns=String, _decode_as='namedtuple')
+    def as_namedtuple(self, p):
+        return p.name
+
+    @soap(Person, _returns=String, _decode_as='instance')
+    def as_instance(self, p):
+        return p.name
+
+class Order(ClassModel):
+    __namespace__ = "TestService"
+
+    id = Integer
+    address = Address
+
+class MultiRefService(service.DefinitionBase):
+    @soap(_returns=Array(Order), _multiref=True)
+    def orders(self):
+        address = Address(city='istanbul')
+        return [Order(id=i, address=address) for i in range(3)]
+
+    @soap(_returns=Array(Order))
+    def orders_plain(self):
+        return self.orders()
+
+class QuietFault(Fault):
+    log_level = None
+
+class ThrottledFault(Fault):
+    log_traceback = False
+    log_rate = 2
+
+class FaultService(service.DefinitionBase):
+    @soap(String)
+    def quiet(self, s):
+        raise QuietFault('Client', s)
+
+    @soap(String)
+    def throttled(self, s):
+        raise ThrottledFault('Client', s)
+
+    @soap(String)
+    def detailed(self, s):
+        raise Fault('Client', s, detail=etree.Element('reason'))
+
+lookup_cache = ResponseCache(ttl=60)
+
+class CachedService(service.DefinitionBase):
+    n_calls = 0
+    values = {}
+
+    @soap(String, _returns=String, _cache=lookup_cache)
+    def lookup(self, key):
+        CachedService.n_calls += 1
+        if not key in self.values:
+            raise Fault('Client.NotFound', key)
+
+        return self.values[key]
+
+    @soap(String, String)
+    def store(self, key, value):
+        self.values[key] = value
+        lookup_cache.invalidate('lookup', [key])
+
+class FrozenService(service.DefinitionBase):
+    @soap(String, _returns=TypeNS1)
+    def echo(self, s):
+        return TypeNS1(s=s, i=len(s))
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def _call_wsgi(app, request):
+    server = wsgi.Application(app)
+
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    response = ''.join(server({
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': '',
+        'PATH_INFO': '/',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': cStringIO.StringIO(request),
+        'CONTENT_LENGTH': str(len(request)),
+        'CONTENT_TYPE': 'text/xml; charset=utf-8',
+    }, start_response))
+
+    return status[0], response
+
+def _get_wsdl(server):
+    status = []
+    def start_response(code, headers):
+        status.append(code)
+
+    response = ''.join(server({
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': 'wsdl',
+        'PATH_INFO': '/',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+    }, start_response))
+
+    return status[0], response
+
+def _roundtrip_response(app, service_class, method_name):
+    ctx = MethodContext()
+    ctx.service = app.get_service(service_class)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    out_object = getattr(ctx.service, method_name)()
+    response = etree.tostring(app.serialize_soap(ctx,
+                                       Application.OUT_WRAPPER, out_object))
+
+    root, xmlids = app.parse_xml_string(response)
+
+    ctx2 = MethodContext()
+    ctx2.service_class = service_class
+    ctx2.descriptor = ctx.descriptor
+    return response, app.deserialize_soap(ctx2, Application.OUT_WRAPPER,
+                                                                  root, xmlids)
+
+def _decode_request(app, method_name, arg):
+    ctx = MethodContext()
+    ctx.service = app.get_service(DecodeTargetService)
+    ctx.descriptor = ctx.service.get_method(method_name)
+    request = app.serialize_soap(ctx, Application.IN_WRAPPER, arg)
+
+    ctx = MethodContext()
+    return app.deserialize_soap(ctx, Application.IN_WRAPPER, request)
+
 class Test(unittest.TestCase):
     '''Most of the service tests are performed through the interop tests.'''
 
@@ -167,5 +322,236 @@ class Test(unittest.TestCase):
         svc = Application([MultipleNamespaceService], 'tns')
         wsdl = svc.get_wsdl("URL")
 
+    def test_decode_as(self):
+        app = Application([DecodeTargetService], 'tns')
+
+        p = Person()
+        p.name = 'steve'
+        p.addresses = [Address(city='istanbul')]
+
+        (p2,) = _decode_request(app, 'default', p)
+        self.assertTrue(isinstance(p2, Person))
+
+        (p2,) = _decode_request(app, 'as_dict', p)
+        self.assertEquals(dict, type(p2))
+        self.assertEquals('steve', p2['name'])
+        self.assertEquals(None, p2['age'])
+        self.assertEquals('istanbul', p2['addresses'][0]['city'])
+
+        (p2,) = _decode_request(app, 'as_namedtuple', p)
+        self.assertTrue(isinstance(p2, tuple))
+        self.assertEquals('steve', p2.name)
+        self.assertEquals('istanbul', p2.addresses[0].city)
+
+    def test_decode_as_application(self):
+        app = Application([DecodeTargetService], 'tns', decode_as='dict')
+
+        p = Person()
+        p.name = 'steve'
+
+        (p2,) = _decode_request(app, 'default', p)
+        self.assertEquals('steve', p2['name'])
+
+        (p2,) = _decode_request(app, 'as_instance', p)
+        self.assertTrue(isinstance(p2, Person))
+
+        self.assertRaises(ValueError, Application, [DecodeTargetService],
+                                                       'tns', decode_as='list')
+
+    def test_multiref_output(self):
+        app = Application([MultiRefService], 'tns')
+
+        response, (orders,) = _roundtrip_response(app, MultiRefService,
+                                                                      'orders')
+        self.assertEquals(response.count('istanbul'), 1)
+        self.assertEquals(response.count('href="#ref1"'), 2)
+
+        self.assertEquals([o.id for o in orders], [0, 1, 2])
+        self.assertEquals(orders[0].address.city, 'istanbul')
+        self.assertTrue(orders[0].address is orders[1].address)
+        self.assertTrue(orders[0].address is orders[2].address)
+
+        response, (orders,) = _roundtrip_response(app, MultiRefService,
+                                                                'orders_plain')
+        self.assertEquals(response.count('istanbul'), 3)
+        self.assertFalse('href' in response)
+
+    def test_fault_logging(self):
+        from soaplib.core import _base
+        app = Application([FaultService], 'tns')
+
+        handler = _ListHandler()
+        _base.logger.addHandler(handler)
+        try:
+            for method_name in ('quiet', 'throttled'):
+                for i in range(5):
+                    ctx = MethodContext()
+                    ctx.service = app.get_service(FaultService)
+                    ctx.descriptor = ctx.service.get_method(method_name)
+                    ctx.method_name = method_name
+                    retval = app.process_request(ctx, [str(i)])
+                    self.assertEquals(retval.faultstring, str(i))
+        finally:
+            _base.logger.removeHandler(handler)
+
+        # quiet faults aren't logged, throttled ones are logged twice a second
+        # without their traceback.
+        self.assertEquals(len(handler.records), 2)
+        self.assertEquals([r.getMessage() for r in handler.records],
+                                     ["senv:Client: '0'", "senv:Client: '1'"])
+        self.assertFalse(handler.records[0].exc_info)
+
+    def test_fault_template(self):
+        app = Application([FaultService], 'tns')
+        server = wsgi.Application(app)
+
+        ctx = MethodContext()
+        for fault in (Fault(), Fault('Client.SoapError', 'Soap body is empty!'),
+                      Fault('Client', u'\u0131<&>\r\n"', 'actor'),
+                      QuietFault('Server', 'quiet')):
+            expected = etree.tostring(app.serialize_soap(ctx,
+                            Application.OUT_WRAPPER, fault),
+                            xml_declaration=True, encoding='utf-8')
+            self.assertEquals(server.get_fault_string(ctx, fault), expected)
+
+        self.assertEquals(server.get_fault_string(ctx,
+                    Fault('Client', 'x', detail=etree.Element('reason'))), None)
+        self.assertEquals(server.get_fault_string(ctx,
+                                                 Fault('Client', u'\x01')), None)
+
+        class HookedApplication(Application):
+            def on_exception_xml(self, fault_xml):
+                pass
+
+        server = wsgi.Application(HookedApplication([FaultService], 'tns'))
+        self.assertEquals(server.get_fault_string(ctx, Fault()), None)
+
+    def test_fault_template_custom_serializer(self):
+        class CustomFault(Fault):
+            def add_to_parent_element(self, tns, parent):
+                Fault.add_to_parent_element(self, tns, parent)
+                parent[-1].append(etree.Element('custom'))
+
+        server = wsgi.Application(Application([FaultService], 'tns'))
+        fault = CustomFault('Client', 'custom')
+
+        self.assertEquals(server.get_fault_string(MethodContext(), fault),
+                                                                          None)
+        out_string = server.get_out_xml_string(MethodContext(), fault)
+        self.assertTrue('<custom/>' in out_string)
+
+    def test_wsgi_static_faults(self):
+        app = Application([FaultService], 'tns')
+        envelope = '<senv:Envelope xmlns:senv="%s">%%s</senv:Envelope>' % \
+                                                         namespaces.ns_soap_env
+
+        for body, faultstring in (
+                    ('', 'Soap envelope is empty!'),
+                    ('<senv:Body/>', 'Soap body is empty!'),
+                    ('<senv:Body><unknown/></senv:Body>',
+                                                "Method not found: 'unknown'"),
+                ):
+            status, response = _call_wsgi(app, envelope % body)
+            self.assertEquals(status, wsgi.HTTP_500)
+
+            fault = Fault.from_xml(etree.fromstring(response).find(
+                            './/{%s}Fault' % namespaces.ns_soap_env))
+            self.assertEquals(fault.faultstring, faultstring)
+            self.assertEquals(fault.faultcode.split(':')[1].split('.')[0],
+                                                                      'Client')
+
+    def test_response_cache(self):
+        from soaplib.core.client import Base as Client
+
+        app = Application([CachedService], 'tns')
+        client = Client(app)
+        CachedService.values = {'a': 'x'}
+        CachedService.n_calls = 0
+
+        def call(method_name, *args):
+            ctx = MethodContext()
+            ctx.service = app.get_service(CachedService)
+            ctx.descriptor = ctx.service.get_method(method_name)
+            return _call_wsgi(app, client.get_request_string(ctx, args, {}))
+
+        status, response = call('lookup', 'a')
+        self.assertEquals(call('lookup', 'a'), (status, response))
+        self.assertEquals(CachedService.n_calls, 1)
+        self.assertTrue('>x<' in response)
+
+        # faults are not cached
+        self.assertEquals(call('lookup', 'b')[0], wsgi.HTTP_500)
+        self.assertEquals(call('lookup', 'b')[0], wsgi.HTTP_500)
+        self.assertEquals(CachedService.n_calls, 3)
+
+        # the service invalidates the cached response
+        call('store', 'a', 'y')
+        self.assertTrue('>y<' in call('lookup', 'a')[1])
+        self.assertEquals(CachedService.n_calls, 4)
+
+        self.assertEquals(lookup_cache.hits, 1)
+
+        self.assertRaises(ValueError, soap(String, _cache=lookup_cache,
+                  _mtom=True)(lambda self, s: s), _method_descriptor=True,
+                                                       clazz=CachedService)
+
+    def test_freeze(self):
+        from soaplib.core.client import Base as Client
+
+        app = Application([FrozenService], 'tns')
+        ctx = MethodContext()
+        ctx.service = app.get_service(FrozenService)
+        ctx.descriptor = ctx.service.get_method('echo')
+        request = Client(app).get_request_string(ctx, ('abc',), {})
+
+        app.freeze()
+        self.assertRaises(TypeError, app.nsmap.__setitem__, 'x', 'urn:x')
+        self.assertRaises(ValueError, app.get_namespace_prefix, 'urn:x')
+
+        server = wsgi.Application(app)
+        expected = _call_wsgi(app, request)
+        self.assertEquals(expected[0], wsgi.HTTP_200)
+
+        # the first request for the wsdl doesn't change the responses.
+        expected_wsdl = _get_wsdl(server)
+        self.assertEquals(expected_wsdl[0], wsgi.HTTP_200)
+        self.assertEquals(_call_wsgi(app, request), expected)
+
+        app.freeze()
+        self.assertEquals(_get_wsdl(server), expected_wsdl)
+
+    def test_freeze_threads(self):
+        from soaplib.core.client import Base as Client
+
+        app = Application([FrozenService], 'tns')
+        ctx = MethodContext()
+        ctx.service = app.get_service(FrozenService)
+        ctx.descriptor = ctx.service.get_method('echo')
+        request = Client(app).get_request_string(ctx, ('abc',), {})
+        app.freeze()
+        server = wsgi.Application(app)
+
+        results = []
+        start = threading.Event()
+        def run():
+            start.wait()
+            for i in range(20):
+                results.append(_get_wsdl(server))
+                results.append(_call_wsgi(app, request))
+
+        threads = [threading.Thread(target=run) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(len(results), 640)
+        wsdls = [r for r in results if '<wsdl:definitions' in r[1]]
+        responses = [r for r in results if r not in wsdls]
+        self.assertEquals(len(wsdls), 320)
+        self.assertEquals(set(wsdls), set([_get_wsdl(server)]))
+        self.assertEquals(set(responses), set([_call_wsgi(app, request)]))
+
 if __name__ == '__main__':
     unittest.main()
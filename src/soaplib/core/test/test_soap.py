@@ -29,7 +29,10 @@ from soaplib.core.model.primitive import Float
 from soaplib.core.model.primitive import Integer
 from soaplib.core.model.primitive import String
 
+from soaplib.core.model import base
+from soaplib.core.model import set_xmlids
 from soaplib.core.model.clazz import ClassModel as Message
+from soaplib.core.model.exception import Fault
 from soaplib.core._base import _from_soap
 from soaplib.core._base import _parse_xml_string
 
@@ -52,6 +55,26 @@ class Person(ClassModel):
 
 Person.resolve_namespace(Person, "punk")
 
+class MyData(ClassModel):
+    Machine = String
+    UserName = String
+
+MyData.resolve_namespace(MyData, "http://tempuri.org/")
+
+class Node(ClassModel):
+    name = String
+
+Node.resolve_namespace(Node, "http://tempuri.org/")
+
+MyResponse = Message.produce(
+    namespace="http://tempuri.org/",
+    type_name='myResponse',
+    members={'myResult': Array(MyData), 'other': MyData, 'node': Node},
+)
+
+# recursive types can't have their namespaces resolved.
+Node._type_info['children'] = Array(Node)
+
 class TestSoap(unittest.TestCase):
     def test_simple_message(self):
         m = Message.produce(
@@ -109,8 +132,78 @@ xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
         root, xmlids = _parse_xml_string(envelope_string, 'utf8')
         header,payload = _from_soap(root, xmlids)
 
-        # quick and dirty test href reconstruction
-        self.assertEquals(len(payload[0]), 2)
+        result = self._decode_multiref(payload, xmlids)
+
+        self.assertEquals(len(result.myResult), 2)
+        self.assertEquals(result.myResult[0].Machine, 'somemachine')
+        self.assertEquals(result.myResult[1].UserName, 'user2')
+
+    def _decode_multiref(self, element, xmlids):
+        set_xmlids(xmlids)
+        try:
+            self.assertEquals(base._multiref_threads, 1)
+            return MyResponse.from_xml(element)
+        finally:
+            set_xmlids(None)
+            self.assertEquals(base._multiref_threads, 0)
+
+    def test_href_shared(self):
+        envelope_string = '''<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:tns="http://tempuri.org/"
+xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <tns:myResponse>
+      <myResult>
+        <Item href="#id2" />
+        <Item href="#id2" />
+        <Item href="#id3" />
+      </myResult>
+      <other href="#id3" />
+    </tns:myResponse>
+    <tns:MyData id="id2">
+      <Machine>somemachine</Machine>
+    </tns:MyData>
+    <ref id="id3" href="#id2" />
+  </soap:Body>
+</soap:Envelope>'''
+
+        root, xmlids = _parse_xml_string(envelope_string, 'utf8')
+        header, payload = _from_soap(root, xmlids)
+
+        result = self._decode_multiref(payload, xmlids)
+
+        self.assertEquals(len(result.myResult), 3)
+        self.assertEquals(result.myResult[0].Machine, 'somemachine')
+        self.assertTrue(result.myResult[0] is result.myResult[1])
+        self.assertTrue(result.myResult[0] is result.myResult[2])
+        self.assertTrue(result.myResult[0] is result.other)
+
+    def test_href_cycle(self):
+        envelope_string = '''<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:tns="http://tempuri.org/"
+xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <tns:myResponse>
+      <node href="#id1" />
+    </tns:myResponse>
+    <tns:Node id="id1">
+      <name>a</name>
+      <children><Node href="#id1" /></children>
+    </tns:Node>
+  </soap:Body>
+</soap:Envelope>'''
+
+        root, xmlids = _parse_xml_string(envelope_string, 'utf8')
+        header, payload = _from_soap(root, xmlids)
+
+        self.assertRaises(Fault, self._decode_multiref, payload, xmlids)
+
+        # chains of references that loop
+        payload[0].set('href', '#id2')
+        xmlids['id2'] = etree.SubElement(root, 'ref', id='id2', href='#id3')
+        xmlids['id3'] = etree.SubElement(root, 'ref', id='id3', href='#id2')
+
+        self.assertRaises(Fault, self._decode_multiref, payload, xmlids)
 
     def test_namespaces(self):
         m = Message.produce(
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import threading
+import time
+import unittest
+
+try:
+    from twisted.internet import defer
+    from twisted.internet.error import ConnectionDone
+    from twisted.python.failure import Failure
+    from twisted.test.proto_helpers import StringTransport
+    from twisted.web.server import Site
+except ImportError:
+    defer = None
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.coalesce import Coalescer
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+pending = []
+shared_calls = []
+busy = Limiter(max_concurrency=1, max_queue=1, timeout=5)
+
+class TwistedTestService(DefinitionBase):
+    @soap(String, _returns=String)
+    def echo(self, s):
+        return s
+
+    @soap(Integer, _returns=Integer)
+    def later(self, i):
+        d = defer.Deferred()
+        pending.append((d, i))
+        return d
+
+    @soap(_returns=String)
+    def fail(self):
+        raise Fault('Server.Failed', 'failed')
+
+    @soap(Integer, _returns=Integer,
+                            _coalesce=Coalescer(share_response=True))
+    def shared(self, i):
+        shared_calls.append(i)
+        time.sleep(0.2)
+        return i
+
+    @soap(Integer, _returns=Integer, _coalesce=Coalescer())
+    def coalesced_later(self, i):
+        d = defer.Deferred()
+        pending.append((d, i))
+        return d
+
+    @soap(String, _returns=String, _limiter=busy)
+    def limited(self, s):
+        return s
+
+    @soap(_returns=String)
+    def fail_later(self):
+        d = defer.Deferred()
+        pending.append((d, None))
+        return d
+
+class _ThreadPool(object):
+    """Runs the functions it's given at once, in the calling thread."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def callInThreadWithCallback(self, on_result, f, *args, **kwargs):
+        self.calls += 1
+        try:
+            result = f(*args, **kwargs)
+        except:
+            on_result(False, Failure())
+        else:
+            on_result(True, result)
+
+class _Reactor(object):
+    def __init__(self):
+        self.pool = _ThreadPool()
+
+    def getThreadPool(self):
+        return self.pool
+
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+@unittest.skipUnless(defer is not None, "twisted is not installed")
+class TestTwistedWebResource(unittest.TestCase):
+    def setUp(self):
+        from soaplib.core.server.twisted_web import TwistedWebResource
+
+        self.app = Application([TwistedTestService], 'tns')
+        self.reactor = _Reactor()
+        self.resource = TwistedWebResource(self.app, reactor=self.reactor)
+        self.site = Site(self.resource)
+        self.client = Client(self.app)
+        del pending[:]
+
+    def connect(self):
+        channel = self.site.buildProtocol(None)
+        transport = StringTransport()
+        channel.makeConnection(transport)
+        return channel, transport
+
+    def send(self, method_name, *args):
+        ctx = MethodContext()
+        ctx.service_class = TwistedTestService
+        ctx.service = self.app.get_service(TwistedTestService)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        request = self.client.get_request_string(ctx, args, {})
+
+        channel, transport = self.connect()
+        channel.dataReceived('POST /soap HTTP/1.0\r\n'
+                             'Content-Type: text/xml; charset=utf-8\r\n'
+                             'Content-Length: %d\r\n\r\n%s' % (len(request),
+                                                                      request))
+        return ctx, channel, transport
+
+    def response(self, ctx, channel, transport):
+        head, body = transport.value().split('\r\n\r\n', 1)
+        status = head.split('\r\n')[0].split(' ', 2)[1]
+
+        try:
+            retval = self.client.get_response_object(ctx, body)
+        except Fault, e:
+            retval = e
+
+        return status, retval
+
+    def test_echo(self):
+        status, retval = self.response(*self.send('echo', 'hello'))
+        self.assertEquals(status, '200')
+        self.assertEquals(retval, 'hello')
+
+    def test_fault(self):
+        status, retval = self.response(*self.send('fail'))
+        self.assertEquals(status, '500')
+        self.assertEquals(retval.faultcode, 'senv:Server.Failed')
+
+    def test_deferred(self):
+        ctx, channel, transport = self.send('later', 4)
+        self.assertEquals(transport.value(), '')
+        self.assertEquals(len(pending), 1)
+
+        d, i = pending.pop()
+        d.callback(i * 2)
+
+        status, retval = self.response(ctx, channel, transport)
+        self.assertEquals(status, '200')
+        self.assertEquals(retval, 8)
+
+    def test_concurrent(self):
+        requests = [self.send('later', i) for i in range(3)]
+        self.assertEquals(len(pending), 3)
+
+        for d, i in reversed(pending):
+            d.callback(i + 1)
+
+        for i, request in enumerate(requests):
+            self.assertEquals(self.response(*request), ('200', i + 1))
+
+    def test_coalesced_deferred(self):
+        coalescer = TwistedTestService().get_method('coalesced_later').coalesce
+        requests = [self.send('coalesced_later', 2) for i in range(3)]
+
+        # the requests wait for the deferred of the first one to fire.
+        self.assertEquals(len(pending), 1)
+        self.assertEquals([r[2].value() for r in requests], [''] * 3)
+
+        d, i = pending.pop()
+        d.callback(i * 2)
+
+        for request in requests:
+            self.assertEquals(self.response(*request), ('200', 4))
+        self.assertEquals((coalescer.executions, coalescer.coalesced), (1, 2))
+
+        # the next request calls the method again.
+        self.send('coalesced_later', 2)
+        self.assertEquals(len(pending), 1)
+
+    def test_coalesced_deferred_fault(self):
+        requests = [self.send('coalesced_later', 3) for i in range(2)]
+        d, i = pending.pop()
+        d.errback(Fault('Server.Later', 'failed later'))
+
+        for request in requests:
+            status, retval = self.response(*request)
+            self.assertEquals(status, '500')
+            self.assertEquals(retval.faultcode, 'senv:Server.Later')
+
+    def test_busy(self):
+        # the request is rejected instead of blocking the reactor in the queue.
+        self.assertTrue(busy.acquire())
+        try:
+            status, retval = self.response(*self.send('limited', 'hello'))
+        finally:
+            busy.release()
+
+        self.assertEquals(status, '503')
+        self.assertEquals(retval.faultcode, 'senv:Server.Busy')
+        self.assertEquals((busy.rejected, busy.timeouts), (1, 0))
+
+    def test_deferred_fault(self):
+        ctx, channel, transport = self.send('fail_later')
+        d, i = pending.pop()
+        d.errback(Fault('Server.Later', 'failed later'))
+
+        status, retval = self.response(ctx, channel, transport)
+        self.assertEquals(status, '500')
+        self.assertEquals(retval.faultcode, 'senv:Server.Later')
+
+    def test_deferred_error(self):
+        ctx, channel, transport = self.send('fail_later')
+        d, i = pending.pop()
+        d.errback(ValueError('oops'))
+
+        status, retval = self.response(ctx, channel, transport)
+        self.assertEquals(status, '500')
+        self.assertEquals(retval.faultcode, 'senv:Server')
+        self.assertEquals(retval.faultstring, 'oops')
+
+    def test_disconnected(self):
+        channel, transport = self.send('later', 1)[1:]
+        channel.connectionLost(Failure(ConnectionDone()))
+
+        d, i = pending.pop()
+        d.callback(i)
+        self.assertEquals(transport.value(), '')
+
+    def test_thread_threshold(self):
+        self.resource.thread_threshold = 0
+        status, retval = self.response(*self.send('echo', 'hello'))
+        self.assertEquals(status, '200')
+        self.assertEquals(retval, 'hello')
+        self.assertEquals(self.reactor.pool.calls, 2)
+
+    def test_wsdl(self):
+        channel, transport = self.connect()
+        channel.dataReceived('GET /soap?wsdl HTTP/1.0\r\n'
+                            'Host: localhost\r\n\r\n')
+
+        head, body = transport.value().split('\r\n\r\n', 1)
+        self.assertTrue(head.startswith('HTTP/1.0 200'))
+        self.assertTrue('definitions' in body)
+        self.assertTrue('location="http://localhost:12345/soap"' in body)
+
+    def test_get(self):
+        channel, transport = self.connect()
+        channel.dataReceived('GET /soap HTTP/1.0\r\n\r\n')
+
+        head, body = transport.value().split('\r\n\r\n', 1)
+        self.assertTrue(head.startswith('HTTP/1.0 405'))
+        self.assertTrue('Allow: POST' in head)
+
+    def test_malformed_multipart(self):
+        body = '--boundary\r\nContent-Type: application/xop+xml\r\n\r\n<a'
+        channel, transport = self.connect()
+        channel.dataReceived('POST /soap HTTP/1.0\r\n'
+                             'Content-Type: multipart/related; '
+                                             'boundary="boundary"\r\n'
+                             'Content-Length: %d\r\n\r\n%s' % (len(body),
+                                                                        body))
+
+        status, retval = self.response(MethodContext(), channel,
+                                                                 transport)
+        self.assertEquals(status, '500')
+        self.assertTrue(retval.faultcode.endswith('Client'))
+
+    def test_share_response(self):
+        """A wsgi request gets the serialized response of the twisted request
+        it's coalesced with."""
+
+        del shared_calls[:]
+
+        results = []
+        responses = []
+        leader = threading.Thread(target=lambda: results.append(
+                                     self.response(*self.send('shared', 3))))
+        leader.start()
+        while not shared_calls:
+            time.sleep(0.01)
+
+        ctx = MethodContext()
+        ctx.service = self.app.get_service(TwistedTestService)
+        ctx.descriptor = ctx.service.get_method('shared')
+        request = self.client.get_request_string(ctx, (3,), {})
+
+        server = wsgi.Application(self.app)
+        waiter = threading.Thread(target=lambda: responses.append(''.join(
+            server({
+                'REQUEST_METHOD': 'POST',
+                'QUERY_STRING': '',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': cStringIO.StringIO(request),
+                'CONTENT_LENGTH': str(len(request)),
+                'CONTENT_TYPE': 'text/xml; charset=utf-8',
+            }, lambda status, headers: None))))
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(5)
+        leader.join()
+
+        self.assertFalse(waiter.isAlive())
+        self.assertEquals(shared_calls, [3])
+        self.assertEquals(results, [('200', 3)])
+        self.assertTrue('>3<' in responses[0])
+
+if __name__ == '__main__':
+    unittest.main()
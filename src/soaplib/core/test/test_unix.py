@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core.client import Base as BaseClient
+from soaplib.core.client.unix import Client
+from soaplib.core.model.exception import Fault
+from soaplib.core.model.primitive import Float
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
+from soaplib.core.server.unix import Server
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+from soaplib.core.util.framing import FrameError
+from soaplib.core.util.framing import pack_frame
+from soaplib.core.util.framing import read_frame
+
+class UnixTestService(DefinitionBase):
+    @soap(String, Integer, _returns=String)
+    def repeat(self, s, n):
+        return s * n
+
+    @soap(Float, _returns=Float)
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @soap(_returns=String)
+    def fail(self):
+        raise Fault('Server.Failed', 'failed')
+
+class TestFraming(unittest.TestCase):
+    def test_frames(self):
+        stream = cStringIO.StringIO(pack_frame(u'{tns}f\xe9', 'body') +
+                                    pack_frame(None, ''))
+
+        self.assertEquals(read_frame(stream), ('{tns}f\xc3\xa9', 'body'))
+        self.assertEquals(read_frame(stream), ('', ''))
+        self.assertEquals(read_frame(stream), None)
+
+    def test_invalid(self):
+        frame = pack_frame('name', 'body')
+        self.assertRaises(FrameError, read_frame,
+                                           cStringIO.StringIO(frame[:3]))
+        self.assertRaises(FrameError, read_frame,
+                                           cStringIO.StringIO(frame[:-1]))
+        self.assertRaises(FrameError, read_frame,
+                                           cStringIO.StringIO(frame), 3)
+
+class TestUnix(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'soap.sock')
+        self.app = Application([UnixTestService], 'tns')
+        self.start(max_request_size=4096)
+        self.client = Client(self.path, self.app)
+
+    def start(self, **kwargs):
+        self.server = Server(self.app, self.path, **kwargs)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                                                 args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.close()
+
+    def tearDown(self):
+        self.client.close()
+        self.stop()
+        shutil.rmtree(self.dir)
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock, sock.makefile('rb')
+
+    def get_request(self, method_name, *args):
+        ctx = MethodContext()
+        ctx.service = self.app.get_service(UnixTestService)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        return BaseClient(self.app).get_request_string(ctx, args, {})
+
+    def test_call(self):
+        self.assertEquals(self.client.service.repeat('ab', 3), 'ababab')
+        self.assertEquals(self.client.service.repeat('c', 2), 'cc')
+
+    def test_fault(self):
+        try:
+            self.client.service.fail()
+        except Fault, e:
+            self.assertEquals(e.faultcode, 'senv:Server.Failed')
+        else:
+            self.fail("No fault")
+
+    def test_pipelining(self):
+        calls = [(self.client.service.sleep, (0.1,))] * 4
+        calls.append((self.client.service.repeat, ('a', 2)))
+
+        results = self.client.gather(calls)
+        self.assertEquals(results, [0.1] * 4 + ['aa'])
+
+    def test_pipelined_frames(self):
+        sock, stream = self.connect()
+        sock.sendall(pack_frame(None, self.get_request('repeat', 'a', 1)) +
+                     pack_frame(None, self.get_request('repeat', 'b', 2)))
+
+        self.assertTrue('>a<' in read_frame(stream)[1])
+        self.assertTrue('>bb<' in read_frame(stream)[1])
+        sock.close()
+
+    def test_name(self):
+        # the name takes precedence over the body.
+        sock, stream = self.connect()
+        sock.sendall(pack_frame('{tns}missing',
+                                          self.get_request('repeat', 'a', 1)))
+
+        name, body = read_frame(stream)
+        self.assertEquals(name, '')
+        self.assertTrue('Method not found' in body)
+        sock.close()
+
+    def test_invalid_frame(self):
+        sock, stream = self.connect()
+        # the connection is closed as soon as the header is read.
+        sock.sendall(pack_frame(None, 'x' * 4097)[:6])
+        self.assertEquals(read_frame(stream), None)
+        sock.close()
+
+    def test_timeout(self):
+        sleep = self.client.service.sleep
+        self.assertRaises(socket.timeout, self.client.call, sleep.service_class,
+                                             sleep.descriptor, (0.5,), {}, 0.1)
+
+        # the late response isn't given to the next call.
+        self.assertEquals(self.client.service.repeat('a', 1), 'a')
+
+    def test_reconnect(self):
+        self.assertEquals(self.client.service.repeat('a', 1), 'a')
+
+        # the connections outlive the server that accepted them.
+        self.stop()
+        self.start()
+        self.client.get_connection().sock.shutdown(socket.SHUT_RDWR)
+        time.sleep(0.1)
+
+        self.assertEquals(self.client.service.repeat('b', 1), 'b')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+import cStringIO
+import unittest
+
+from soaplib.core import Application
+from soaplib.core import MethodContext
+from soaplib.core import namespaces
+from soaplib.core.admission import Limiter
+from soaplib.core.client import Base as Client
+from soaplib.core.model.primitive import String
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+
+full = Limiter(max_concurrency=1)
+
+class EchoService(DefinitionBase):
+    @soap(String, _returns=String, _max_request_size=2048)
+    def echo(self, s):
+        return s
+
+    @soap(String, _returns=String, _public_name='urn:echo-again')
+    def echo_again(self, s):
+        return s
+
+    @soap(String, _returns=String, _limiter=full)
+    def limited(self, s):
+        return s
+
+class _Unread(object):
+    def read(self, *args):
+        raise AssertionError("the request was read")
+
+class TestSoapAction(unittest.TestCase):
+    def setUp(self):
+        self.app = Application([EchoService], 'tns')
+        self.server = wsgi.Application(self.app)
+        self.client = Client(self.app)
+
+    def _get_request(self, method_name, value):
+        ctx = MethodContext()
+        ctx.service = self.app.get_service(EchoService)
+        ctx.descriptor = ctx.service.get_method(method_name)
+        return self.client.get_request_string(ctx, (value,), {})
+
+    def _call(self, request, soap_action=None, input=None, server=None):
+        env = {
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': input or cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }
+        if soap_action is not None:
+            env['HTTP_SOAPACTION'] = soap_action
+
+        status = []
+        def start_response(code, headers):
+            status.append(code)
+
+        body = ''.join((server or self.server)(env, start_response))
+
+        return status[0], body
+
+    def test_resolve(self):
+        ctx = MethodContext()
+        self.assertTrue(self.app.resolve_soap_action(ctx, 'urn:echo-again'))
+        self.assertEquals(ctx.method_name, '{tns}echo_again')
+        self.assertEquals(ctx.service_class, EchoService)
+        self.assertEquals(ctx.descriptor.name, 'echo_again')
+
+        self.assertFalse(self.app.resolve_soap_action(MethodContext(), 'x'))
+
+    def test_action(self):
+        request = self._get_request('urn:echo-again', 'hello')
+        status, body = self._call(request, '"urn:echo-again"')
+        self.assertEquals(status, wsgi.HTTP_200)
+        self.assertTrue('hello' in body)
+
+        # the method is found from the body when the action is unknown.
+        status, body = self._call(request, '"urn:unknown"')
+        self.assertEquals(status, wsgi.HTTP_200)
+
+        server = wsgi.Application(self.app, reject_unknown_actions=True)
+        status, body = self._call(request, '"urn:unknown"', _Unread(), server)
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Method not found' in body)
+
+    def test_mismatch(self):
+        request = self._get_request('echo', 'hello')
+        status, body = self._call(request, 'urn:echo-again')
+        self.assertEquals(status, wsgi.HTTP_500)
+        self.assertTrue('Client' in body)
+
+    def test_unqualified(self):
+        request = ('<senv:Envelope xmlns:senv="%s"><senv:Body><echo>'
+                   '<s>hello</s></echo></senv:Body></senv:Envelope>'
+                                                       % namespaces.ns_soap_env)
+        for soap_action in (None, 'echo'):
+            status, body = self._call(request, soap_action)
+            self.assertEquals(status, wsgi.HTTP_200)
+            self.assertTrue('hello' in body)
+
+    def test_max_request_size(self):
+        request = self._get_request('echo', 'x' * 4096)
+        status, body = self._call(request, 'echo', _Unread())
+        self.assertEquals(status, wsgi.HTTP_413)
+        self.assertTrue('Client.RequestTooLarge' in body)
+
+        # the limit holds when the method is found from the body.
+        status, body = self._call(request)
+        self.assertEquals(status, wsgi.HTTP_413)
+
+        status, body = self._call(self._get_request('echo', 'x'), 'echo')
+        self.assertEquals(status, wsgi.HTTP_200)
+
+
+    def test_busy(self):
+        request = self._get_request('limited', 'hello')
+
+        self.assertTrue(full.acquire())
+        try:
+            status, body = self._call(request, 'limited', _Unread())
+        finally:
+            full.release()
+
+        self.assertEquals(status, wsgi.HTTP_503)
+        self.assertTrue('Server.Busy' in body)
+        self.assertEquals(full.rejected, 1)
+
+        status, body = self._call(request, 'limited')
+        self.assertEquals(status, wsgi.HTTP_200)
+
+if __name__ == '__main__':
+    unittest.main()
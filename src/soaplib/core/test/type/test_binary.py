@@ -18,17 +18,63 @@
 #
 
 import base64
+import cStringIO
 import os
 import shutil
 import unittest
+from email import message_from_string
 from tempfile import mkstemp
 from lxml import etree
 
+from soaplib.core import mime
 from soaplib.core import namespaces
+from soaplib.core import Application
+from soaplib.core.server import wsgi
+from soaplib.core.service import DefinitionBase
+from soaplib.core.service import soap
+from soaplib.core.model import binary
 from soaplib.core.model.binary import Attachment
+from soaplib.core.model.primitive import Any
+from soaplib.core.model.primitive import Integer
+from soaplib.core.model.primitive import String
 
 ns_test = 'test_namespace'
 
+class StreamingService(DefinitionBase):
+    file_name = None
+
+    @soap(_returns=Attachment.customize(stream=True))
+    def get_file(self):
+        return Attachment(file_name=self.file_name)
+
+class EchoService(DefinitionBase):
+    file_name = None
+
+    @soap(Any, _returns=Any)
+    def echo(self, value):
+        return value
+
+class MtomService(DefinitionBase):
+    file_name = None
+
+    @soap(_returns=(Attachment, String, Attachment), _mtom=True)
+    def get_files(self):
+        return (Attachment(data='\x00\r\n--\xff'), 'text',
+                                          Attachment(file_name=self.file_name))
+
+class UploadService(DefinitionBase):
+    received = None
+
+    @soap(Attachment, Attachment, _returns=Integer)
+    def upload(self, small, large):
+        UploadService.received = (small, large)
+        return small.get_size() + large.get_size()
+
+_request_template = """<?xml version='1.0' encoding='utf-8'?>
+<senv:Envelope xmlns:senv="%s" xmlns:tns="tns">
+  <senv:Body><tns:%%s/></senv:Body>
+</senv:Envelope>""" % namespaces.ns_soap_env
+
 class TestBinary(unittest.TestCase):
     def setUp(self):
         os.mkdir('binaryDir')
@@ -85,6 +131,162 @@ class TestBinary(unittest.TestCase):
 
         self.assertEquals(data, fdata)
 
+    def test_iter_encoded(self):
+        data = ''.join([chr(i % 256) for i in xrange(binary.chunk_size * 2 + 7)])
+
+        a = Attachment(data=data)
+        self.assertEquals(''.join(a.iter_encoded()), base64.encodestring(data))
+
+        f = open(self.tmpfile, 'wb')
+        f.write(data)
+        f.close()
+
+        a = Attachment(file_name=self.tmpfile)
+        self.assertEquals(''.join(a.iter_encoded()), base64.encodestring(data))
+
+    def test_iter_encoded_empty_file(self):
+        open(self.tmpfile, 'wb').close()
+
+        a = Attachment(file_name=self.tmpfile)
+        self.assertEquals(list(a.iter_encoded()), [])
+
+    def test_stream(self):
+        StreamedAttachment = Attachment.customize(stream=True)
+
+        files = {}
+        binary.set_streamed_files(files)
+        try:
+            element = etree.Element('test')
+            StreamedAttachment.to_parent_element(
+                         Attachment(file_name=self.tmpfile), ns_test, element)
+        finally:
+            binary.set_streamed_files(None)
+        self.assertEquals(element[0].text, None)
+
+        xml_string = binary.StreamedDocument(etree.tostring(element), files)
+        self.assertTrue(binary.has_attachments(xml_string))
+
+        expanded = ''.join(binary.iter_expanded(xml_string))
+        self.assertEquals(len(expanded), binary.get_expanded_length(xml_string))
+
+        element = etree.Element('test')
+        Attachment.to_parent_element(Attachment(file_name=self.tmpfile),
+                                                                ns_test, element)
+        self.assertEquals(expanded, etree.tostring(element))
+
+        # the files are read up to the size they had when they were
+        # serialized.
+        f = open(self.tmpfile, 'ab')
+        f.write('x' * 100)
+        f.close()
+        self.assertEquals(''.join(binary.iter_expanded(xml_string)), expanded)
+        self.assertEquals(len(expanded), binary.get_expanded_length(xml_string))
+
+    def test_spool(self):
+        SpooledAttachment = Attachment.customize(spool=True)
+
+        f = open(self.tmpfile, 'rb')
+        data = f.read()
+        f.close()
+
+        element = etree.Element('test')
+        Attachment.to_parent_element(Attachment(data=data), ns_test, element)
+
+        a = SpooledAttachment.from_xml(element[0])
+        try:
+            self.assertEquals(a.data, None)
+            a.load_from_file()
+            self.assertEquals(a.data, data)
+
+        finally:
+            os.unlink(a.file_name)
+
+    def test_save_to_file(self):
+        data = os.urandom(binary.chunk_size * 2 + 1)
+
+        a = Attachment(data=data, file_name=self.tmpfile)
+        a.save_to_file()
+
+        b = Attachment(file_name=self.tmpfile)
+        b.load_from_file()
+        self.assertEquals(b.data, data)
+
+    def test_decode_to_file(self):
+        data = 'All work and no play makes jack a dull boy' * 5000
+        encoded = base64.b64encode(data)
+        text = ' \n'.join([encoded[i:i + 61] for i in xrange(0, len(encoded), 61)])
+
+        f = cStringIO.StringIO()
+        Attachment.decode_to_file(text, f)
+        self.assertEquals(f.getvalue(), data)
+
+        self.assertRaises(ValueError, Attachment.decode_to_file, text[:-2],
+                                                          cStringIO.StringIO())
+
+    def _call_wsgi(self, service, method_name, request=None):
+        service.file_name = self.tmpfile
+        server = wsgi.Application(Application([service], 'tns'))
+        if request is None:
+            request = _request_template % method_name
+
+        headers = []
+        def start_response(status, response_headers):
+            headers.extend(response_headers)
+
+        chunks = server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(request),
+            'CONTENT_LENGTH': str(len(request)),
+            'CONTENT_TYPE': 'text/xml; charset=utf-8',
+        }, start_response)
+
+        response = ''.join(chunks)
+        headers = dict(headers)
+        self.assertEquals(str(len(response)), headers['Content-Length'])
+
+        return headers, response
+
+    def test_wsgi_stream(self):
+        headers, response = self._call_wsgi(StreamingService, 'get_file')
+
+        element = etree.fromstring(response).find('.//{tns}get_fileResult')
+        self.assertEquals(Attachment.from_xml(element).data,
+                                                    open(self.tmpfile).read())
+
+    def test_wsgi_placeholder(self):
+        """The placeholders that come from the request are not expanded."""
+
+        for target in (self.tmpfile, '0' * 32):
+            request = _request_template.replace('<tns:%s/>',
+                '<tns:echo><tns:value><x><?soaplib-attachment %s?></x>'
+                '</tns:value></tns:echo>' % target)
+
+            headers, response = self._call_wsgi(EchoService, 'echo', request)
+            self.assertTrue('<?soaplib-attachment %s?>' % target in response)
+
+    def test_wsgi_mtom(self):
+        headers, response = self._call_wsgi(MtomService, 'get_files')
+
+        msg = message_from_string('Content-Type: %s\r\n\r\n%s' % (
+                                             headers['Content-Type'], response))
+        self.assertTrue(msg.is_multipart())
+
+        root, data, file_data = msg.get_payload()
+        self.assertEquals(root.get_content_type(), 'application/xop+xml')
+        self.assertEquals(data.get_payload(), '\x00\r\n--\xff')
+        self.assertEquals(file_data.get_payload(), open(self.tmpfile).read())
+
+        envelope = etree.fromstring(root.get_payload())
+        includes = envelope.findall('.//{%s}Include' % namespaces.ns_xop)
+        self.assertEquals([i.get('href') for i in includes],
+                  ['cid:%s' % data['Content-ID'].strip('<>'),
+                   'cid:%s' % file_data['Content-ID'].strip('<>')])
+
     def test_exception(self):
         try:
             Attachment.to_parent_element(Attachment(), ns_test)
@@ -119,5 +321,154 @@ class TestBinary(unittest.TestCase):
         dt = Attachment.get_namespace()
         assert dt == namespaces.ns_xsd
 
+class SlowStream(object):
+    """Returns at most a handful of bytes per read() call."""
+
+    def __init__(self, data):
+        self.stream = cStringIO.StringIO(data)
+        self.n = 0
+
+    def read(self, size):
+        self.n += 1
+        return self.stream.read(min(size, 1 + self.n % 7))
+
+_upload_envelope = """<?xml version='1.0' encoding='utf-8'?>
+<senv:Envelope xmlns:senv="%s" xmlns:tns="tns" xmlns:xop="%s">
+  <senv:Body><tns:upload>
+    <tns:small><xop:Include href="cid:small%%40soaplib"/></tns:small>
+    <tns:large><xop:Include href="cid:large"/></tns:large>
+  </tns:upload></senv:Body>
+</senv:Envelope>""" % (namespaces.ns_soap_env, namespaces.ns_xop)
+
+class TestMultipart(unittest.TestCase):
+    def setUp(self):
+        self.spool_size = mime.spool_size
+        mime.spool_size = 1000
+
+        self.small = '\x00\r\n--\xff'
+        self.large = ''.join([chr(i % 256) for i in xrange(5000)])
+
+    def tearDown(self):
+        mime.spool_size = self.spool_size
+
+    def _make_message(self, newline='\r\n', large_encoding='binary'):
+        large = self.large
+        if large_encoding == 'base64':
+            large = base64.encodestring(large)
+
+        message = newline.join([
+            'preamble',
+            '--boundary',
+            'Content-Type: application/xop+xml; charset=utf-8; type="text/xml"',
+            'Content-ID: <root>',
+            '',
+            _upload_envelope,
+            '--boundary',
+            'Content-Type: application/octet-stream',
+            'Content-ID: <small@soaplib>',
+            '',
+            self.small,
+            '--boundary  ',
+            'Content-Type: application/octet-stream',
+            'Content-Transfer-Encoding: %s' % large_encoding,
+            'Content-ID: <large>',
+            '',
+            large,
+            '--boundary--',
+            'epilogue',
+        ])
+        content_type = ('multipart/related', {'boundary': 'boundary',
+                                 'start': '<root>', 'type': 'application/xop+xml'})
+
+        return message, content_type
+
+    def test_parse(self):
+        for newline in ('\r\n', '\n'):
+            for encoding in ('binary', 'base64'):
+                message, content_type = self._make_message(newline, encoding)
+
+                root, charset, parts = mime.parse_multipart(
+                            SlowStream(message), content_type, len(message))
+                try:
+                    self.assertEquals(root, _upload_envelope)
+                    self.assertEquals(charset, 'utf-8')
+                    self.assertEquals(sorted(parts.keys()),
+                                        ['cid:large', 'cid:small@soaplib'])
+
+                    small = parts['cid:small@soaplib']
+                    self.assertEquals(small.data, self.small)
+
+                    large = parts['cid:large']
+                    self.assertEquals(large.data, None)
+                    large.load_from_file()
+                    self.assertEquals(large.data, self.large)
+
+                finally:
+                    mime.remove_spooled_parts(parts)
+
+                self.assertFalse(os.path.exists(large.file_name))
+
+    def test_parse_truncated(self):
+        message, content_type = self._make_message()
+
+        self.assertRaises(ValueError, mime.parse_multipart,
+                 cStringIO.StringIO(message), content_type, len(message) - 20)
+
+    def test_wsgi(self):
+        server = wsgi.Application(Application([UploadService], 'tns'))
+        message, content_type = self._make_message()
+
+        def start_response(status, response_headers):
+            self.assertEquals(status, wsgi.HTTP_200)
+
+        response = server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(message),
+            'CONTENT_LENGTH': str(len(message)),
+            'CONTENT_TYPE': 'multipart/related; boundary="boundary"; '
+                            'start="<root>"; type="application/xop+xml"',
+        }, start_response)
+
+        element = etree.fromstring(''.join(response)).find(
+                                                    './/{tns}uploadResult')
+        self.assertEquals(int(element.text), len(self.small) + len(self.large))
+
+        small, large = UploadService.received
+        self.assertEquals(small.data, self.small)
+        self.assertTrue(os.path.exists(large.file_name))
+
+        response.close()
+        self.assertFalse(os.path.exists(large.file_name))
+
+    def test_wsgi_truncated(self):
+        server = wsgi.Application(Application([UploadService], 'tns'))
+        message, content_type = self._make_message()
+        status = []
+
+        def start_response(s, response_headers):
+            status.append(s)
+
+        response = server({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': cStringIO.StringIO(message[:len(message) // 2]),
+            'CONTENT_LENGTH': str(len(message)),
+            'CONTENT_TYPE': 'multipart/related; boundary="boundary"; '
+                            'start="<root>"; type="application/xop+xml"',
+        }, start_response)
+
+        self.assertEquals(status, [wsgi.HTTP_500])
+        fault = etree.fromstring(''.join(response)).find('.//faultcode')
+        self.assertTrue(fault.text.endswith('Client'))
+
 if __name__ == '__main__':
     unittest.main()
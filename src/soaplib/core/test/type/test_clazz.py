@@ -17,13 +17,24 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
 #
 
+import array
 import datetime
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from soaplib.core.model.clazz import ClassModel
 from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.exception import Fault
 
+from soaplib.core.model.primitive import Boolean
 from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Double
 from soaplib.core.model.primitive import Float
 from soaplib.core.model.primitive import Integer
 from soaplib.core.model.primitive import String
@@ -271,6 +282,248 @@ class TestClassModel(unittest.TestCase):
         assert nss_from_xml.number_1 == 100
         assert nss_from_xml.number_2 == 1000
 
+class TestDecodeAs(unittest.TestCase):
+    def setUp(self):
+        e = Employee()
+        e.name = 'bob'
+        e.employee_id = 3
+        e.addresses = [Address(city='istanbul'), Address(city='izmir')]
+
+        element = etree.Element('test')
+        Employee.to_parent_element(e, ns_test, element)
+        self.element = element[0]
+
+    def test_dict(self):
+        e = Employee.from_xml(self.element, 'dict')
+
+        self.assertEquals(dict, type(e))
+        self.assertEquals(sorted(Employee.get_flat_type_info().keys()),
+                                                                 sorted(e.keys()))
+        self.assertEquals('bob', e['name'])
+        self.assertEquals(3, e['employee_id'])
+        self.assertEquals(None, e['salary'])
+        self.assertEquals(['istanbul', 'izmir'],
+                                          [a['city'] for a in e['addresses']])
+
+    def test_namedtuple(self):
+        e = Employee.from_xml(self.element, 'namedtuple')
+
+        self.assertEquals(tuple(Employee.get_flat_type_info().keys()),
+                                                                    e._fields)
+        self.assertEquals('bob', e.name)
+        self.assertEquals(3, e.employee_id)
+        self.assertEquals(None, e.salary)
+        self.assertEquals(['istanbul', 'izmir'],
+                                            [a.city for a in e.addresses])
+
+        # namedtuple classes are generated once per ClassModel
+        e2 = Employee.from_xml(self.element, 'namedtuple')
+        self.assertTrue(type(e) is type(e2))
+        self.assertTrue(type(e.addresses[0]) is type(e2.addresses[1]))
+
+    def test_instance(self):
+        e = Employee.from_xml(self.element, 'instance')
+
+        self.assertTrue(isinstance(e, Employee))
+        # array members are customized duplicates of their classes
+        self.assertEquals('Address', e.addresses[0].__class__.__name__)
+
+class TestColumnarArray(unittest.TestCase):
+    def setUp(self):
+        self.type = Array(Employee)
+        self.type.resolve_namespace(self.type, __name__)
+
+    def assert_employees(self, element):
+        self.assertEquals(3, len(element))
+
+        peeps = self.type.from_xml(element)
+        self.assertEquals(['bob', 'jim', None], [p.name for p in peeps])
+        self.assertEquals([1, 2, 3], [p.employee_id for p in peeps])
+        self.assertEquals([None, None, None], [p.salary for p in peeps])
+
+    def test_columns(self):
+        columns = Columns({
+            'name': ['bob', 'jim', None],
+            'employee_id': [1, 2, 3],
+        })
+        self.assertEquals(3, len(columns))
+
+        element = etree.Element('test')
+        self.type.to_parent_element(columns, ns_test, element)
+
+        self.assert_employees(element[0])
+
+    def test_columns_length_mismatch(self):
+        self.assertRaises(ValueError, Columns, {'name': ['bob'],
+                                                'employee_id': [1, 2]})
+
+    def test_rows(self):
+        rows = Rows(('employee_id', 'name'),
+                            iter([(1, 'bob'), (2, 'jim'), (3, None)]))
+
+        element = etree.Element('test')
+        self.type.to_parent_element(rows, ns_test, element)
+
+        self.assert_employees(element[0])
+
+    def test_dicts_and_tuples(self):
+        peeps = [
+            {'name': 'bob', 'employee_id': 1},
+            {'name': 'jim', 'employee_id': 2},
+            {'employee_id': 3},
+        ]
+
+        element = etree.Element('test')
+        self.type.to_parent_element(peeps, ns_test, element)
+
+        self.assert_employees(element[0])
+
+        type = Array(Level3)
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element([(1,), (2,)], ns_test, element)
+
+        self.assertEquals([1, 2], [l.arg1 for l in type.from_xml(element[0])])
+
+    def test_decode_as_columns(self):
+        peeps = []
+        for i in range(3):
+            e = Employee()
+            e.name = str(i)
+            e.employee_id = i
+            e.titles = ['t%d' % i]
+            peeps.append(e)
+
+        element = etree.Element('test')
+        self.type.to_parent_element(peeps, ns_test, element)
+
+        type = Array(Employee, decode_as='columns')
+        type.resolve_namespace(type, __name__)
+        columns = type.from_xml(element[0])
+
+        self.assertTrue(isinstance(columns, Columns))
+        self.assertEquals(3, len(columns))
+        self.assertEquals(['0', '1', '2'], columns['name'])
+        self.assertEquals([0, 1, 2], columns['employee_id'])
+        self.assertEquals([None, None, None], columns['salary'])
+        self.assertEquals([['t0'], ['t1'], ['t2']], columns['titles'])
+
+        # columns can be serialized as they are
+        element = etree.Element('test')
+        self.type.to_parent_element(columns, ns_test, element)
+        self.assertEquals(['0', '1', '2'],
+                                   [p.name for p in self.type.from_xml(element[0])])
+
+    def test_decode_as_columns_invalid(self):
+        self.assertRaises(ValueError, Array, Integer, decode_as='columns')
+
+class TestTypedArray(unittest.TestCase):
+    def test_array_array(self):
+        type = Array(Integer)
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element(array.array('l', [1, 2, 3]), ns_test, element)
+        element = element[0]
+
+        self.assertEquals(3, len(element))
+        self.assertEquals(['1', '2', '3'], [e.text for e in element])
+        self.assertEquals('{%s}integer' % type.get_namespace(), element[0].tag)
+        self.assertEquals([1, 2, 3], type.from_xml(element))
+
+    def test_array_array_in_class(self):
+        class Measurements(ClassModel):
+            values = Array(Double)
+            flags = Array(Boolean)
+
+        Measurements.resolve_namespace(Measurements, __name__)
+
+        m = Measurements()
+        m.values = array.array('d', [0.5, 1.5])
+        m.flags = array.array('b', [1, 0])
+
+        element = etree.Element('test')
+        Measurements.to_parent_element(m, ns_test, element)
+        element = element[0]
+
+        m2 = Measurements.from_xml(element)
+        self.assertEquals([0.5, 1.5], m2.values)
+        self.assertEquals([True, False], m2.flags)
+
+    def test_empty_array_array(self):
+        type = Array(Double)
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element(array.array('d'), ns_test, element)
+
+        self.assertEquals(0, len(element[0]))
+
+    def test_decode_as_array(self):
+        type = Array(Double, decode_as='array')
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element([1.0, 2.5], ns_test, element)
+        element = element[0]
+
+        retval = type.from_xml(element)
+        self.assertTrue(isinstance(retval, array.array))
+        self.assertEquals('d', retval.typecode)
+        self.assertEquals([1.0, 2.5], retval.tolist())
+
+    def test_decode_as_array_nil(self):
+        type = Array(Integer, decode_as='array')
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element([1, None], ns_test, element)
+
+        self.assertRaises(ValueError, type.from_xml, element[0])
+
+    def test_decode_as_array_overflow(self):
+        type = Array(Integer, decode_as='array')
+        type.resolve_namespace(type, __name__)
+
+        element = etree.Element('test')
+        type.to_parent_element([1, 2 ** 70], ns_test, element)
+
+        self.assertRaises(Fault, type.from_xml, element[0])
+
+    def test_decode_as_invalid(self):
+        self.assertRaises(ValueError, Array, String, decode_as='array')
+        self.assertRaises(ValueError, Array, Integer, decode_as='tuple')
+
+    if numpy is not None:
+        def test_ndarray(self):
+            type = Array(Double, decode_as='ndarray')
+            type.resolve_namespace(type, __name__)
+
+            element = etree.Element('test')
+            type.to_parent_element(numpy.arange(4) * 0.5, ns_test, element)
+            element = element[0]
+
+            self.assertEquals(['0.0', '0.5', '1.0', '1.5'],
+                                                      [e.text for e in element])
+
+            retval = type.from_xml(element)
+            self.assertTrue(isinstance(retval, numpy.ndarray))
+            self.assertEquals([0.0, 0.5, 1.0, 1.5], retval.tolist())
+
+        def test_ndarray_boolean(self):
+            type = Array(Boolean, decode_as='ndarray')
+            type.resolve_namespace(type, __name__)
+
+            element = etree.Element('test')
+            type.to_parent_element(numpy.array([True, False]), ns_test, element)
+            element = element[0]
+
+            self.assertEquals(['true', 'false'], [e.text for e in element])
+
+            retval = type.from_xml(element)
+            self.assertEquals(numpy.bool_, retval.dtype.type)
+            self.assertEquals([True, False], retval.tolist())
 
 if __name__ == '__main__':
     unittest.main()
@@ -32,6 +32,7 @@ from soaplib.core.model.primitive import Float
 from soaplib.core.model.primitive import Integer
 from soaplib.core.model.base import Null
 from soaplib.core.model.primitive import String
+from soaplib.core.util import iso8601
 from soaplib.core.util.duration import XmlDuration
 
 ns_test = 'test_namespace'
@@ -81,6 +82,81 @@ class TestPrimitive(unittest.TestCase):
         du = Duration.from_xml(element)
         self.assertEquals(dur.as_timedelta(), du)
 
+    def test_datetime_fraction(self):
+        e = etree.Element('test')
+
+        e.text = '2007-05-15T13:40:44.000001'
+        self.assertEquals(DateTime.from_xml(e).microsecond, 1)
+
+        e.text = '2007-05-15T13:40:44.1234567'
+        self.assertEquals(DateTime.from_xml(e).microsecond, 123456)
+
+        e.text = '2007-05-15T13:40:44.29'
+        self.assertEquals(DateTime.from_xml(e).microsecond, 290000)
+
+    def test_datetime_offset(self):
+        e = etree.Element('test')
+
+        e.text = '2007-05-15T13:40:44-05:30'
+        dt = DateTime.from_xml(e)
+        self.assertEquals(dt.utcoffset(), -datetime.timedelta(hours=5,
+                                                                minutes=30))
+
+        e.text = '2008-01-01T00:00:00-05:30'
+        self.assertTrue(DateTime.from_xml(e).tzinfo is dt.tzinfo)
+
+        e.text = '2007-05-15T13:40:44+00:00'
+        self.assertEquals(DateTime.from_xml(e).utcoffset(),
+                                                        datetime.timedelta(0))
+
+    def test_datetime_memo(self):
+        e = etree.Element('test')
+        e.text = '2007-05-15T13:40:44Z'
+
+        iso8601.set_memo_size(16)
+        try:
+            dt = DateTime.from_xml(e)
+            self.assertTrue(DateTime.from_xml(e) is dt)
+
+        finally:
+            iso8601.set_memo_size(0)
+
+        self.assertFalse(DateTime.from_xml(e) is dt)
+        self.assertEquals(DateTime.from_xml(e), dt)
+
+    def test_duration_edge_cases(self):
+        for string, delta in (
+                    ('PT0S', datetime.timedelta(0)),
+                    ('-PT1S', -datetime.timedelta(seconds=1)),
+                    ('PT0.000001S', datetime.timedelta(microseconds=1)),
+                    ('P1Y2M', datetime.timedelta(days=425)),
+                    ('P1DT2H3M4.5S', datetime.timedelta(days=1, hours=2,
+                                           minutes=3, seconds=4.5)),
+                ):
+            self.assertEquals(iso8601.parse_duration(string), delta)
+            self.assertEquals(XmlDuration.from_string(string).as_timedelta(),
+                                                                        delta)
+
+        for string in ('P', 'PT', 'P1DT', '1D', 'P1S', 'PT1.S', 'P-1D'):
+            self.assertRaises(ValueError, iso8601.parse_duration, string)
+            self.assertRaises(ValueError, XmlDuration.from_string, string)
+
+    def test_duration_format(self):
+        for delta, string in (
+                    (datetime.timedelta(0), 'PT0S'),
+                    (datetime.timedelta(microseconds=1), 'PT0.000001S'),
+                    (datetime.timedelta(seconds=-1), '-PT1S'),
+                    (datetime.timedelta(days=3), 'P3D'),
+                    (datetime.timedelta(hours=1, seconds=0.5), 'PT1H0.5S'),
+                ):
+            element = etree.Element('test')
+            Duration.to_parent_element(delta, ns_test, element)
+            self.assertEquals(element[0].text, string)
+            self.assertEquals(Duration.from_xml(element[0]), delta)
+
+        dur = XmlDuration.from_timedelta(datetime.timedelta(seconds=1.25))
+        self.assertEquals(str(dur), 'PT1.25S')
+
     def test_utcdatetime(self):
         datestring = '2007-05-15T13:40:44Z'
         e = etree.Element('test')
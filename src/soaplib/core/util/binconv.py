@@ -0,0 +1,755 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""A compact binary encoding of the values of soaplib models, for caching
+decoded objects and handing them to other processes.
+
+Unlike pickle, the encoding doesn't contain member names or class references:
+the members are in the order of the model's _type_info, and the types are
+implied by the model. Only the values of Any and AnyAsDict carry type tags.
+dumps prefixes the encoding with a fingerprint of the model's definition, and
+loads refuses encodings made with a different definition:
+
+    data = dumps(Person, person)
+    person = loads(Person, data)
+
+The encoding, from the outside in:
+
+    * Values that can be None are preceded by a byte that tells whether
+      they're there, except in ClassModels and lists.
+    * ClassModels start with a varint bit mask of the members that are not
+      None, then the present members follow.
+    * Arrays and members with max_occurs > 1 start with a varint of twice
+      their length, plus one when they contain None values. In that case, a
+      bitmap of the present items follows, then the present items.
+    * Integers are zigzag varints, Double and Float values are 8-byte
+      doubles and Booleans are single bytes.
+    * Strings are a varint of twice their length in bytes, plus one for
+      unicode strings, followed by their bytes, in utf-8 for unicode strings.
+      Decimals and Enum values are strings.
+    * Dates are their varint ordinal. DateTimes are their ordinal, their
+      microseconds since midnight and their utc offset. Durations are their
+      days, seconds and microseconds.
+    * Attachments are their data, or the name of their file when they have no
+      data.
+
+Typed arrays, Columns and Rows are encoded like lists, and the decode_as
+attributes and arguments are honored when decoding.
+"""
+
+import datetime
+import decimal
+import hashlib
+import struct
+
+from lxml import etree
+
+from soaplib.core.model import Null
+from soaplib.core.model import decode_targets
+from soaplib.core.model.binary import Attachment
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModelBase
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.clazz import XMLAttribute
+from soaplib.core.model.clazz import _get_namedtuple_class
+from soaplib.core.model.clazz import _to_typed_array
+from soaplib.core.model.enum import EnumBase
+from soaplib.core.model.primitive import Any
+from soaplib.core.model.primitive import Boolean
+from soaplib.core.model.primitive import Date
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Duration
+from soaplib.core.model.primitive import Integer
+from soaplib.core.util import iso8601
+from soaplib.core.util.duration import XmlDuration
+from soaplib.core.util.jsonconv import _get_codec
+from soaplib.core.util.jsonconv import _get_kind
+from soaplib.core.util.jsonconv import _is_multiple
+
+fingerprint_length = 8
+
+_packers = {}
+_unpackers = {}
+_fingerprints = {}
+
+_double = struct.Struct('!d')
+_chr = [chr(i) for i in range(256)]
+
+def dumps(cls, value):
+    """Returns the encoding of the given value of the given model, prefixed
+    with the fingerprint of the model."""
+
+    out = [get_fingerprint(cls)]
+    _pack_optional(get_packer(cls), value, out)
+
+    return ''.join(out)
+
+def loads(cls, data, decode_as=None):
+    """Decodes a value of the given model from the return value of dumps.
+    Raises ValueError when the data is invalid, or was encoded with a
+    different definition of the model.
+
+    @param What ClassModels are decoded to. See
+           soaplib.core.model.base.decode_targets.
+    """
+
+    if data[:fingerprint_length] != get_fingerprint(cls):
+        raise ValueError("The data wasn't encoded with this definition of %r"
+                                                        % cls.get_type_name())
+
+    reader = _Reader(data, fingerprint_length)
+    try:
+        retval = None
+        if reader.byte():
+            retval = get_unpacker(cls, decode_as)(reader)
+
+    except (IndexError, struct.error), e:
+        raise ValueError("Truncated data: %s" % e)
+
+    if reader.pos != len(data):
+        raise ValueError("%d bytes of trailing data" % (len(data) - reader.pos))
+
+    return retval
+
+def get_fingerprint(cls):
+    """Returns a digest of the definition of the given model: the kinds of
+    its values, and the names, order, multiplicity and definitions of its
+    members."""
+
+    retval = _fingerprints.get(cls, None)
+    if retval is None:
+        definition = []
+        _describe(cls, definition, {})
+        retval = hashlib.md5(''.join(definition)).digest()[:fingerprint_length]
+        _fingerprints[cls] = retval
+
+    return retval
+
+def _describe(cls, out, seen):
+    kind = _get_kind(cls)
+    out.append(kind.__name__)
+
+    if issubclass(kind, Array):
+        (serializer,) = cls._type_info.values()
+        out.append('[')
+        _describe(serializer, out, seen)
+        out.append(']')
+
+    elif issubclass(kind, ClassModelBase):
+        # recursive models refer to themselves by the depth they're at.
+        if cls in seen:
+            out.append('@%d' % seen[cls])
+            return
+
+        seen[cls] = len(seen)
+        out.append('{')
+        for k, v in cls.get_flat_type_info().items():
+            out.append('%s:' % k)
+            if isinstance(v, XMLAttribute):
+                out.append('@;')
+                continue
+
+            if _is_multiple(v):
+                out.append('*')
+            _describe(v, out, seen)
+            out.append(';')
+        out.append('}')
+        del seen[cls]
+
+    elif issubclass(kind, EnumBase):
+        # the values are attributes of the class, see model.enum.Enum.
+        values = [k for k, v in cls.__dict__.items()
+                                          if type(v).__name__ == 'EnumValue']
+        values.sort(key=lambda k: getattr(cls, k))
+        out.append('(%s)' % ','.join(values))
+
+def get_packer(cls):
+    """Returns a function that takes a value of the given model, which can't
+    be None, and a list, and appends the encoding of the value to the list."""
+
+    retval = _packers.get(cls, None)
+    if retval is None:
+        retval = _get_codec(_packers, cls, _build_packer, cls)
+
+    return retval
+
+def get_unpacker(cls, decode_as=None):
+    """Returns a function that decodes a value of the given model from a
+    _Reader."""
+
+    if decode_as == 'instance':
+        decode_as = None
+
+    key = (cls, decode_as)
+    retval = _unpackers.get(key, None)
+    if retval is None:
+        if not (decode_as is None or decode_as in decode_targets):
+            raise ValueError("decode_as must be one of %r, not %r" %
+                                                   (decode_targets, decode_as))
+
+        retval = _get_codec(_unpackers, key, _build_unpacker, cls, decode_as)
+
+    return retval
+
+class _Reader(object):
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def byte(self):
+        retval = ord(self.data[self.pos])
+        self.pos += 1
+        return retval
+
+    def read(self, n):
+        pos = self.pos
+        retval = self.data[pos:pos + n]
+        if len(retval) < n:
+            raise IndexError("%d bytes missing" % (n - len(retval)))
+
+        self.pos = pos + n
+        return retval
+
+    def varint(self):
+        data = self.data
+        pos = self.pos
+
+        b = ord(data[pos])
+        pos += 1
+        if b < 0x80:
+            self.pos = pos
+            return b
+
+        retval = b & 0x7f
+        shift = 7
+        while True:
+            b = ord(data[pos])
+            pos += 1
+            retval |= (b & 0x7f) << shift
+            if b < 0x80:
+                break
+            shift += 7
+
+        self.pos = pos
+        return retval
+
+    def zigzag(self):
+        z = self.varint()
+        if z & 1:
+            return -((z + 1) >> 1)
+        return z >> 1
+
+#
+# primitives
+#
+
+def _pack_varint(n, out):
+    if n < 0x80:
+        out.append(_chr[n])
+        return
+
+    b = []
+    while n >= 0x80:
+        b.append(_chr[(n & 0x7f) | 0x80])
+        n >>= 7
+    b.append(_chr[n])
+    out.append(''.join(b))
+
+def _pack_zigzag(n, out):
+    if n >= 0:
+        _pack_varint(n << 1, out)
+    else:
+        _pack_varint((-n << 1) - 1, out)
+
+def _pack_optional(pack, value, out):
+    if value is None:
+        out.append('\x00')
+    else:
+        out.append('\x01')
+        pack(value, out)
+
+def _pack_string(value, out):
+    if isinstance(value, unicode):
+        value = value.encode('utf8')
+        _pack_varint((len(value) << 1) | 1, out)
+    else:
+        value = str(value)
+        _pack_varint(len(value) << 1, out)
+
+    out.append(value)
+
+def _unpack_string(reader):
+    n = reader.varint()
+    retval = reader.read(n >> 1)
+    if n & 1:
+        return retval.decode('utf8')
+
+    return retval
+
+def _pack_integer(value, out):
+    _pack_zigzag(int(value), out)
+
+def _pack_double(value, out):
+    out.append(_double.pack(value))
+
+def _unpack_double(reader):
+    return _double.unpack(reader.read(8))[0]
+
+def _pack_boolean(value, out):
+    if value:
+        out.append('\x01')
+    else:
+        out.append('\x00')
+
+def _unpack_boolean(reader):
+    return reader.byte() != 0
+
+def _pack_decimal(value, out):
+    _pack_string(str(value), out)
+
+def _unpack_decimal(reader):
+    return decimal.Decimal(_unpack_string(reader))
+
+def _pack_date(value, out):
+    _pack_varint(value.toordinal(), out)
+
+def _unpack_date(reader):
+    return datetime.date.fromordinal(reader.varint())
+
+def _pack_datetime(value, out):
+    _pack_varint(value.toordinal(), out)
+    _pack_varint(((value.hour * 60 + value.minute) * 60 + value.second)
+                                          * 1000000 + value.microsecond, out)
+
+    # naive values are 0, utc offsets in minutes are zigzagged and shifted.
+    offset = value.utcoffset()
+    if offset is None:
+        out.append('\x00')
+    else:
+        minutes = (offset.days * 86400 + offset.seconds) // 60
+        _pack_varint((minutes >= 0 and (minutes << 1) or (-minutes << 1) - 1)
+                                                                      + 1, out)
+
+def _unpack_datetime(reader):
+    date = datetime.date.fromordinal(reader.varint())
+    seconds, microsecond = divmod(reader.varint(), 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+
+    tzinfo = None
+    z = reader.varint()
+    if z:
+        z -= 1
+        if z & 1:
+            tzinfo = iso8601.get_fixed_offset(-((z + 1) >> 1))
+        else:
+            tzinfo = iso8601.get_fixed_offset(z >> 1)
+
+    return datetime.datetime(date.year, date.month, date.day, hour, minute,
+                                            second, microsecond, tzinfo)
+
+def _pack_duration(value, out):
+    # the other representations are accepted like in xml.
+    if not isinstance(value, datetime.timedelta):
+        value = iso8601.parse_duration(str(XmlDuration.parse(value)))
+
+    _pack_zigzag(value.days, out)
+    _pack_varint(value.seconds, out)
+    _pack_varint(value.microseconds, out)
+
+def _unpack_duration(reader):
+    return datetime.timedelta(reader.zigzag(), reader.varint(),
+                                                               reader.varint())
+
+def _pack_attachment(value, out):
+    if value.data is None and value.file_name is not None:
+        out.append('\x01')
+        _pack_string(value.file_name, out)
+    else:
+        out.append('\x00')
+        _pack_string(''.join(value.iter_data()), out)
+
+def _build_attachment_unpacker(cls):
+    def retval(reader):
+        if reader.byte():
+            return cls(file_name=_unpack_string(reader))
+        return cls(data=_unpack_string(reader))
+
+    return retval
+
+def _build_enum_unpacker(cls):
+    def retval(reader):
+        return getattr(cls, _unpack_string(reader))
+
+    return retval
+
+#
+# Any and AnyAsDict values, which are tagged
+#
+
+_tag_none = '\x00'
+_tag_false = '\x01'
+_tag_true = '\x02'
+_tag_int = '\x03'
+_tag_float = '\x04'
+_tag_string = '\x05'
+_tag_list = '\x06'
+_tag_dict = '\x07'
+_tag_element = '\x08'
+
+def _pack_tagged(value, out):
+    if value is None:
+        out.append(_tag_none)
+
+    elif value is True:
+        out.append(_tag_true)
+
+    elif value is False:
+        out.append(_tag_false)
+
+    elif isinstance(value, (int, long)):
+        out.append(_tag_int)
+        _pack_zigzag(value, out)
+
+    elif isinstance(value, float):
+        out.append(_tag_float)
+        _pack_double(value, out)
+
+    elif isinstance(value, basestring):
+        out.append(_tag_string)
+        _pack_string(value, out)
+
+    elif isinstance(value, (list, tuple)):
+        out.append(_tag_list)
+        _pack_varint(len(value), out)
+        for v in value:
+            _pack_tagged(v, out)
+
+    elif isinstance(value, dict):
+        out.append(_tag_dict)
+        _pack_varint(len(value), out)
+        for k, v in value.iteritems():
+            _pack_tagged(k, out)
+            _pack_tagged(v, out)
+
+    elif isinstance(value, etree._Element):
+        out.append(_tag_element)
+        _pack_string(etree.tostring(value), out)
+
+    else:
+        raise TypeError("Can't encode %r" % value)
+
+def _unpack_tagged(reader):
+    tag = reader.read(1)
+
+    if tag == _tag_none:
+        return None
+    elif tag == _tag_true:
+        return True
+    elif tag == _tag_false:
+        return False
+    elif tag == _tag_int:
+        return reader.zigzag()
+    elif tag == _tag_float:
+        return _unpack_double(reader)
+    elif tag == _tag_string:
+        return _unpack_string(reader)
+    elif tag == _tag_list:
+        return [_unpack_tagged(reader) for i in xrange(reader.varint())]
+    elif tag == _tag_dict:
+        retval = {}
+        for i in xrange(reader.varint()):
+            k = _unpack_tagged(reader)
+            retval[k] = _unpack_tagged(reader)
+        return retval
+    elif tag == _tag_element:
+        return etree.fromstring(_unpack_string(reader))
+
+    raise ValueError("Unknown tag: %r" % tag)
+
+#
+# lists and ClassModels
+#
+
+def _build_list_packer(member):
+    pack = get_packer(member)
+    is_class = issubclass(_get_kind(member), ClassModelBase)
+
+    def retval(values, out):
+        getter = None
+        if isinstance(values, (Columns, Rows)):
+            values, getter = values.get_rows()
+            values = list(values)
+
+        elif hasattr(values, 'tolist'): # array.array or numpy.ndarray
+            values = values.tolist()
+
+        n = len(values)
+
+        # 'in' would compare the values with None, which not all of them
+        # support.
+        has_none = False
+        if getter is None:
+            for v in values:
+                if v is None:
+                    has_none = True
+                    break
+
+        if not has_none:
+            _pack_varint(n << 1, out)
+            present = values
+
+        else:
+            _pack_varint((n << 1) | 1, out)
+            bitmap = bytearray((n + 7) >> 3)
+            present = []
+            for i, v in enumerate(values):
+                if v is not None:
+                    bitmap[i >> 3] |= 1 << (i & 7)
+                    present.append(v)
+            out.append(str(bitmap))
+
+        if getter is None:
+            for v in present:
+                pack(v, out)
+        else:
+            for v in present:
+                pack(v, out, getter)
+
+    return retval
+
+def _build_list_unpacker(member, decode_as, container=None):
+    unpack = get_unpacker(member, decode_as)
+
+    def retval(reader):
+        n = reader.varint()
+        if not (n & 1):
+            return [unpack(reader) for i in xrange(n >> 1)]
+
+        n >>= 1
+        bitmap = bytearray(reader.read((n + 7) >> 3))
+        values = [None] * n
+        for i in xrange(n):
+            if bitmap[i >> 3] & (1 << (i & 7)):
+                values[i] = unpack(reader)
+
+        return values
+
+    if container is None:
+        return retval
+
+    if container == 'columns':
+        unpack = get_unpacker(member, 'dict')
+        keys = member.get_flat_type_info().keys()
+
+        def to_container(reader):
+            rows = [row or dict.fromkeys(keys) for row in retval(reader)]
+            return Columns(dict([(k, [row[k] for row in rows])
+                                                             for k in keys]))
+
+    else:
+        typecode = member.__typecode__
+
+        def to_container(reader):
+            values = retval(reader)
+            if None in values:
+                raise ValueError("Nil values can't be decoded into %r" %
+                                                                      container)
+
+            return _to_typed_array(values, typecode, container)
+
+    return to_container
+
+def _build_class_packer(cls):
+    members = []
+    for k, v in cls.get_flat_type_info().items():
+        if isinstance(v, XMLAttribute):
+            members.append((k, _pack_string))
+        elif _is_multiple(v):
+            members.append((k, _build_list_packer(v)))
+        else:
+            members.append((k, get_packer(v)))
+
+    keys = cls._type_info.keys()
+    indexes = dict([(k, i) for i, k in enumerate(keys)])
+
+    def sequence_getter(inst, key, default):
+        i = indexes.get(key, None)
+        if i is None or i >= len(inst):
+            return default
+        return inst[i]
+
+    def retval(value, out, getter=None):
+        # lists, tuples and dicts are encoded as they are, like in
+        # ClassModelBase.to_parent_element.
+        if getter is None:
+            if isinstance(value, dict):
+                getter = dict.get
+            elif isinstance(value, (list, tuple)):
+                getter = sequence_getter
+            else:
+                getter = getattr
+
+        mask = 0
+        bit = 1
+        present = []
+        for k, pack in members:
+            v = getter(value, k, None)
+            if v is not None:
+                mask |= bit
+                present.append((pack, v))
+            bit <<= 1
+
+        _pack_varint(mask, out)
+        for pack, v in present:
+            pack(v, out)
+
+    return retval
+
+def _build_class_unpacker(cls, decode_as):
+    members = []
+    for k, v in cls.get_flat_type_info().items():
+        if isinstance(v, XMLAttribute):
+            members.append((k, _unpack_string))
+        elif _is_multiple(v):
+            members.append((k, _build_list_unpacker(v, decode_as)))
+        else:
+            members.append((k, get_unpacker(v, decode_as)))
+
+    keys = [k for k, unpack in members]
+    if decode_as == 'namedtuple':
+        namedtuple_class = _get_namedtuple_class(cls)
+
+    # the instances are filled in directly, unless the class has its own way
+    # to create them.
+    default_instance = (cls.get_deserialization_instance.im_func is
+                        ClassModelBase.get_deserialization_instance.im_func)
+
+    def retval(reader):
+        mask = reader.varint()
+
+        if decode_as is None and default_instance:
+            inst = cls.__new__(cls)
+            d = inst.__dict__
+            for k, unpack in members:
+                if mask & 1:
+                    d[k] = unpack(reader)
+                else:
+                    d[k] = None
+                mask >>= 1
+
+            return inst
+
+        if decode_as is None:
+            inst = cls.get_deserialization_instance()
+            for k, unpack in members:
+                if mask & 1:
+                    setattr(inst, k, unpack(reader))
+                mask >>= 1
+
+            return inst
+
+        inst = dict.fromkeys(keys)
+        for k, unpack in members:
+            if mask & 1:
+                inst[k] = unpack(reader)
+            mask >>= 1
+
+        if decode_as == 'namedtuple':
+            return namedtuple_class._make([inst[k] for k in keys])
+
+        return inst
+
+    return retval
+
+def _build_packer(cls):
+    kind = _get_kind(cls)
+
+    if issubclass(kind, Array):
+        (serializer,) = cls._type_info.values()
+        return _build_list_packer(serializer)
+
+    if issubclass(kind, ClassModelBase):
+        return _build_class_packer(cls)
+
+    if issubclass(kind, Null):
+        return lambda value, out: None
+
+    if issubclass(kind, Attachment):
+        return _pack_attachment
+    elif issubclass(kind, EnumBase):
+        return lambda value, out: _pack_string(str(value), out)
+    elif issubclass(kind, Any): # and AnyAsDict
+        return _pack_tagged
+    elif issubclass(kind, Boolean):
+        return _pack_boolean
+    elif issubclass(kind, Integer):
+        return _pack_integer
+    elif issubclass(kind, Decimal):
+        return _pack_decimal
+    elif issubclass(kind, Double):
+        return _pack_double
+    elif issubclass(kind, DateTime):
+        return _pack_datetime
+    elif issubclass(kind, Date):
+        return _pack_date
+    elif issubclass(kind, Duration):
+        return _pack_duration
+
+    return _pack_string
+
+def _build_unpacker(cls, decode_as):
+    kind = _get_kind(cls)
+
+    if issubclass(kind, Array):
+        (serializer,) = cls._type_info.values()
+        return _build_list_unpacker(serializer, decode_as,
+                                                   cls.Attributes.decode_as)
+
+    if issubclass(kind, ClassModelBase):
+        return _build_class_unpacker(cls, decode_as)
+
+    if issubclass(kind, Null):
+        return lambda reader: None
+
+    if issubclass(kind, Attachment):
+        return _build_attachment_unpacker(cls)
+    elif issubclass(kind, EnumBase):
+        return _build_enum_unpacker(cls)
+    elif issubclass(kind, Any): # and AnyAsDict
+        return _unpack_tagged
+    elif issubclass(kind, Boolean):
+        return _unpack_boolean
+    elif issubclass(kind, Integer):
+        return lambda reader: reader.zigzag()
+    elif issubclass(kind, Decimal):
+        return _unpack_decimal
+    elif issubclass(kind, Double):
+        return _unpack_double
+    elif issubclass(kind, DateTime):
+        return _unpack_datetime
+    elif issubclass(kind, Date):
+        return _unpack_date
+    elif issubclass(kind, Duration):
+        return _unpack_duration
+
+    return _unpack_string
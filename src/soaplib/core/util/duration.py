@@ -19,6 +19,9 @@
 
 import datetime
 
+from soaplib.core.util.iso8601 import format_seconds
+from soaplib.core.util.iso8601 import parse_duration_fields
+
 class XmlDuration(object):
     """Handles the conversion between soap duration and python timedelta."""
     __seq1 = [("Y", "years"), ("M", "months"), ("D", "days")]
@@ -38,7 +41,7 @@ class XmlDuration(object):
         seconds = int(self.seconds)
         microseconds = 1000000 * (self.seconds - seconds)
         days = self.days + self.months * 30 + self.years * 365
-        res = datetime.timedelta(days=self.days,
+        res = datetime.timedelta(days=days,
                                  hours=self.hours,
                                  minutes=self.minutes,
                                  seconds=seconds,
@@ -54,7 +57,12 @@ class XmlDuration(object):
                 n = getattr(self, attr)
                 assert n >= 0 and (n == round(n) or attr == "seconds")
                 if n:
-                    str += (n == round(n) and "%i%s" or "%s%s") % (n, s)
+                    if n == round(n):
+                        str += "%i%s" % (n, s)
+                    else:
+                        seconds = int(n)
+                        str += "%s%s" % (format_seconds(seconds,
+                                   int(round((n - seconds) * 1000000))), s)
 
             return str
 
@@ -100,59 +108,15 @@ class XmlDuration(object):
             negative = True
         else:
             negative = False
-        seconds = float(timedelta.seconds) + timedelta.microseconds / 1000000
+        seconds = float(timedelta.seconds) + timedelta.microseconds / 1000000.0
         return cls(days=timedelta.days, seconds=seconds, negative=negative)
 
     @classmethod
     def from_string(cls, string):
-        orig_str = string
-        ret = cls()
-
-        def parse_token(string):
-            n = "0"
-
-            for i in range(len(string)):
-                if string[i].isdigit() or string[i] == ".":
-                    n += string[i]
-                else:
-                    break
-
-            return (float(n), string[i], string[i + 1:])
-
-        def parse_seq(string, seq):
-            i = 0
-            while string:
-                n, s, string = parse_token(string)
-
-                while i < len(seq):
-                    s1, attr = seq[i]
-                    i += 1
-                    if s == s1:
-                        if n >= 0 and (n == round(n) or attr == "seconds"):
-                            setattr(ret, attr, n)
-                            break
-                        else:
-                            raise Exception
-                else:
-                    raise Exception
-
-        try:
-            if string.startswith("-"):
-                ret.negative = True
-                string = string[1:]
-
-            if string.startswith("P"):
-                string = string[1:]
-            else:
-                raise Exception
-
-            str1, _, str2 = string.partition("T")
-            if not (str1 or str2):
-                raise Exception
-            parse_seq(str1, cls.__seq1)
-            parse_seq(str2, cls.__seq2)
-
-        except:
-            raise ValueError("Duration %r not in correct format" % orig_str)
+        (negative, years, months, days, hours, minutes, seconds, microseconds) \
+                                                = parse_duration_fields(string)
 
-        return ret
+        if microseconds:
+            seconds += microseconds / 1000000.0
+
+        return cls(years, months, days, hours, minutes, seconds, negative)
@@ -0,0 +1,74 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Length-prefixed framing for stream sockets.
+
+A frame is a 6-byte header followed by two fields: an optional name of at most
+65535 bytes and a body of at most 4GB. The header holds their lengths, as a
+big-endian unsigned short and a big-endian unsigned int.
+"""
+
+import struct
+
+_header = struct.Struct('!HI')
+
+header_length = _header.size
+
+class FrameError(Exception):
+    """Raised when a stream doesn't contain a valid frame."""
+
+def pack_frame(name, body):
+    """Returns the given name and body as a frame, ready to be sent. The name
+    is encoded in utf-8 when it's a unicode string."""
+
+    if name is None:
+        name = ''
+    elif isinstance(name, unicode):
+        name = name.encode('utf8')
+
+    return ''.join((_header.pack(len(name), len(body)), name, body))
+
+def read_frame(stream, max_body_length=None):
+    """Reads a frame from the given file-like object, and returns its name and
+    body. Returns None when the stream ends before the frame starts.
+
+    @param The file-like object to read from. It should be buffered, as it's
+           read in small pieces.
+    @param The length of the largest body that's accepted. FrameError is raised
+           for larger ones, before they're read.
+    """
+
+    header = stream.read(header_length)
+    if not header:
+        return None
+
+    if len(header) < header_length:
+        raise FrameError("The stream ended in a frame header")
+
+    name_length, body_length = _header.unpack(header)
+    if max_body_length is not None and body_length > max_body_length:
+        raise FrameError("The frame body is %d bytes long, the limit is %d" %
+                                               (body_length, max_body_length))
+
+    name = stream.read(name_length)
+    body = stream.read(body_length)
+    if len(name) < name_length or len(body) < body_length:
+        raise FrameError("The stream ended in a frame")
+
+    return name, body
@@ -0,0 +1,39 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+class frozendict(dict):
+    """A dict that can't be modified once it's created. It's still a dict, so
+    it can be passed wherever one is expected, e.g. to lxml as a nsmap."""
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("%s is read-only" % self.__class__.__name__)
+
+    __setitem__ = __readonly
+    __delitem__ = __readonly
+    clear = __readonly
+    pop = __readonly
+    popitem = __readonly
+    setdefault = __readonly
+    update = __readonly
+
+    def __repr__(self):
+        return "frozendict(%s)" % dict.__repr__(self)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
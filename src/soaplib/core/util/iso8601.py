@@ -0,0 +1,243 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Parsers and formatters for the xml schema date, dateTime and duration types.
+
+Every parser is a single compiled regular expression. Parsed time zone offsets
+are cached, so all values with the same offset share the same tzinfo object.
+
+The parsers can optionally memoize their results, which pays off when the same
+values (e.g. midnight timestamps or common durations) are seen over and over.
+The memos are disabled by default, see set_memo_size().
+"""
+
+import datetime
+import re
+
+import pytz
+
+_date_pattern = r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+_time_pattern = r'(?P<hr>\d{2}):(?P<min>\d{2}):(?P<sec>\d{2})(?:\.(?P<sec_frac>\d+))?'
+_tz_pattern = r'(?P<tz>Z|(?P<tz_sign>[+-])(?P<tz_hr>\d{2}):(?P<tz_min>\d{2}))?'
+
+_date_re = re.compile(_date_pattern)
+_datetime_re = re.compile(_date_pattern + '[T ]' + _time_pattern + _tz_pattern)
+_duration_re = re.compile(
+    r'^(?P<sign>-)?P'
+    r'(?:(?P<years>\d+)Y)?(?:(?P<months>\d+)M)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?'
+    r'(?:(?P<seconds>\d+)(?:\.(?P<sec_frac>\d+))?S)?)?$'
+)
+
+#
+# time zones
+#
+
+_offsets = {0: pytz.utc}
+
+def get_fixed_offset(minutes):
+    """Returns a tzinfo object for the given utc offset. Objects are created
+    once per offset and reused afterwards."""
+
+    retval = _offsets.get(minutes, None)
+    if retval is None:
+        retval = _offsets[minutes] = pytz.FixedOffset(minutes)
+
+    return retval
+
+#
+# memoization
+#
+
+class _Memo(object):
+    """A bounded string -> value mapping. It's simply emptied when it fills
+    up, which is cheaper than keeping track of the least recently used entries
+    and works just as well for the typical case of a small set of values that
+    repeat a lot."""
+
+    def __init__(self, size):
+        self.size = size
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key, None)
+
+    def set(self, key, value):
+        if len(self.data) >= self.size:
+            self.data.clear()
+        self.data[key] = value
+
+_memos = {}
+
+def set_memo_size(size, types=('date', 'dateTime', 'duration')):
+    """Enables memoization of parsed values for the given xml schema types,
+    keeping at most 'size' values per type. A size of 0 disables it."""
+
+    for t in types:
+        if size > 0:
+            _memos[t] = _Memo(size)
+        elif t in _memos:
+            del _memos[t]
+
+def _memoized(type_name):
+    def decorator(func):
+        def wrapper(string):
+            memo = _memos.get(type_name, None)
+            if memo is None:
+                return func(string)
+
+            retval = memo.get(string)
+            if retval is None:
+                retval = func(string)
+                memo.set(string, retval)
+
+            return retval
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+
+        return wrapper
+
+    return decorator
+
+#
+# parsers and formatters
+#
+
+def _microseconds(sec_frac):
+    """Converts the digits after the decimal point to microseconds, rounding
+    towards zero, without going through float."""
+
+    if not sec_frac:
+        return 0
+
+    return int((sec_frac + '00000')[:6])
+
+@_memoized('date')
+def parse_date(string):
+    """Parses an ISO-8601 date. Returns a datetime.date instance."""
+
+    match = _date_re.match(string)
+    if match is None:
+        raise ValueError("Date [%s] not in known format" % string)
+
+    year, month, day = match.group('year', 'month', 'day')
+
+    return datetime.date(int(year), int(month), int(day))
+
+@_memoized('dateTime')
+def parse_datetime(string):
+    """Parses an ISO-8601 date and time, with an optional 'Z' or [+-]hh:mm
+    time zone designator. Returns a datetime.datetime instance, which is naive
+    when there's no time zone designator."""
+
+    match = _datetime_re.match(string)
+    if match is None:
+        raise ValueError("DateTime [%s] not in known format" % string)
+
+    (year, month, day, hr, min, sec, sec_frac, tz, tz_sign, tz_hr, tz_min) = \
+        match.group('year', 'month', 'day', 'hr', 'min', 'sec', 'sec_frac',
+                    'tz', 'tz_sign', 'tz_hr', 'tz_min')
+
+    if tz is None:
+        tzinfo = None
+
+    elif tz == 'Z':
+        tzinfo = pytz.utc
+
+    else:
+        offset = int(tz_hr) * 60 + int(tz_min)
+        if tz_sign == '-':
+            offset = -offset
+        tzinfo = get_fixed_offset(offset)
+
+    return datetime.datetime(int(year), int(month), int(day), int(hr),
+                       int(min), int(sec), _microseconds(sec_frac), tzinfo)
+
+def parse_duration_fields(string):
+    """Parses an xml schema duration. Returns a (negative, years, months, days,
+    hours, minutes, seconds, microseconds) tuple."""
+
+    match = _duration_re.match(string)
+    if match is None or string[-1] in 'PT':
+        raise ValueError("Duration %r not in correct format" % string)
+
+    (sign, years, months, days, hours, minutes, seconds, sec_frac) = \
+        match.group('sign', 'years', 'months', 'days', 'hours', 'minutes',
+                    'seconds', 'sec_frac')
+
+    return (bool(sign), int(years or 0), int(months or 0), int(days or 0),
+            int(hours or 0), int(minutes or 0), int(seconds or 0),
+            _microseconds(sec_frac))
+
+@_memoized('duration')
+def parse_duration(string):
+    """Parses an xml schema duration. Returns a datetime.timedelta instance.
+    Months and years are taken to be 30 and 365 days long, respectively."""
+
+    (negative, years, months, days, hours, minutes, seconds, microseconds) = \
+                                                  parse_duration_fields(string)
+
+    retval = datetime.timedelta(days=days + months * 30 + years * 365,
+                                hours=hours, minutes=minutes, seconds=seconds,
+                                microseconds=microseconds)
+
+    if negative:
+        retval = -retval
+
+    return retval
+
+def format_seconds(seconds, microseconds):
+    """Formats a number of seconds with an optional fractional part, without
+    going through float (and thus the exponential notation)."""
+
+    if microseconds:
+        return ('%d.%06d' % (seconds, microseconds)).rstrip('0')
+
+    return '%d' % seconds
+
+def format_duration(delta):
+    """Formats a datetime.timedelta instance as an xml schema duration."""
+
+    if delta.days < 0:
+        delta = -delta
+        sign = '-'
+    else:
+        sign = ''
+
+    hours, seconds = divmod(delta.seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+
+    time = []
+    if hours:
+        time.append('%dH' % hours)
+    if minutes:
+        time.append('%dM' % minutes)
+    if seconds or delta.microseconds:
+        time.append('%sS' % format_seconds(seconds, delta.microseconds))
+
+    if time:
+        time.insert(0, 'T')
+    elif not delta.days:
+        return 'PT0S'
+
+    if delta.days:
+        time.insert(0, '%dD' % delta.days)
+
+    return '%sP%s' % (sign, ''.join(time))
@@ -0,0 +1,443 @@
+
+#
+# soaplib - Copyright (C) Soaplib contributors.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#
+
+"""Conversions between the values of soaplib models and json.
+
+get_encoder returns a function that turns a value of the given model into
+what json.dumps accepts, and get_decoder one that turns what json.loads
+returns back into a value of the model. They're generated once per class from
+the same metadata as the xml serialization (_type_info and Attributes), and
+the values have the same lexical form as in xml wherever json has no native
+type for them:
+
+    * Integer, Double, Float and Boolean values are json numbers and booleans.
+    * Decimal values are strings, so that they don't lose precision.
+    * Date, DateTime and Duration values are iso 8601 strings.
+    * Attachments are base64 strings.
+    * Any values are xml strings, and AnyAsDict values are json objects.
+    * ClassModels are objects, with the members that are None left out.
+    * Arrays and members with max_occurs > 1 are arrays.
+
+Typed arrays, Columns and Rows are encoded like lists, and the decode_as
+attributes and arguments are honored when decoding.
+"""
+
+import base64
+import decimal
+import os
+import tempfile
+import threading
+
+from lxml import etree
+
+from soaplib.core.model import Null
+from soaplib.core.model import decode_targets
+from soaplib.core.model.binary import Attachment
+from soaplib.core.model.clazz import Array
+from soaplib.core.model.clazz import ClassModelBase
+from soaplib.core.model.clazz import Columns
+from soaplib.core.model.clazz import Rows
+from soaplib.core.model.clazz import XMLAttribute
+from soaplib.core.model.clazz import _get_namedtuple_class
+from soaplib.core.model.clazz import _to_typed_array
+from soaplib.core.model.enum import EnumBase
+from soaplib.core.model.primitive import Any
+from soaplib.core.model.primitive import AnyAsDict
+from soaplib.core.model.primitive import Boolean
+from soaplib.core.model.primitive import Date
+from soaplib.core.model.primitive import DateTime
+from soaplib.core.model.primitive import Decimal
+from soaplib.core.model.primitive import Double
+from soaplib.core.model.primitive import Duration
+from soaplib.core.model.primitive import Integer
+from soaplib.core.util import iso8601
+from soaplib.core.util.duration import XmlDuration
+
+_encoders = {}
+_decoders = {}
+
+# the codecs of recursive models refer to themselves, so they're built with
+# the lock held and a forwarding function in place.
+_lock = threading.RLock()
+
+def get_encoder(cls):
+    """Returns a function that takes a value of the given model and returns
+    its json representation, as python objects."""
+
+    retval = _encoders.get(cls, None)
+    if retval is None:
+        retval = _get_codec(_encoders, cls, _build_encoder, cls)
+
+    return retval
+
+def get_decoder(cls, decode_as=None):
+    """Returns a function that takes the json representation of a value of the
+    given model, as returned by json.loads, and returns the value. Raises
+    ValueError when the representation is invalid.
+
+    @param What ClassModels are decoded to. See
+           soaplib.core.model.base.decode_targets.
+    """
+
+    if decode_as == 'instance':
+        decode_as = None
+
+    key = (cls, decode_as)
+    retval = _decoders.get(key, None)
+    if retval is None:
+        if not (decode_as is None or decode_as in decode_targets):
+            raise ValueError("decode_as must be one of %r, not %r" %
+                                                   (decode_targets, decode_as))
+
+        retval = _get_codec(_decoders, key, _build_decoder, cls, decode_as)
+
+    return retval
+
+def _get_codec(codecs, key, build, *args):
+    _lock.acquire()
+    try:
+        retval = codecs.get(key, None)
+        if retval is None:
+            target = []
+            codecs[key] = lambda *args: target[0](*args)
+            try:
+                retval = build(*args)
+            except:
+                del codecs[key]
+                raise
+
+            target.append(retval)
+            codecs[key] = retval
+
+        return retval
+
+    finally:
+        _lock.release()
+
+def _get_kind(cls):
+    """Returns the class the given one was customized from, which is what
+    tells how its values are converted. The customized classes have the same
+    bases as their original, so they aren't subclasses of it."""
+
+    return getattr(cls, '_is_clone_of', cls)
+
+def _is_multiple(member):
+    mo = member.Attributes.max_occurs
+    return mo == 'unbounded' or mo > 1
+
+def _nillable(func):
+    def retval(value):
+        if value is None:
+            return None
+        return func(value)
+
+    return retval
+
+#
+# encoders
+#
+
+def _encode_string(value):
+    if isinstance(value, basestring):
+        return value
+
+    return unicode(value)
+
+def _encode_duration(value):
+    if isinstance(value, XmlDuration):
+        return str(value)
+
+    if isinstance(value, basestring):
+        return str(XmlDuration.parse(value))
+
+    return iso8601.format_duration(value)
+
+def _encode_any(value):
+    if isinstance(value, basestring):
+        return value
+
+    return etree.tostring(value)
+
+def _encode_attachment(value):
+    # the chunks are multiples of 3 bytes long, so their encodings can be
+    # concatenated.
+    return ''.join([base64.b64encode(chunk) for chunk in value.iter_data()])
+
+def _build_list_encoder(member):
+    encode = get_encoder(member)
+
+    if issubclass(_get_kind(member), ClassModelBase):
+        def retval(values):
+            if isinstance(values, (Columns, Rows)):
+                rows, getter = values.get_rows()
+                return [encode(row, getter) for row in rows]
+
+            return [encode(v) for v in values]
+
+    else:
+        def retval(values):
+            if hasattr(values, 'tolist'): # array.array or numpy.ndarray
+                values = values.tolist()
+
+            return [encode(v) for v in values]
+
+    return _nillable(retval)
+
+def _build_class_encoder(cls):
+    members = []
+    for k, v in cls.get_flat_type_info().items():
+        if isinstance(v, XMLAttribute):
+            members.append((k, _encode_string))
+        elif _is_multiple(v):
+            members.append((k, _build_list_encoder(v)))
+        else:
+            members.append((k, get_encoder(v)))
+
+    sequence_getter = None
+    keys = cls._type_info.keys()
+    if len(keys) > 0:
+        indexes = dict([(k, i) for i, k in enumerate(keys)])
+
+        def sequence_getter(inst, key, default):
+            i = indexes.get(key, None)
+            if i is None or i >= len(inst):
+                return default
+            return inst[i]
+
+    def retval(value, getter=None):
+        if value is None:
+            return None
+
+        # lists, tuples and dicts are encoded as they are, like in
+        # ClassModelBase.to_parent_element.
+        if getter is None:
+            if isinstance(value, dict):
+                getter = dict.get
+            elif isinstance(value, (list, tuple)):
+                getter = sequence_getter
+            else:
+                getter = getattr
+
+        obj = {}
+        for k, encode in members:
+            v = getter(value, k, None)
+            if v is not None:
+                obj[k] = encode(v)
+
+        return obj
+
+    return retval
+
+def _build_encoder(cls):
+    kind = _get_kind(cls)
+
+    if issubclass(kind, Array):
+        (serializer,) = cls._type_info.values()
+        return _build_list_encoder(serializer)
+
+    if issubclass(kind, ClassModelBase):
+        return _build_class_encoder(cls)
+
+    if issubclass(kind, Null):
+        return lambda value: None
+
+    if issubclass(kind, Attachment):
+        func = _encode_attachment
+    elif issubclass(kind, EnumBase):
+        func = str
+    elif issubclass(kind, AnyAsDict):
+        func = lambda value: value
+    elif issubclass(kind, Any):
+        func = _encode_any
+    elif issubclass(kind, Boolean):
+        func = bool
+    elif issubclass(kind, Integer):
+        func = int
+    elif issubclass(kind, Decimal):
+        func = str
+    elif issubclass(kind, Double):
+        func = float
+    elif issubclass(kind, DateTime):
+        func = lambda value: value.isoformat('T')
+    elif issubclass(kind, Date):
+        func = lambda value: value.isoformat()
+    elif issubclass(kind, Duration):
+        func = _encode_duration
+    else:
+        func = _encode_string
+
+    return _nillable(func)
+
+#
+# decoders
+#
+
+def _check(value, types, cls):
+    if not isinstance(value, types):
+        raise ValueError("Invalid %s value: %r" % (cls.get_type_name(),
+                                                                      value))
+
+def _build_simple_decoder(cls):
+    kind = _get_kind(cls)
+
+    if issubclass(kind, Attachment):
+        spool = cls.Attributes.spool
+
+        def retval(value):
+            _check(value, basestring, cls)
+            if not spool:
+                return cls(data=base64.b64decode(value))
+
+            fd, file_name = tempfile.mkstemp(prefix='soaplib-')
+            f = os.fdopen(fd, 'wb')
+            try:
+                cls.decode_to_file(value, f)
+            except:
+                f.close()
+                os.unlink(file_name)
+                raise
+            f.close()
+
+            return cls(file_name=file_name)
+
+    elif issubclass(kind, EnumBase):
+        def retval(value):
+            _check(value, basestring, cls)
+            return getattr(cls, value)
+
+    elif issubclass(kind, AnyAsDict):
+        def retval(value):
+            _check(value, dict, cls)
+            return value
+
+    elif issubclass(kind, Boolean):
+        def retval(value):
+            _check(value, (bool, int), cls)
+            return bool(value)
+
+    elif issubclass(kind, Integer):
+        def retval(value):
+            _check(value, (int, long), cls)
+            return value
+
+    elif issubclass(kind, Decimal):
+        def retval(value):
+            _check(value, (basestring, int, long, float), cls)
+            return decimal.Decimal(str(value))
+
+    elif issubclass(kind, Double):
+        def retval(value):
+            _check(value, (int, long, float), cls)
+            return float(value)
+
+    else:
+        # the other types are strings with the same lexical form as in xml.
+        def retval(value):
+            _check(value, basestring, cls)
+            return cls.from_string(value)
+
+    return _nillable(retval)
+
+def _build_list_decoder(member, decode_as, container=None):
+    decode = get_decoder(member, decode_as)
+
+    def retval(values):
+        _check(values, list, member)
+        return [decode(v) for v in values]
+
+    if container is None:
+        return _nillable(retval)
+
+    if container == 'columns':
+        decode = get_decoder(member, 'dict')
+        keys = member.get_flat_type_info().keys()
+
+        def to_container(values):
+            _check(values, list, member)
+            rows = [decode(v) or dict.fromkeys(keys) for v in values]
+            return Columns(dict([(k, [row[k] for row in rows])
+                                                             for k in keys]))
+
+    else:
+        typecode = member.__typecode__
+
+        def to_container(values):
+            values = retval(values)
+            if None in values:
+                raise ValueError("Nil values can't be decoded into %r" %
+                                                                      container)
+
+            return _to_typed_array(values, typecode, container)
+
+    return _nillable(to_container)
+
+def _build_class_decoder(cls, decode_as):
+    members = {}
+    for k, v in cls.get_flat_type_info().items():
+        if isinstance(v, XMLAttribute):
+            members[k] = _nillable(lambda value: value)
+        elif _is_multiple(v):
+            members[k] = _build_list_decoder(v, decode_as)
+        else:
+            members[k] = get_decoder(v, decode_as)
+
+    keys = cls.get_flat_type_info().keys()
+    if decode_as == 'namedtuple':
+        namedtuple_class = _get_namedtuple_class(cls)
+
+    def retval(value):
+        _check(value, dict, cls)
+
+        if decode_as is None:
+            inst = cls.get_deserialization_instance()
+            for k, v in value.iteritems():
+                decode = members.get(k, None)
+                if decode is not None:
+                    setattr(inst, k, decode(v))
+
+            return inst
+
+        inst = dict.fromkeys(keys)
+        for k, v in value.iteritems():
+            decode = members.get(k, None)
+            if decode is not None:
+                inst[k] = decode(v)
+
+        if decode_as == 'namedtuple':
+            return namedtuple_class._make([inst[k] for k in keys])
+
+        return inst
+
+    return _nillable(retval)
+
+def _build_decoder(cls, decode_as):
+    kind = _get_kind(cls)
+
+    if issubclass(kind, Array):
+        (serializer,) = cls._type_info.values()
+        return _build_list_decoder(serializer, decode_as,
+                                                   cls.Attributes.decode_as)
+
+    if issubclass(kind, ClassModelBase):
+        return _build_class_decoder(cls, decode_as)
+
+    if issubclass(kind, Null):
+        return lambda value: None
+
+    return _build_simple_decoder(cls)